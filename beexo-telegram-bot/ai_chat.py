@@ -5,21 +5,26 @@ Incluye datos de mercado en tiempo real vía CoinGecko
 y búsqueda web gratuita vía DuckDuckGo.
 """
 
-import re
-from typing import Optional
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
 
-import httpx
 from google import genai
 from google.genai import Client as GeminiClient
 
-from config import GEMINI_API_KEY, GEMINI_MODEL, MAX_AI_HISTORY, logger
-from db import log_interaction, query_kb, save_ai_message, load_ai_history
-
-# DuckDuckGo search is optional at import time
-try:
-    from duckduckgo_search import DDGS  # type: ignore
-except Exception:
-    DDGS = None
+from config import (
+    AI_CONTEXT_DEADLINE, AI_HISTORY_IDLE_TTL, AI_HISTORY_MAX_USERS, AI_STREAMING,
+    GEMINI_API_KEY, GEMINI_MODEL, MAX_AI_HISTORY, logger,
+)
+import answer_cache
+import coin_matcher
+import db
+import db_async
+import gemini_limiter
+import market_data
+import prompt_builder
+import web_search
 
 # ── Inicializar cliente Gemini ──
 _gemini_client: Optional[GeminiClient] = None
@@ -79,13 +84,10 @@ def _needs_web_search(text: str) -> bool:
     return False
 
 
-def _web_search(query: str, max_results: int = 5) -> str:
+async def _web_search(query: str, max_results: int = 5) -> str:
     """Busca en la web vía DuckDuckGo y devuelve resultados formateados."""
-    if DDGS is None:
-        return ""
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, region="es-ar", max_results=max_results))
+        results = await web_search.text(query, region="es-ar", max_results=max_results)
         if not results:
             return ""
         lines = ["RESULTADOS DE BÚSQUEDA WEB (fuente: DuckDuckGo):"]
@@ -103,13 +105,10 @@ def _web_search(query: str, max_results: int = 5) -> str:
         return ""
 
 
-def _web_news(query: str, max_results: int = 3) -> str:
+async def _web_news(query: str, max_results: int = 3) -> str:
     """Busca noticias recientes vía DuckDuckGo."""
-    if DDGS is None:
-        return ""
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.news(query, region="es-ar", max_results=max_results))
+        results = await web_search.news(query, region="es-ar", max_results=max_results)
         if not results:
             return ""
         lines = ["NOTICIAS RECIENTES (fuente: DuckDuckGo News):"]
@@ -132,34 +131,6 @@ def _web_news(query: str, max_results: int = 3) -> str:
 # PRECIOS CRYPTO (CoinGecko - gratis)
 # ═══════════════════════════════════════════════════════════════
 
-COIN_ALIASES: dict[str, str] = {
-    "btc": "bitcoin", "bitcoin": "bitcoin",
-    "eth": "ethereum", "ethereum": "ethereum", "ether": "ethereum",
-    "bnb": "binancecoin", "binance": "binancecoin",
-    "sol": "solana", "solana": "solana",
-    "ada": "cardano", "cardano": "cardano",
-    "xrp": "ripple", "ripple": "ripple",
-    "dot": "polkadot", "polkadot": "polkadot",
-    "doge": "dogecoin", "dogecoin": "dogecoin",
-    "shib": "shiba-inu", "shiba": "shiba-inu",
-    "avax": "avalanche-2", "avalanche": "avalanche-2",
-    "matic": "matic-network", "polygon": "matic-network",
-    "link": "chainlink", "chainlink": "chainlink",
-    "uni": "uniswap", "uniswap": "uniswap",
-    "atom": "cosmos", "cosmos": "cosmos",
-    "ltc": "litecoin", "litecoin": "litecoin",
-    "trx": "tron", "tron": "tron",
-    "usdt": "tether", "tether": "tether",
-    "usdc": "usd-coin",
-    "dai": "dai",
-    "near": "near", "near protocol": "near",
-    "apt": "aptos", "aptos": "aptos",
-    "arb": "arbitrum", "arbitrum": "arbitrum",
-    "op": "optimism", "optimism": "optimism",
-    "sui": "sui",
-    "pepe": "pepe",
-}
-
 PRICE_KEYWORDS = [
     "precio", "cotización", "cotizacion", "vale", "está",
     "esta", "cuánto", "cuanto", "price", "cuesta",
@@ -171,16 +142,8 @@ PRICE_KEYWORDS = [
 
 
 def _detect_coins(text: str) -> list[str]:
-    """Detecta mencion de criptomonedas en el texto."""
-    text_lower = text.lower()
-    found: list[str] = []
-    seen_ids: set[str] = set()
-    for alias, cg_id in COIN_ALIASES.items():
-        if re.search(r'\b' + re.escape(alias) + r'\b', text_lower):
-            if cg_id not in seen_ids:
-                found.append(cg_id)
-                seen_ids.add(cg_id)
-    return found
+    """Detecta mencion de criptomonedas en el texto (ver coin_matcher)."""
+    return coin_matcher.find(text)
 
 
 def _is_price_question(text: str) -> bool:
@@ -192,34 +155,11 @@ def _is_price_question(text: str) -> bool:
 async def _fetch_prices(coin_ids: list[str]) -> dict | None:
     if not coin_ids:
         return None
-    ids_str = ",".join(coin_ids[:10])
-    url = (
-        "https://api.coingecko.com/api/v3/simple/price"
-        f"?ids={ids_str}"
-        "&vs_currencies=usd,ars"
-        "&include_24hr_change=true"
-        "&include_market_cap=true"
-    )
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(url)
-        if resp.status_code == 200:
-            return resp.json()
-    except Exception:
-        pass
-    return None
+    return await market_data.get_prices(coin_ids[:10]) or None
 
 
 async def _fetch_global_market() -> dict | None:
-    url = "https://api.coingecko.com/api/v3/global"
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(url)
-        if resp.status_code == 200:
-            return resp.json().get("data")
-    except Exception:
-        pass
-    return None
+    return await market_data.get_global()
 
 
 def _format_price_context(prices: dict, coins: list[str]) -> str:
@@ -301,31 +241,254 @@ SYSTEM_PROMPT = (
     "13. También pueden consultar precios directamente con /precio btc eth sol.\n"
 )
 
+# ═══════════════════════════════════════════════════════════════
+# CONTEXTO EXTERNO (en paralelo, con presupuesto de latencia)
+# ═══════════════════════════════════════════════════════════════
+# Todas las fuentes arrancan a la vez. Cada una tiene su timeout y el
+# conjunto tiene un deadline (AI_CONTEXT_DEADLINE): lo que no llegó a
+# tiempo se descarta en vez de esperarlo.
+
+_SOURCE_TIMEOUTS: dict[str, float] = {
+    "kb": 1.0,
+    "prices": 2.0,
+    "global": 2.0,
+    "top_prices": 2.0,
+    "news": 2.5,
+    "web": 2.5,
+}
+
+_NEWS_KEYWORDS = ["noticia", "hoy", "ahora", "reciente", "último", "ultima"]
+
+# fuente → contadores acumulados (ok / empty / timeout / error / late) y latencias
+_context_stats: dict[str, dict] = {}
+
+
+async def _kb_source(question: str) -> str:
+    kb_hits = await db_async.query_kb(question, limit=3)
+    if not kb_hits:
+        return ""
+    kb_lines = ["INFORMACIÓN RELEVANTE (Knowledge Base):"]
+    for k in kb_hits:
+        title = k.get("title") or "Sin título"
+        src = k.get("source") or "local"
+        snippet = (k.get("content") or "").strip().replace("\n", " ")[:800]
+        kb_lines.append(f"• {title} — {src}\n  {snippet}")
+    return "\n".join(kb_lines)
+
+
+async def _price_source(coins: list[str]) -> str:
+    prices = await _fetch_prices(coins)
+    return _format_price_context(prices, coins) if prices else ""
+
+
+async def _global_source() -> str:
+    global_data = await _fetch_global_market()
+    return _format_global_context(global_data) if global_data else ""
+
+
+def _record_source(name: str, status: str, elapsed_ms: float) -> None:
+    st = _context_stats.get(name)
+    if st is None:
+        st = _context_stats[name] = {
+            "calls": 0, "ok": 0, "empty": 0, "timeout": 0, "error": 0, "late": 0,
+            "total_ms": 0.0, "max_ms": 0.0,
+        }
+    st["calls"] += 1
+    st[status] += 1
+    st["total_ms"] += elapsed_ms
+    st["max_ms"] = max(st["max_ms"], elapsed_ms)
+
+
+async def _timed_source(name: str, coro: Awaitable[str], timings: dict[str, str]) -> str:
+    """Corre una fuente con su timeout y registra cuánto tardó y cómo terminó."""
+    t0 = time.perf_counter()
+    result = ""
+    try:
+        result = await asyncio.wait_for(coro, _SOURCE_TIMEOUTS.get(name, AI_CONTEXT_DEADLINE)) or ""
+        status = "ok" if result else "empty"
+    except asyncio.CancelledError:
+        # Cancelada por el deadline global
+        elapsed = (time.perf_counter() - t0) * 1000
+        _record_source(name, "late", elapsed)
+        timings[name] = "late"
+        raise
+    except asyncio.TimeoutError:
+        status = "timeout"
+    except Exception as e:
+        logger.debug("Fuente de contexto %s falló: %s", name, e)
+        status = "error"
+    elapsed = (time.perf_counter() - t0) * 1000
+    _record_source(name, status, elapsed)
+    timings[name] = f"{elapsed:.0f}ms" if status in ("ok", "empty") else status
+    return result
+
+
+async def _gather_context(question: str) -> dict[str, str]:
+    """
+    Junta el contexto para la pregunta consultando todas las fuentes a la vez.
+    Devuelve fuente → bloque, en orden estable: KB, mercado, noticias, web.
+    """
+    sources: list[tuple[str, Awaitable[str]]] = [("kb", _kb_source(question))]
+
+    coins = _detect_coins(question)
+    if coins:
+        sources.append(("prices", _price_source(coins)))
+    elif _is_price_question(question):
+        sources.append(("global", _global_source()))
+        sources.append(("top_prices", _price_source(["bitcoin", "ethereum"])))
+
+    if _needs_web_search(question):
+        if any(kw in question.lower() for kw in _NEWS_KEYWORDS):
+            sources.append(("news", _web_news(question)))
+        sources.append(("web", _web_search(question)))
+
+    timings: dict[str, str] = {}
+    t0 = time.perf_counter()
+    tasks = [
+        asyncio.create_task(_timed_source(name, coro, timings)) for name, coro in sources
+    ]
+    done, pending = await asyncio.wait(tasks, timeout=AI_CONTEXT_DEADLINE)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    parts = {
+        name: task.result() for (name, _), task in zip(sources, tasks)
+        if task in done and not task.cancelled() and task.exception() is None and task.result()
+    }
+    logger.debug(
+        "Contexto IA en %.0fms: %s", (time.perf_counter() - t0) * 1000,
+        " ".join(f"{name}={timings.get(name, '?')}" for name, _ in sources),
+    )
+    return parts
+
+
+def context_stats() -> dict[str, dict]:
+    """Latencia y resultado acumulado por fuente de contexto."""
+    out = {}
+    for name, st in _context_stats.items():
+        s = dict(st)
+        s["avg_ms"] = s["total_ms"] / s["calls"] if s["calls"] else 0.0
+        out[name] = s
+    return out
+
+
 # ═══════════════════════════════════════════════════════════════
 # HISTORIAL Y LÓGICA PRINCIPAL
 # ═══════════════════════════════════════════════════════════════
 
-# Cache en memoria (se hidrata desde DB al primer acceso)
-_user_histories: dict[int, list[dict]] = {}
-_user_loaded: set[int] = set()
+class _Conversation:
+    """Últimos turnos de un usuario (deque acotada a MAX_AI_HISTORY)."""
+
+    __slots__ = ("turns", "last_used")
+
+    def __init__(self, turns: list[dict], now: float) -> None:
+        self.turns: deque[dict] = deque(turns, maxlen=MAX_AI_HISTORY)
+        self.last_used = now
+
+
+# Cache LRU en memoria: user_id → conversación, del menos al más reciente.
+# Acotada por cantidad (AI_HISTORY_MAX_USERS) y por inactividad
+# (AI_HISTORY_IDLE_TTL); lo que sale se vuelve a hidratar desde la DB.
+_histories: "OrderedDict[int, _Conversation]" = OrderedDict()
+_history_stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+
+def _evict_histories(now: float) -> None:
+    """Suelta conversaciones inactivas y, si sigue lleno, las menos usadas."""
+    while _histories:
+        user_id, conv = next(iter(_histories.items()))
+        if now - conv.last_used > AI_HISTORY_IDLE_TTL:
+            del _histories[user_id]
+            _history_stats["expired"] += 1
+        elif len(_histories) > AI_HISTORY_MAX_USERS:
+            del _histories[user_id]
+            _history_stats["evictions"] += 1
+        else:
+            break
+
+
+async def _get_history(user_id: int) -> deque[dict]:
+    """Obtiene historial del usuario, cargando desde DB si no está en memoria."""
+    now = time.monotonic()
+    conv = _histories.get(user_id)
+    if conv is not None and now - conv.last_used <= AI_HISTORY_IDLE_TTL:
+        _history_stats["hits"] += 1
+    else:
+        _history_stats["misses"] += 1
+        _histories.pop(user_id, None)
+        db_history = await db_async.load_ai_history(user_id, limit=MAX_AI_HISTORY)
+        # Otro mensaje del mismo usuario pudo cargarlo mientras esperábamos
+        conv = _histories.get(user_id)
+        if conv is None:
+            conv = _histories[user_id] = _Conversation(db_history or [], now)
+    conv.last_used = now
+    _histories.move_to_end(user_id)
+    _evict_histories(now)
+    return conv.turns
+
+
+def history_stats() -> dict:
+    s = dict(_history_stats)
+    s["users"] = len(_histories)
+    return s
+
+
+def _remember_exchange(
+    history: deque[dict], user_id: int, user_name: str | None, question: str, answer: str,
+) -> None:
+    """Agrega el intercambio al historial en memoria y lo persiste en segundo plano."""
+    # Sin el contexto inyectado
+    history.append({"role": "user", "content": question})
+    history.append({"role": "assistant", "content": answer})
+    # Una sola transacción, fuera del camino de respuesta
+    try:
+        db_async.enqueue_write(db.record_ai_exchange, user_id, user_name, question, answer)
+    except Exception:
+        pass
+
+
+def _needs_live_context(question: str) -> bool:
+    """True si la respuesta depende de datos en vivo (precios o noticias)."""
+    if _detect_coins(question) or _is_price_question(question):
+        return True
+    return _needs_web_search(question) and any(kw in question.lower() for kw in _NEWS_KEYWORDS)
+
 
+_GENERATION_CONFIG = {
+    "system_instruction": SYSTEM_PROMPT,
+    "max_output_tokens": 700,
+    "temperature": 0.7,
+}
 
-def _get_history(user_id: int) -> list[dict]:
-    """Obtiene historial del usuario, cargando desde DB si es necesario."""
-    if user_id not in _user_loaded:
-        _user_loaded.add(user_id)
-        db_history = load_ai_history(user_id, limit=MAX_AI_HISTORY)
-        if db_history:
-            _user_histories[user_id] = db_history
-    if user_id not in _user_histories:
-        _user_histories[user_id] = []
-    return _user_histories[user_id]
 
+async def _generate(
+    gemini_contents: list[dict],
+    on_partial: Callable[[str], Awaitable[None]] | None = None,
+) -> str:
+    """
+    Llama a Gemini y devuelve el texto de la respuesta ("" si vino vacía).
+    Con `on_partial` usa la API de streaming y lo invoca con el texto
+    acumulado a medida que llegan los fragmentos.
+    """
+    client = _get_gemini_client()
+    if on_partial is None or not AI_STREAMING:
+        response = await client.aio.models.generate_content(
+            model=GEMINI_MODEL, contents=gemini_contents, config=_GENERATION_CONFIG,
+        )
+        return (response.text or "").strip() if response else ""
 
-def _trim_history(user_id: int) -> None:
-    hist = _user_histories.get(user_id, [])
-    if len(hist) > MAX_AI_HISTORY:
-        _user_histories[user_id] = hist[-MAX_AI_HISTORY:]
+    chunks: list[str] = []
+    stream = await client.aio.models.generate_content_stream(
+        model=GEMINI_MODEL, contents=gemini_contents, config=_GENERATION_CONFIG,
+    )
+    async for chunk in stream:
+        text = chunk.text
+        if text:
+            chunks.append(text)
+            await on_partial("".join(chunks))
+    return "".join(chunks).strip()
 
 
 def _history_to_gemini_contents(history: list[dict]) -> list[dict]:
@@ -342,142 +505,69 @@ def _history_to_gemini_contents(history: list[dict]) -> list[dict]:
     return contents
 
 
-async def ask_ai(user_id: int, question: str, user_name: str | None = None) -> str:
-    """Envía una pregunta a Google Gemini y devuelve la respuesta."""
+async def ask_ai(
+    user_id: int, question: str, user_name: str | None = None,
+    on_partial: Callable[[str], Awaitable[None]] | None = None,
+    on_queued: Callable[[int, float], Awaitable[None]] | None = None,
+) -> str:
+    """
+    Envía una pregunta a Google Gemini y devuelve la respuesta.
+    Si se pasa `on_partial`, se lo llama con el texto parcial mientras se genera.
+    Si la llamada tiene que hacer cola (cuota de Gemini), se avisa por
+    `on_queued(posición, segundos_estimados)`.
+    """
     if not GEMINI_API_KEY:
         return (
             "⚠️ La función de IA no está configurada todavía.\n"
             "Un administrador debe agregar la GEMINI_API_KEY."
         )
 
-    # ── Recopilar contexto externo ──
-    context_parts: list[str] = []
-
-    # 1) Datos de mercado cripto
-    coins = _detect_coins(question)
-    is_price_q = _is_price_question(question)
-
-    if coins and is_price_q:
-        prices = await _fetch_prices(coins)
-        if prices:
-            context_parts.append(_format_price_context(prices, coins))
-    elif is_price_q and not coins:
-        global_data = await _fetch_global_market()
-        if global_data:
-            context_parts.append(_format_global_context(global_data))
-        top_prices = await _fetch_prices(["bitcoin", "ethereum"])
-        if top_prices:
-            context_parts.append(_format_price_context(top_prices, ["bitcoin", "ethereum"]))
-    elif coins and not is_price_q:
-        prices = await _fetch_prices(coins)
-        if prices:
-            context_parts.append(_format_price_context(prices, coins))
-
-    # 2) Búsqueda web si la pregunta lo amerita
-    if _needs_web_search(question):
-        news_kw = ["noticia", "hoy", "ahora", "reciente", "último", "ultima"]
-        if any(kw in question.lower() for kw in news_kw):
-            news = _web_news(question)
-            if news:
-                context_parts.append(news)
-        search = _web_search(question)
-        if search:
-            context_parts.append(search)
-
-    # 3) Buscar en knowledge base local
-    try:
-        kb_hits = query_kb(question, limit=3)
-        if kb_hits:
-            kb_lines = ["INFORMACIÓN RELEVANTE (Knowledge Base):"]
-            for k in kb_hits:
-                title = k.get("title") or "Sin título"
-                src = k.get("source") or "local"
-                snippet = (k.get("content") or "").strip().replace("\n", " ")[:800]
-                kb_lines.append(f"• {title} — {src}\n  {snippet}")
-            context_parts.insert(0, "\n".join(kb_lines))
-    except Exception:
-        pass
-
-    # ── Construir mensaje ──
-    history = _get_history(user_id)
-    user_msg = question
-    if context_parts:
-        extra = "\n\n".join(context_parts)
-        user_msg = f"{question}\n\n[CONTEXTO INTERNO - NO MOSTRAR LITERALMENTE AL USUARIO]:\n{extra}"
-
-    history.append({"role": "user", "content": user_msg})
-
-    # Convertir historial a formato Gemini
-    gemini_contents = _history_to_gemini_contents(history)
+    # ── Preguntas frecuentes ya respondidas ──
+    cacheable = not _needs_live_context(question) and answer_cache.is_cacheable(question)
+    if cacheable:
+        cached = answer_cache.get(question)
+        if cached is not None:
+            _remember_exchange(await _get_history(user_id), user_id, user_name, question, cached)
+            return cached
+
+    # ── Recopilar contexto externo (KB, mercado, noticias, web) en paralelo ──
+    context_parts = await _gather_context(question)
+
+    # ── Construir mensaje dentro del presupuesto de tokens ──
+    history = await _get_history(user_id)
+    # Una pregunta cacheable se responde sin la charla del usuario: así la
+    # respuesta sirve para cualquiera que pregunte lo mismo
+    prompt_history = [] if cacheable else list(history)
+    plan = prompt_builder.build(question, context_parts, prompt_history, system=SYSTEM_PROMPT)
+
+    # Convertir historial a formato Gemini. La pregunta (con su contexto) no
+    # entra al historial hasta que haya respuesta.
+    gemini_contents = _history_to_gemini_contents(
+        [*plan.history, {"role": "user", "content": plan.user_msg}]
+    )
 
     try:
-        client = _get_gemini_client()
-        response = await client.aio.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=gemini_contents,
-            config={
-                "system_instruction": SYSTEM_PROMPT,
-                "max_output_tokens": 700,
-                "temperature": 0.7,
-            },
+        answer = await gemini_limiter.call(
+            lambda: _generate(gemini_contents, on_partial),
+            priority=gemini_limiter.INTERACTIVE, on_queued=on_queued,
         )
-
-        # Validar respuesta
-        if not response or not response.text:
-            history.pop()
-            return "❌ La IA no generó una respuesta. Intentá reformular la pregunta."
-
-        answer = response.text.strip()
-
         if not answer:
-            history.pop()
-            return "❌ La IA devolvió una respuesta vacía. Intentá de nuevo."
-
-        # Guardar respuesta en historial (sin el contexto inyectado)
-        history[-1] = {"role": "user", "content": question}
-        history.append({"role": "assistant", "content": answer})
-        _trim_history(user_id)
-
-        # Persistir en DB (no bloquear si falla)
-        try:
-            log_interaction(user_id, user_name, question, answer)
-            save_ai_message(user_id, "user", question)
-            save_ai_message(user_id, "assistant", answer)
-        except Exception:
-            pass
+            return "❌ La IA no generó una respuesta. Intentá reformular la pregunta."
 
+        _remember_exchange(history, user_id, user_name, question, answer)
+        if cacheable:
+            answer_cache.put(question, answer)
         return answer
 
-    except Exception as e:
-        if history and history[-1].get("role") == "user":
-            history.pop()
+    except gemini_limiter.GeminiBusy as e:
+        logger.info("ask_ai sin turno en Gemini (~%.0fs)", e.eta)
+        return f"⏳ La IA está con mucha demanda. Probá de nuevo en ~{max(5, round(e.eta))} segundos."
 
+    except Exception as e:
         error_str = str(e).lower()
         logger.warning("Error en ask_ai: %s — %s", type(e).__name__, e)
 
-        if "429" in error_str or "resource_exhausted" in error_str:
-            import asyncio
-            # Reintentar con backoff exponencial (hasta 5 intentos)
-            for attempt in range(1, 6):
-                delay = 2 ** attempt  # 2, 4, 8, 16, 32 segundos
-                logger.info("Gemini 429 — reintento %d/5 en %ds...", attempt, delay)
-                await asyncio.sleep(delay)
-                try:
-                    retry_resp = await _get_gemini_client().aio.models.generate_content(
-                        model=GEMINI_MODEL,
-                        contents=gemini_contents,
-                        config={
-                            "system_instruction": SYSTEM_PROMPT,
-                            "max_output_tokens": 700,
-                            "temperature": 0.7,
-                        },
-                    )
-                    answer = (retry_resp.text or "").strip()
-                    if answer:
-                        return answer
-                except Exception as retry_err:
-                    logger.info("Reintento %d falló: %s", attempt, retry_err)
-                    continue
+        if gemini_limiter.is_rate_limit(e):
             return "⏳ La API de Gemini está saturada. Intentá de nuevo en un minuto."
         if "timeout" in error_str:
             return "⏳ La IA tardó demasiado en responder. Intentá de nuevo."
@@ -0,0 +1,139 @@
+"""
+Cache de respuestas de la IA para preguntas repetidas.
+
+En los grupos se pregunta lo mismo una y otra vez ("qué es una seed phrase",
+"cómo recupero mi wallet"). La pregunta se normaliza (sin acentos, minúsculas,
+sin puntuación) y, si ya se respondió hace menos de AI_ANSWER_CACHE_TTL, se
+devuelve la misma respuesta sin llamar a Gemini.
+
+  • Sólo se cachean preguntas autocontenidas: al menos 3 palabras, que no
+    arranquen como continuación de la charla ("y eso?", "pero entonces...")
+    y que no sean personales ("mi", "me", "te dije"...): la respuesta se
+    comparte entre todos los usuarios.
+  • Para las cacheables ai_chat arma el prompt sin el historial del usuario,
+    así la respuesta no depende de su charla y se puede compartir.
+  • Las preguntas con contexto en vivo (precios, noticias) no pasan por acá:
+    lo decide ai_chat antes de consultar.
+  • Si cambia la Knowledge Base (ver db.get_kb_version) se vacía el cache.
+"""
+
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+import db_async
+from config import AI_ANSWER_CACHE_MAX, AI_ANSWER_CACHE_TTL, logger
+
+_MIN_WORDS = 3
+# Palabras que suelen indicar que la pregunta depende del turno anterior
+_FOLLOW_UP_STARTS = frozenset({
+    "y", "pero", "entonces", "osea", "eso", "esto", "esa", "ese", "aca", "ahi",
+    "tambien", "ademas", "ok", "dale",
+})
+# Primera persona o memoria de la charla: la respuesta es de ese usuario
+_PERSONAL_WORDS = frozenset({
+    "yo", "me", "mi", "mis", "mio", "mia", "conmigo", "nos", "nuestro", "nuestra",
+    "dije", "conte", "pregunte", "llamo", "acordas", "recordas", "recuerdas", "acuerdas",
+    "i", "my", "mine",
+})
+
+
+class _Answer:
+    __slots__ = ("text", "stored_at")
+
+    def __init__(self, text: str, stored_at: float) -> None:
+        self.text = text
+        self.stored_at = stored_at
+
+
+# pregunta normalizada → respuesta; orden LRU
+_entries: "OrderedDict[str, _Answer]" = OrderedDict()
+_kb_version: str | None = None
+_stats = {"hits": 0, "misses": 0, "stores": 0, "skipped": 0, "invalidations": 0}
+
+
+def normalize(question: str) -> str:
+    """Minúsculas, sin acentos, sin puntuación y con espacios colapsados."""
+    folded = unicodedata.normalize("NFKD", question.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9ñ]+", folded))
+
+
+def _key(question: str) -> str | None:
+    """Clave de cache, o None si la pregunta no es cacheable."""
+    norm = normalize(question)
+    words = norm.split()
+    if len(words) < _MIN_WORDS or words[0] in _FOLLOW_UP_STARTS:
+        return None
+    if not _PERSONAL_WORDS.isdisjoint(words):
+        return None
+    return norm
+
+
+def is_cacheable(question: str) -> bool:
+    """True si la pregunta es autocontenida y no personal (ver _key)."""
+    if _key(question) is None:
+        _stats["skipped"] += 1
+        return False
+    return True
+
+
+def get(question: str) -> str | None:
+    """Respuesta cacheada para la pregunta, si hay una vigente."""
+    key = _key(question)
+    if key is None:
+        _stats["skipped"] += 1
+        return None
+    entry = _entries.get(key)
+    if entry is None or time.monotonic() - entry.stored_at > AI_ANSWER_CACHE_TTL:
+        if entry is not None:
+            del _entries[key]
+        _stats["misses"] += 1
+        return None
+    _entries.move_to_end(key)
+    _stats["hits"] += 1
+    return entry.text
+
+
+def put(question: str, answer: str) -> None:
+    """Guarda la respuesta de una pregunta cacheable."""
+    key = _key(question)
+    if key is None or not answer:
+        return
+    _entries[key] = _Answer(answer, time.monotonic())
+    _entries.move_to_end(key)
+    _stats["stores"] += 1
+    while len(_entries) > AI_ANSWER_CACHE_MAX:
+        _entries.popitem(last=False)
+
+
+def clear() -> None:
+    _entries.clear()
+
+
+async def refresh_kb_version() -> bool:
+    """
+    Compara la versión de la KB con la última vista y vacía el cache si
+    cambió. Retorna True si hubo invalidación.
+    """
+    global _kb_version
+    version = await db_async.get_kb_version()
+    if not version:
+        return False
+    if _kb_version is not None and version != _kb_version:
+        _entries.clear()
+        _stats["invalidations"] += 1
+        logger.info("🧠 KB actualizada (%s → %s): cache de respuestas vaciado", _kb_version, version)
+        _kb_version = version
+        return True
+    _kb_version = version
+    return False
+
+
+def stats() -> dict:
+    s = dict(_stats)
+    lookups = s["hits"] + s["misses"]
+    s["hit_rate"] = s["hits"] / lookups if lookups else 0.0
+    s["size"] = len(_entries)
+    return s
@@ -14,13 +14,27 @@ from telegram.ext import (
     filters,
 )
 
-from config import TOKEN, TARGET_CHAT_IDS, TZ, logger
-from db import init_db, get_pending_reminders
+from config import (
+    TOKEN, TARGET_CHAT_IDS, TZ, XP_FLUSH_INTERVAL, MARKET_REFRESH_INTERVAL,
+    COIN_LIST_REFRESH_INTERVAL, GIF_CACHE_REFRESH_INTERVAL, logger,
+)
+import answer_cache
+import db_async
+import gemini_limiter
+import gif_cache
+import http_clients
+import prompt_builder
+import state_store
+import web_search
+import xp_buffer
+from db import close_pool
+from update_processor import ChatOrderedProcessor
 from handlers import (
     on_message,
     welcome_new_member,
     track_chat_member,
     reminder_fire,
+    pipeline_stats,
 )
 from commands import (
     help_cmd,
@@ -49,6 +63,12 @@ from jobs import (
     ephemerides_job,
     auto_trivia_job,
     beexo_radio_job,
+    xp_flush_job,
+    retention_job,
+    market_refresh_job,
+    coin_list_job,
+    gif_cache_job,
+    answer_cache_job,
     time_until,
 )
 
@@ -64,8 +84,21 @@ async def post_init(app) -> None:
     app.bot_data["bot_info"] = bot_info
     logger.info("🤖 Bot info cacheado: @%s (id=%s)", bot_info.username, bot_info.id)
 
+    # Clientes HTTP compartidos (keep-alive por upstream)
+    await http_clients.start()
+
     # Inicializar DB
-    init_db()
+    await db_async.init_db()
+
+    # Versión de la KB para el cache de respuestas IA
+    await answer_cache.refresh_kb_version()
+
+    # Leaderboard de XP en memoria
+    ranked = await xp_buffer.load_leaderboard()
+    if ranked is None:
+        logger.warning("⚠️ No se pudo cargar el leaderboard; se reintenta en el próximo flush de XP")
+    else:
+        logger.info("🏆 Leaderboard cargado: %d usuarios", ranked)
 
     # Inicializar pool de memes
     from meme_pool import init_pool
@@ -75,7 +108,7 @@ async def post_init(app) -> None:
     # Reprogramar recordatorios pendientes
     import time as time_mod
     now = int(time_mod.time())
-    for r in get_pending_reminders():
+    for r in await db_async.get_pending_reminders():
         delay = r["scheduled_at"] - now
         if delay <= 0:
             delay = 5  # disparar en 5 segundos si ya pasó la hora
@@ -91,6 +124,24 @@ async def post_init(app) -> None:
     logger.info("⏰ Recordatorios pendientes reprogramados")
 
 
+async def post_shutdown(app) -> None:
+    """Se ejecuta una vez al apagar el bot."""
+    logger.info("🧠 Cache de respuestas IA: %s", answer_cache.stats())
+    logger.info("🚦 Cola de Gemini: %s", gemini_limiter.stats())
+    logger.info("📏 Prompts IA: %s", prompt_builder.stats())
+    logger.info("📨 Etapas de on_message: %s", pipeline_stats())
+    logger.info("⏱️ Cooldowns en memoria: %s", state_store.stats())
+    logger.info("🎞️ GIFs de reacciones: %s", gif_cache.stats())
+    if isinstance(app.update_processor, ChatOrderedProcessor):
+        logger.info("🔀 Procesamiento de updates: %s", app.update_processor.stats())
+    await xp_buffer.flush_async()
+    await db_async.drain_writes()
+    db_async.shutdown()
+    close_pool()
+    web_search.shutdown()
+    await http_clients.close()
+
+
 # ═══════════════════════════════════════════════════════════════
 # MAIN
 # ═══════════════════════════════════════════════════════════════
@@ -98,7 +149,15 @@ async def post_init(app) -> None:
 def main() -> None:
     logger.info("🚀 Iniciando BeeXy…")
 
-    app = ApplicationBuilder().token(TOKEN).post_init(post_init).build()
+    app = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Chats en paralelo; dentro de un mismo chat, en orden
+        .concurrent_updates(ChatOrderedProcessor())
+        .build()
+    )
 
     # ── Comandos ──
     app.add_handler(CommandHandler("start", help_cmd))
@@ -140,6 +199,7 @@ def main() -> None:
     jq.run_daily(engagement_job, time=time(19, 30, tzinfo=TZ), days=(0, 2, 4, 6), name="engagement")
     jq.run_daily(daily_crypto_summary_job, time=time(10, 0, tzinfo=TZ), name="crypto_summary")
     jq.run_daily(ephemerides_job, time=time(9, 30, tzinfo=TZ), name="ephemerides")
+    jq.run_daily(retention_job, time=time(4, 0, tzinfo=TZ), name="retention")
 
     jq.run_daily(weekly_news_job, time=time(11, 0, tzinfo=TZ),
                  days=(0,), name="weekly_news")  # 0 = lunes
@@ -147,6 +207,21 @@ def main() -> None:
     jq.run_daily(weekly_fun_fact_job, time=time(15, 0, tzinfo=TZ),
                  days=(2,), name="fun_fact")
                  
+    # Volcar XP acumulado en memoria
+    jq.run_repeating(xp_flush_job, interval=XP_FLUSH_INTERVAL, first=XP_FLUSH_INTERVAL, name="xp_flush")
+
+    # Invalidar respuestas IA cacheadas si cambia la KB
+    jq.run_repeating(answer_cache_job, interval=300, first=300, name="answer_cache")
+
+    # Mantener caliente el cache de precios de CoinGecko
+    jq.run_repeating(market_refresh_job, interval=MARKET_REFRESH_INTERVAL, first=5, name="market_refresh")
+
+    # Listado completo de monedas para detectar tickers en las preguntas
+    jq.run_repeating(coin_list_job, interval=COIN_LIST_REFRESH_INTERVAL, first=30, name="coin_list")
+
+    # GIFs de reacciones emocionales, validados de antemano
+    jq.run_repeating(gif_cache_job, interval=GIF_CACHE_REFRESH_INTERVAL, first=60, name="gif_cache")
+
     # Revisar Beexo Radio cada 15 minutos (900s)
     jq.run_repeating(beexo_radio_job, interval=900, first=10, name="beexo_radio")
 
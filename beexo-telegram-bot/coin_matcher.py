@@ -0,0 +1,227 @@
+"""
+Detección de criptomonedas mencionadas en un texto.
+
+Un trie por palabras construido al importar: el texto se tokeniza una vez y
+se recorre de izquierda a derecha buscando el alias más largo en cada
+posición ("near protocol" antes que "near"). El costo depende del largo del
+texto, no de cuántas monedas se soporten.
+
+Además de los alias curados (COIN_ALIASES), refresh_coin_list() suma el
+listado completo de CoinGecko (miles de monedas), con más cuidado:
+  • Símbolos: sólo si son únicos. Los del top por market cap (ver abajo)
+    se aceptan en mayúsculas o con "$" ("FET", "$wif"); el resto sólo con
+    "$", así un mensaje en mayúsculas ("QUE PASA CON EL GRUPO") no se
+    confunde con tickers.
+  • Nombres: sólo los de las COIN_NAME_TOP_N monedas con más market cap,
+    únicos y que no sean palabras de uso diario. Con miles de monedas hay
+    nombres para casi cualquier palabra; un falso positivo dispara
+    consultas de mercado y saltea el cache de respuestas. Los demás nombres
+    se siguen reconociendo con resolve() (ej. /precio), no en texto libre.
+  • Los alias curados siempre ganan.
+
+Uso:
+    import coin_matcher
+    coin_matcher.find("cuánto vale btc y $WIF?")  # → ["bitcoin", "dogwifcoin"]
+"""
+
+import re
+import time
+
+import market_data
+from config import COIN_NAME_TOP_N, logger
+
+COIN_ALIASES: dict[str, str] = {
+    "btc": "bitcoin", "bitcoin": "bitcoin",
+    "eth": "ethereum", "ethereum": "ethereum", "ether": "ethereum",
+    "bnb": "binancecoin", "binance": "binancecoin",
+    "sol": "solana", "solana": "solana",
+    "ada": "cardano", "cardano": "cardano",
+    "xrp": "ripple", "ripple": "ripple",
+    "dot": "polkadot", "polkadot": "polkadot",
+    "doge": "dogecoin", "dogecoin": "dogecoin",
+    "shib": "shiba-inu", "shiba": "shiba-inu",
+    "avax": "avalanche-2", "avalanche": "avalanche-2",
+    "matic": "matic-network", "polygon": "matic-network",
+    "link": "chainlink", "chainlink": "chainlink",
+    "uni": "uniswap", "uniswap": "uniswap",
+    "atom": "cosmos", "cosmos": "cosmos",
+    "ltc": "litecoin", "litecoin": "litecoin",
+    "trx": "tron", "tron": "tron",
+    "usdt": "tether", "tether": "tether",
+    "usdc": "usd-coin",
+    "dai": "dai",
+    "near": "near", "near protocol": "near",
+    "apt": "aptos", "aptos": "aptos",
+    "arb": "arbitrum", "arbitrum": "arbitrum",
+    "op": "optimism", "optimism": "optimism",
+    "sui": "sui",
+    "pepe": "pepe",
+}
+
+# Palabras frecuentes que también son nombres de alguna moneda en CoinGecko
+_COMMON_WORDS = frozenset({
+    "ahora", "amigo", "bueno", "cripto", "crypto", "dinero", "gracias", "grupo",
+    "hola", "mercado", "moneda", "mundo", "nada", "precio", "todo", "token",
+    "wallet", "apple", "money", "world", "games", "meme", "memes",
+    "coin", "cash", "gold", "earth", "energy", "magic", "music", "smart", "super",
+})
+_MIN_NAME_LEN = 5
+_MIN_SYMBOL_LEN = 2
+
+# Tipos de alias: los curados matchean siempre; los símbolos del top sólo
+# en mayúsculas o con "$"; los demás símbolos sólo con "$"; los de
+# _RESOLVE_ONLY sólo con resolve()
+_ALIAS, _NAME, _SYMBOL, _RESOLVE_ONLY, _DOLLAR_SYMBOL = 0, 1, 2, 3, 4
+
+_WORD = re.compile(r"\$?\w+")
+
+
+class _Node:
+    __slots__ = ("children", "coin_id", "kind")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node] = {}
+        self.coin_id: str | None = None
+        self.kind = _ALIAS
+
+
+class CoinMatcher:
+    """Trie de alias (una o más palabras) → ID de CoinGecko."""
+
+    __slots__ = ("_root", "_by_key", "ids", "size")
+
+    def __init__(self) -> None:
+        self._root = _Node()
+        self._by_key: dict[str, str] = {}
+        self.ids: set[str] = set()
+        self.size = 0
+
+    def add(self, alias: str, coin_id: str, kind: int = _ALIAS) -> None:
+        words = [w.lower() for w in re.findall(r"\w+", alias)]
+        if not words:
+            return
+        self._by_key[" ".join(words)] = coin_id
+        if kind == _RESOLVE_ONLY:
+            return
+        node = self._root
+        for word in words:
+            node = node.children.setdefault(word, _Node())
+        if node.coin_id is None:
+            self.size += 1
+        node.coin_id = coin_id
+        node.kind = kind
+
+    def resolve(self, alias: str) -> str | None:
+        """ID para un alias o ID escrito a propósito (ej. /precio), en cualquier caso."""
+        cid = self._by_key.get(" ".join(w.lower() for w in re.findall(r"\w+", alias)))
+        if cid is None and alias.lower() in self.ids:
+            cid = alias.lower()
+        return cid
+
+    def find(self, text: str) -> list[str]:
+        """IDs mencionados en el texto, en orden de aparición y sin repetir."""
+        tokens = _WORD.findall(text)
+        found: dict[str, None] = {}
+        i = 0
+        while i < len(tokens):
+            node = self._root
+            match: tuple[str, int] | None = None
+            j = i
+            while j < len(tokens):
+                raw = tokens[j]
+                if j > i and raw.startswith("$"):
+                    break
+                node = node.children.get(raw.lstrip("$").lower())
+                if node is None:
+                    break
+                j += 1
+                if node.coin_id is not None and _accepts(node, tokens[i:j]):
+                    match = (node.coin_id, j)
+            if match is None:
+                i += 1
+                continue
+            found[match[0]] = None
+            i = match[1]
+        return list(found)
+
+
+def _accepts(node: _Node, words: list[str]) -> bool:
+    if node.kind == _SYMBOL:
+        raw = words[0]
+        return len(words) == 1 and (raw.startswith("$") or raw.isupper())
+    if node.kind == _DOLLAR_SYMBOL:
+        return len(words) == 1 and words[0].startswith("$")
+    return True
+
+
+def _build(coin_list: list[dict] | None = None, top_ids: set[str] | None = None) -> CoinMatcher:
+    matcher = CoinMatcher()
+    if coin_list:
+        names: dict[str, set[str]] = {}
+        symbols: dict[str, set[str]] = {}
+        for coin in coin_list:
+            cid, symbol, name = coin.get("id"), coin.get("symbol"), coin.get("name")
+            if not cid:
+                continue
+            matcher.ids.add(cid)
+            if name:
+                names.setdefault(name.lower().strip(), set()).add(cid)
+            if symbol:
+                symbols.setdefault(symbol.lower().strip(), set()).add(cid)
+        for name, ids in names.items():
+            if len(ids) != 1 or name in _COMMON_WORDS or symbols.get(name, ids) != ids:
+                continue
+            if " " not in name and len(name) < _MIN_NAME_LEN:
+                continue
+            cid = next(iter(ids))
+            matcher.add(name, cid, _NAME if top_ids and cid in top_ids else _RESOLVE_ONLY)
+        for symbol, ids in symbols.items():
+            if len(ids) != 1 or len(symbol) < _MIN_SYMBOL_LEN or not symbol.isalnum():
+                continue
+            if names.get(symbol, ids) != ids:
+                continue
+            cid = next(iter(ids))
+            matcher.add(symbol, cid, _SYMBOL if top_ids and cid in top_ids else _DOLLAR_SYMBOL)
+    for alias, cid in COIN_ALIASES.items():
+        matcher.add(alias, cid, _ALIAS)
+    return matcher
+
+
+_matcher = _build()
+_loaded_at = 0.0
+
+
+def find(text: str) -> list[str]:
+    return _matcher.find(text)
+
+
+def resolve(alias: str) -> str | None:
+    return _matcher.resolve(alias)
+
+
+async def refresh_coin_list() -> int:
+    """
+    Reconstruye el matcher con el listado completo de CoinGecko.
+    Retorna cuántos alias quedaron cargados (0 si falló y se mantuvo el anterior).
+    """
+    global _matcher, _loaded_at
+    coin_list = await market_data.fetch_coin_list()
+    if not coin_list:
+        return 0
+    # Si falla, ningún nombre del listado entra al texto libre y los símbolos
+    # piden "$" (los alias curados no cambian)
+    top_ids = set(await market_data.fetch_top_coin_ids(COIN_NAME_TOP_N))
+    _matcher = _build(coin_list, top_ids)
+    _loaded_at = time.monotonic()
+    logger.info(
+        "🪙 Listado de monedas cargado: %d alias (%d monedas, nombres del top %d)",
+        _matcher.size, len(coin_list), len(top_ids),
+    )
+    return _matcher.size
+
+
+def stats() -> dict:
+    return {
+        "aliases": _matcher.size,
+        "loaded_age_s": time.monotonic() - _loaded_at if _loaded_at else None,
+    }
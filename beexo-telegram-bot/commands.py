@@ -8,16 +8,19 @@ import re
 import random
 from datetime import datetime, timezone
 
-import httpx
 from telegram import Update, ChatMember
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
 from config import TZ, MEMES_DIR, logger
 from content import POLLS
-from handlers import handle_image_request, reminder_fire, safe_reply
-from db import save_report, save_reminder, get_top_users, get_user_stats
-from ai_chat import ask_ai, COIN_ALIASES
+from handlers import StreamingEditor, handle_image_request, reminder_fire, safe_reply
+import coin_matcher
+import db_async
+import leaderboard
+import market_data
+import xp_buffer
+from ai_chat import ask_ai
 from meme_pool import pick_meme, use_and_replace
 from trivias_data import TRIVIAS_DATA as TRIVIAS
 
@@ -149,9 +152,14 @@ async def ask_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
     question = " ".join(context.args)
     thinking_msg = await update.message.reply_text("🤖 Pensando...")
+    editor = StreamingEditor(thinking_msg)
     user_name = update.effective_user.username or update.effective_user.first_name or ""
-    answer = await ask_ai(update.effective_user.id, question, user_name)
-    await thinking_msg.edit_text(answer)
+    answer = await ask_ai(
+        update.effective_user.id, question, user_name,
+        on_partial=editor.update, on_queued=editor.queued,
+    )
+    if not await editor.finish(answer):
+        await update.message.reply_text(answer)
 
 
 async def imagen_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -191,7 +199,8 @@ async def precio_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
             "`/precio eth sol ada`\n\n"
             "Criptos soportadas: BTC, ETH, BNB, SOL, ADA, XRP, DOGE, DOT, "
             "SHIB, AVAX, MATIC, LINK, UNI, ATOM, LTC, TRX, USDT, USDC, "
-            "NEAR, APT, ARB, OP, SUI, PEPE",
+            "NEAR, APT, ARB, OP, SUI, PEPE y cualquier otra de CoinGecko "
+            "(por símbolo, nombre o ID)",
             parse_mode=ParseMode.MARKDOWN,
         )
         return
@@ -200,9 +209,8 @@ async def precio_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     coin_ids = []
     unknown = []
     for arg in context.args:
-        alias = arg.lower().strip()
-        if alias in COIN_ALIASES:
-            cg_id = COIN_ALIASES[alias]
+        cg_id = coin_matcher.resolve(arg.strip())
+        if cg_id:
             if cg_id not in coin_ids:
                 coin_ids.append(cg_id)
         else:
@@ -216,23 +224,12 @@ async def precio_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         )
         return
 
-    # Fetch precios
+    # Precios desde el cache compartido (sólo pide a CoinGecko lo que falta)
     try:
-        ids_str = ",".join(coin_ids[:10])
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(
-                "https://api.coingecko.com/api/v3/simple/price",
-                params={
-                    "ids": ids_str,
-                    "vs_currencies": "usd,ars",
-                    "include_24hr_change": "true",
-                    "include_market_cap": "true",
-                },
-            )
-        if resp.status_code != 200:
+        data = await market_data.get_prices(coin_ids[:10])
+        if not data:
             await update.message.reply_text("⚠️ No pude obtener los precios. Intentá de nuevo.")
             return
-        data = resp.json()
     except Exception as e:
         logger.warning("Error en /precio: %s", e)
         await update.message.reply_text("⚠️ Error al consultar precios. Intentá de nuevo.")
@@ -339,7 +336,7 @@ async def recordar_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     chat_id = update.effective_chat.id
 
     scheduled_at = int(datetime.now(timezone.utc).timestamp()) + seconds
-    reminder_id = save_reminder(user.id, user_name, chat_id, reminder_text, scheduled_at)
+    reminder_id = await db_async.save_reminder(user.id, user_name, chat_id, reminder_text, scheduled_at)
 
     context.job_queue.run_once(
         reminder_fire, when=seconds,
@@ -410,7 +407,7 @@ async def report_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
                 await msg.reply_text("Usuario inválido. Usa @usuario o responde al mensaje.")
                 return
 
-    rid = save_report(
+    rid = await db_async.save_report(
         reporter_id=user.id,
         reporter_name=user.first_name or "",
         reported_id=getattr(target_user, "id", None),
@@ -465,7 +462,11 @@ async def id_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def top_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Comando /top — Muestra el leaderboard de XP."""
-    top_users = get_top_users(10)
+    if leaderboard.is_loaded():
+        top_users = leaderboard.top(10)
+    else:
+        await xp_buffer.flush_async()
+        top_users = await db_async.get_top_users(10)
     if not top_users:
         await update.message.reply_text("Todavía no hay usuarios rankeados. ¡Escriban para ganar XP!")
         return
@@ -484,7 +485,14 @@ async def top_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def me_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Comando /me — Muestra tu nivel y XP actual."""
     user = update.effective_user
-    stats = get_user_stats(user.id)
+    if leaderboard.is_loaded():
+        stats = leaderboard.get(user.id)
+    else:
+        stats = await db_async.get_user_stats(user.id)
+        cached = xp_buffer.get_cached(user.id)
+        if stats and cached:
+            # Incluir XP todavía no volcado a la DB
+            stats.update(cached)
     
     if not stats:
         await update.message.reply_text(
@@ -503,4 +511,7 @@ async def me_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         f"🎖 *Nivel:* {level}\n"
         f"✨ *Experiencia:* {xp}/{next_level_xp} XP\n"
     )
+    position = leaderboard.rank(user.id)
+    if position:
+        text += f"🏅 *Ranking:* #{position} de {leaderboard.size()}\n"
     await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
@@ -49,6 +49,7 @@ DATABASE_URL: str | None = os.getenv("DATABASE_URL")
 # ── Rutas ──
 MEMES_DIR: str = os.path.join(_script_dir, "memes")
 DB_PATH: str = os.path.join(_script_dir, "beexy_history.db")
+ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "")  # volumen persistente para archivar historial en SQLite; vacío = no se archiva
 
 # ── Constantes ──
 SCAM_ALERT_COOLDOWN_MIN: int = 1
@@ -57,6 +58,68 @@ GEMINI_IMAGE_MODEL: str = "models/gemini-2.5-flash-image"
 GROQ_URL: str = "https://api.groq.com/openai/v1/chat/completions"  # legacy
 GROQ_MODEL: str = "llama-3.3-70b-versatile"  # legacy
 MAX_AI_HISTORY: int = 8
+AI_HISTORY_MAX_USERS: int = int(os.getenv("AI_HISTORY_MAX_USERS", "500"))      # conversaciones IA en memoria
+AI_HISTORY_IDLE_TTL: float = float(os.getenv("AI_HISTORY_IDLE_TTL", "3600"))  # seg. sin hablar antes de soltar una conversación
+AI_ANSWER_CACHE_TTL: float = float(os.getenv("AI_ANSWER_CACHE_TTL", "21600"))  # seg. que se reutiliza una respuesta de FAQ
+AI_ANSWER_CACHE_MAX: int = int(os.getenv("AI_ANSWER_CACHE_MAX", "1000"))        # respuestas cacheadas
+AI_STREAMING: bool = os.getenv("AI_STREAMING", "1").lower() in ("1", "true", "yes")  # respuestas IA progresivas
+AI_STREAM_EDIT_INTERVAL: float = float(os.getenv("AI_STREAM_EDIT_INTERVAL", "1.5"))    # seg. mínimos entre ediciones del mensaje
+GEMINI_RPM: int = max(1, int(os.getenv("GEMINI_RPM", "15")))                    # llamadas a Gemini por minuto (todas)
+GEMINI_QUEUE_MAX_WAIT: float = float(os.getenv("GEMINI_QUEUE_MAX_WAIT", "45"))   # seg. máx. que un usuario espera turno
+GEMINI_MAX_QUEUE: int = int(os.getenv("GEMINI_MAX_QUEUE", "50"))                 # llamadas en cola antes de rechazar
+AI_PROMPT_TOKEN_BUDGET: int = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "3000"))  # tokens de entrada estimados por pregunta
+AI_CONTEXT_DEADLINE: float = float(os.getenv("AI_CONTEXT_DEADLINE", "2.5"))  # seg. máx. juntando contexto antes de llamar a Gemini
+
+# ── Pool de conexiones DB ──
+DB_POOL_MIN: int = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX: int = int(os.getenv("DB_POOL_MAX", "8"))
+DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "10"))        # seg. esperando una conexión libre
+DB_POOL_MAX_LIFETIME: float = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # seg. antes de reciclar
+DB_POOL_HEALTHCHECK_IDLE: float = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))  # seg. ociosa antes de validar
+DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_MAX)))  # hilos de db_async
+
+# ── SQLite afinado (opt-in, para deploys de un solo nodo sin DATABASE_URL) ──
+# WAL + synchronous=NORMAL + cache/mmap grandes + busy_timeout
+SQLITE_TUNED: bool = os.getenv("SQLITE_TUNED", "").lower() in ("1", "true", "yes")
+SQLITE_CACHE_MB: int = int(os.getenv("SQLITE_CACHE_MB", "32"))
+SQLITE_MMAP_MB: int = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_STATEMENT_CACHE: int = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))  # statements compilados por conexión
+
+# ── Retención de historial ──
+RETENTION_KEEP_TURNS: int = int(os.getenv("RETENTION_KEEP_TURNS", "50"))  # filas por usuario que quedan en caliente
+RETENTION_BATCH: int = int(os.getenv("RETENTION_BATCH", "1000"))          # filas por lote archivado
+
+# ── XP ──
+XP_FLUSH_INTERVAL: float = float(os.getenv("XP_FLUSH_INTERVAL", "5"))  # seg. entre volcados de XP a la DB
+
+# ── Procesamiento concurrente de updates ──
+UPDATE_CONCURRENCY: int = max(1, int(os.getenv("UPDATE_CONCURRENCY", "16")))  # updates procesándose a la vez (chats distintos)
+UPDATE_MAX_PENDING: int = int(os.getenv("UPDATE_MAX_PENDING", "256"))           # updates en vuelo, incluidos los que esperan turno
+
+# ── Clientes HTTP compartidos ──
+HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "1").lower() in ("1", "true", "yes")  # sólo si está instalado h2
+HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))          # seg. que vive una conexión ociosa
+
+# ── Búsqueda web (DuckDuckGo) ──
+SEARCH_WORKERS: int = int(os.getenv("SEARCH_WORKERS", "3"))                  # búsquedas DDGS simultáneas
+SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", "900"))        # seg. que se reutiliza un resultado
+SEARCH_BUDGET_PER_MIN: int = int(os.getenv("SEARCH_BUDGET_PER_MIN", "20"))   # búsquedas reales por minuto (todo el bot)
+GIF_CACHE_PER_EMOTION: int = int(os.getenv("GIF_CACHE_PER_EMOTION", "6"))                     # GIFs validados por emoción
+GIF_CACHE_REFRESH_INTERVAL: float = float(os.getenv("GIF_CACHE_REFRESH_INTERVAL", "21600"))  # seg. entre rellenos del cache de GIFs
+
+# ── Datos de mercado (CoinGecko) ──
+MARKET_FRESH_TTL: float = float(os.getenv("MARKET_FRESH_TTL", "60"))            # seg. en que un precio se sirve sin refrescar
+MARKET_STALE_TTL: float = float(os.getenv("MARKET_STALE_TTL", "900"))           # seg. máx. sirviendo un precio viejo mientras se refresca
+MARKET_REFRESH_INTERVAL: float = float(os.getenv("MARKET_REFRESH_INTERVAL", "60"))  # seg. entre refrescos en segundo plano
+COIN_LIST_REFRESH_INTERVAL: float = float(os.getenv("COIN_LIST_REFRESH_INTERVAL", "86400"))  # seg. entre recargas del listado de monedas
+COIN_NAME_TOP_N: int = min(250, int(os.getenv("COIN_NAME_TOP_N", "250")))    # monedas (por market cap) cuyo nombre se detecta en texto libre
+MARKET_TRACKED_COINS: list[str] = [
+    c.strip() for c in os.getenv(
+        "MARKET_TRACKED_COINS",
+        "bitcoin,ethereum,binancecoin,solana,ripple,cardano,dogecoin,polkadot,tether",
+    ).split(",") if c.strip()
+]
 
 # ── Rate limiting ──
 
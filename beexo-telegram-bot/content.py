@@ -2,6 +2,8 @@
 Contenido estático de BeeXy: mensajes, keywords, reacciones y polls.
 """
 
+from keyword_engine import KeywordEngine
+
 # ═══════════════════════════════════════════════════════════════
 # MENSAJES DIARIOS
 # ═══════════════════════════════════════════════════════════════
@@ -222,12 +224,31 @@ POLLS = [
 # UTILIDADES
 # ═══════════════════════════════════════════════════════════════
 
+# Todas las keywords en un único autómata: una pasada por mensaje
+_KEYWORD_ENGINE = KeywordEngine({
+    "wallet": KEYWORDS_WALLET,
+    "signals": KEYWORDS_SIGNALS,
+    **{f"emotion:{name}": data["keywords"] for name, data in EMOTION_REACTIONS.items()},
+})
+
+
+def classify(text: str) -> set[str]:
+    """
+    Categorías de keywords presentes en el texto: "wallet", "signals" y
+    "emotion:<nombre>" por cada reacción de EMOTION_REACTIONS.
+    """
+    return _KEYWORD_ENGINE.match(text or "")
+
+
+def detected_emotion(categories: set[str]) -> str | None:
+    """Primera emoción (en el orden de EMOTION_REACTIONS) presente en `categories`."""
+    return next((name for name in EMOTION_REACTIONS if f"emotion:{name}" in categories), None)
+
+
 def contains_wallet_keywords(text: str) -> bool:
     """Devuelve True si el texto contiene keywords relacionadas con wallets/scams."""
-    t = (text or "").lower()
-    return any(k in t for k in KEYWORDS_WALLET)
+    return "wallet" in classify(text)
 
 def contains_signals_keywords(text: str) -> bool:
     """Devuelve True si el texto contiene keywords relacionadas con canales de señales/spam."""
-    t = (text or "").lower()
-    return any(k in t for k in KEYWORDS_SIGNALS)
+    return "signals" in classify(text)
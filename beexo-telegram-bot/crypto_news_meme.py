@@ -14,25 +14,24 @@ import random
 import logging
 from datetime import datetime
 
-import httpx
 import re
 import asyncio
 import json
 from PIL import Image, ImageDraw, ImageFont
 
-from duckduckgo_search import DDGS
 from google import genai
 from generate_memes import create_meme
 
 from config import GEMINI_API_KEY, GEMINI_IMAGE_MODEL, GEMINI_MODEL, TZ
+import gemini_limiter
+import market_data
+import web_search
 
 logger = logging.getLogger("beexo.meme_ai")
 
 MEMES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memes")
 os.makedirs(MEMES_DIR, exist_ok=True)
 
-COINGECKO_BASE = "https://api.coingecko.com/api/v3"
-
 
 # ═══════════════════════════════════════════════════════════════
 # 1. FETCH CONTEXT (noticias + mercado)
@@ -49,61 +48,46 @@ async def fetch_crypto_context() -> dict:
 
     # ── Noticias vía DuckDuckGo ──
     try:
-        if DDGS:
-            queries = [
-                "crypto bitcoin ethereum noticias",
-                "criptomonedas blockchain web3 novedades",
-            ]
-            query = random.choice(queries)
-            with DDGS() as ddgs:
-                results = list(ddgs.news(query, region="wt-wt", max_results=8))
-            for r in results[:5]:
-                context["news"].append({
-                    "title": r.get("title", ""),
-                    "body": (r.get("body") or "")[:200],
-                    "source": r.get("source", ""),
-                })
+        queries = [
+            "crypto bitcoin ethereum noticias",
+            "criptomonedas blockchain web3 novedades",
+        ]
+        query = random.choice(queries)
+        results = await web_search.news(query, region="wt-wt", max_results=8)
+        for r in results[:5]:
+            context["news"].append({
+                "title": r.get("title", ""),
+                "body": (r.get("body") or "")[:200],
+                "source": r.get("source", ""),
+            })
     except Exception as e:
         logger.warning("⚠️ Error buscando noticias para meme: %s", e)
 
-    # ── Top movers vía CoinGecko ──
-    async with httpx.AsyncClient(timeout=15) as client:
-        try:
-            resp = await client.get(
-                f"{COINGECKO_BASE}/coins/markets",
-                params={
-                    "vs_currency": "usd",
-                    "order": "market_cap_desc",
-                    "per_page": 25,
-                    "page": 1,
-                    "price_change_percentage": "24h",
-                },
-            )
-            if resp.status_code == 200:
-                for coin in resp.json():
-                    change = coin.get("price_change_percentage_24h") or 0
-                    if abs(change) >= 2:
-                        context["movers"].append({
-                            "symbol": coin["symbol"].upper(),
-                            "name": coin["name"],
-                            "price": coin["current_price"],
-                            "change_24h": round(change, 1),
-                        })
-        except Exception as e:
-            logger.warning("⚠️ Error fetching market data: %s", e)
-
-        # ── Trending ──
-        try:
-            resp = await client.get(f"{COINGECKO_BASE}/search/trending")
-            if resp.status_code == 200:
-                for item in resp.json().get("coins", [])[:3]:
-                    c = item.get("item", {})
-                    context["trending"].append({
-                        "name": c.get("name", ""),
-                        "symbol": c.get("symbol", "").upper(),
-                    })
-        except Exception as e:
-            logger.warning("⚠️ Error fetching trending: %s", e)
+    # ── Top movers vía CoinGecko (cache compartido) ──
+    try:
+        for coin in await market_data.get_markets():
+            change = coin.get("price_change_percentage_24h") or 0
+            if abs(change) >= 2:
+                context["movers"].append({
+                    "symbol": coin["symbol"].upper(),
+                    "name": coin["name"],
+                    "price": coin["current_price"],
+                    "change_24h": round(change, 1),
+                })
+    except Exception as e:
+        logger.warning("⚠️ Error fetching market data: %s", e)
+
+    # ── Trending ──
+    try:
+        trending = await market_data.get_trending() or {}
+        for item in trending.get("coins", [])[:3]:
+            c = item.get("item", {})
+            context["trending"].append({
+                "name": c.get("name", ""),
+                "symbol": c.get("symbol", "").upper(),
+            })
+    except Exception as e:
+        logger.warning("⚠️ Error fetching trending: %s", e)
 
     return context
 
@@ -186,19 +170,22 @@ async def generate_meme_content(context: dict) -> dict | None:
         for attempt in range(1, 4):
             try:
                 client = genai.Client(api_key=GEMINI_API_KEY)
-                response = client.models.generate_content(
-                    model=GEMINI_MODEL,
-                    contents=prompt,
-                    config={
-                        "temperature": 0.9,
-                        "max_output_tokens": 1000,
-                        "safety_settings": [
-                            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-                        ]
-                    },
+                response = await gemini_limiter.call(
+                    lambda: client.aio.models.generate_content(
+                        model=GEMINI_MODEL,
+                        contents=prompt,
+                        config={
+                            "temperature": 0.9,
+                            "max_output_tokens": 1000,
+                            "safety_settings": [
+                                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+                                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+                                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+                                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+                            ]
+                        },
+                    ),
+                    priority=gemini_limiter.BACKGROUND,
                 )
 
                 text = (response.text or "").strip()
@@ -215,9 +202,13 @@ async def generate_meme_content(context: dict) -> dict | None:
                         logger.info("Finish reason: %s", response.candidates[0].finish_reason)
                 break
 
+            except gemini_limiter.GeminiBusy:
+                logger.info("Gemini saturado, se saltea el meme de noticias")
+                return None
             except Exception as e:
                 logger.warning("⚠️ Error Gemini (intento %d): %s", attempt, e)
-                if "503" in str(e) or "429" in str(e):
+                # Los 429 ya los reintenta gemini_limiter
+                if "503" in str(e):
                     if attempt < 3:
                         await asyncio.sleep(2 * attempt)
                         continue
@@ -276,12 +267,15 @@ async def generate_meme_image(image_prompt: str) -> bytes | None:
         for attempt in range(1, 4):
             try:
                 client = genai.Client(api_key=GEMINI_API_KEY)
-                response = client.models.generate_content(
-                    model=GEMINI_IMAGE_MODEL,
-                    contents=full_prompt,
-                    config={
-                        "response_modalities": ["IMAGE", "TEXT"],
-                    },
+                response = await gemini_limiter.call(
+                    lambda: client.aio.models.generate_content(
+                        model=GEMINI_IMAGE_MODEL,
+                        contents=full_prompt,
+                        config={
+                            "response_modalities": ["IMAGE", "TEXT"],
+                        },
+                    ),
+                    priority=gemini_limiter.BACKGROUND,
                 )
 
                 # Extraer la imagen de la respuesta
@@ -296,9 +290,12 @@ async def generate_meme_image(image_prompt: str) -> bytes | None:
                 
                 logger.warning("Gemini no devolvió imagen (intento %d)", attempt)
             
+            except gemini_limiter.GeminiBusy:
+                logger.info("Gemini saturado, se saltea la imagen del meme")
+                return None
             except Exception as e:
                 logger.warning("⚠️ Error Gemini Imagen (intento %d): %s", attempt, e)
-                if "503" in str(e) or "429" in str(e):
+                if "503" in str(e):
                     if attempt < 3:
                         await asyncio.sleep(2 * attempt)
                         continue
@@ -1,53 +1,521 @@
 """
 Capa de base de datos para BeeXy.
 Soporta SQLite (local) y Postgres (Railway) de forma transparente.
-Usa context managers para garantizar que las conexiones se cierren.
+Las conexiones salen de un pool acotado (Postgres) o se reutilizan
+por hilo (SQLite); `get_conn` las presta y las devuelve al salir.
 """
 
+import re
 import sqlite3
+import threading
+import time
+import unicodedata
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from typing import Any, Generator
 
-from config import DATABASE_URL, DB_PATH, logger
+from config import (
+    DATABASE_URL, DB_PATH, logger,
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+    DB_POOL_MAX_LIFETIME, DB_POOL_HEALTHCHECK_IDLE,
+    SQLITE_TUNED, SQLITE_CACHE_MB, SQLITE_MMAP_MB, SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_STATEMENT_CACHE,
+)
 
 
 # ═══════════════════════════════════════════════════════════════
-# CONEXIÓN
+# POOL DE CONEXIONES
 # ═══════════════════════════════════════════════════════════════
 
+# El backend se decide una vez al importar: las queries del registro
+# (ver más abajo) se arman para ese backend y no cambian en runtime.
+_PG: bool = bool(DATABASE_URL)
+
+
 def _is_postgres() -> bool:
-    return bool(DATABASE_URL)
+    return _PG
 
 
-@contextmanager
-def get_conn() -> Generator:
-    """Context manager que devuelve una conexión DB abierta y la cierra al salir."""
-    conn = None
-    try:
-        if _is_postgres():
-            import psycopg2
-            conn = psycopg2.connect(DATABASE_URL)
-        else:
-            conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        yield conn
-    finally:
+class _PooledConn:
+    """Conexión física del pool con sus metadatos de vida."""
+
+    __slots__ = ("conn", "created_at", "last_used", "prepared")
+
+    def __init__(self, conn: Any) -> None:
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        # Nombres de statements ya preparados (PREPARE) en esta sesión
+        self.prepared: set[str] = set()
+
+
+class _PostgresPool:
+    """
+    Pool acotado de conexiones psycopg2.
+
+    No usamos `psycopg2.pool` porque cierra toda conexión por encima de
+    `minconn` al devolverla, y acá queremos conexiones de larga vida.
+    - Capacidad máxima vía semáforo (espera hasta `timeout` si está lleno)
+    - LIFO: se reutiliza la conexión más caliente
+    - Health check (SELECT 1) si la conexión estuvo ociosa un rato
+    - Reciclado al superar `max_lifetime`
+    """
+
+    def __init__(
+        self, dsn: str, minconn: int, maxconn: int, timeout: float,
+        max_lifetime: float, healthcheck_idle: float,
+    ) -> None:
+        self._dsn = dsn
+        self._minconn = max(0, min(minconn, maxconn))
+        self._maxconn = max(1, maxconn)
+        self._timeout = timeout
+        self._max_lifetime = max_lifetime
+        self._healthcheck_idle = healthcheck_idle
+        self._slots = threading.BoundedSemaphore(self._maxconn)
+        self._lock = threading.Lock()
+        self._idle: list[_PooledConn] = []
+        self._in_use: dict[int, _PooledConn] = {}
+        self._closed = False
+        self._stats = {
+            "checkouts": 0, "created": 0, "recycled": 0, "discarded": 0,
+            "healthcheck_failures": 0, "timeouts": 0, "prepares": 0,
+            "wait_total_ms": 0.0, "wait_max_ms": 0.0,
+        }
+        for _ in range(self._minconn):
+            try:
+                self._idle.append(self._connect())
+            except Exception as e:
+                logger.warning("Pool DB: no se pudo precalentar conexión: %s", e)
+                break
+
+    def _count(self, key: str) -> None:
+        # acquire/release corren en los hilos de db_async: contar bajo el lock
+        with self._lock:
+            self._stats[key] += 1
+
+    def _connect(self) -> _PooledConn:
+        import psycopg2
+        pc = _PooledConn(psycopg2.connect(self._dsn))
+        self._count("created")
+        return pc
+
+    def _discard(self, pc: _PooledConn) -> None:
+        try:
+            pc.conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, pc: _PooledConn, now: float) -> bool:
+        """Valida una conexión ociosa antes de prestarla."""
+        if pc.conn.closed:
+            self._count("discarded")
+            return False
+        if self._max_lifetime and now - pc.created_at > self._max_lifetime:
+            self._count("recycled")
+            return False
+        if now - pc.last_used > self._healthcheck_idle:
+            try:
+                cur = pc.conn.cursor()
+                cur.execute("SELECT 1")
+                cur.fetchone()
+                pc.conn.rollback()
+            except Exception:
+                self._count("healthcheck_failures")
+                return False
+        return True
+
+    def acquire(self) -> Any:
+        if self._closed:
+            raise RuntimeError("El pool de conexiones está cerrado")
+        t0 = time.monotonic()
+        if not self._slots.acquire(timeout=self._timeout):
+            self._count("timeouts")
+            raise TimeoutError(f"Sin conexiones DB libres tras {self._timeout:.0f}s")
+        wait_ms = (time.monotonic() - t0) * 1000
+        try:
+            pc = None
+            while pc is None:
+                with self._lock:
+                    candidate = self._idle.pop() if self._idle else None
+                if candidate is None:
+                    pc = self._connect()
+                elif self._is_usable(candidate, time.monotonic()):
+                    pc = candidate
+                else:
+                    self._discard(candidate)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use[id(pc.conn)] = pc
+            self._stats["checkouts"] += 1
+            self._stats["wait_total_ms"] += wait_ms
+            self._stats["wait_max_ms"] = max(self._stats["wait_max_ms"], wait_ms)
+        return pc.conn
+
+    def release(self, conn: Any, broken: bool = False) -> None:
+        with self._lock:
+            pc = self._in_use.pop(id(conn), None)
+        if pc is None:
+            return
+        try:
+            if broken or self._closed or conn.closed:
+                self._discard(pc)
+                self._count("discarded")
+                return
+            try:
+                # Nunca devolver una transacción abierta al pool
+                from psycopg2 import extensions as _ext
+                status = conn.info.transaction_status
+                if status == _ext.TRANSACTION_STATUS_UNKNOWN:
+                    self._discard(pc)
+                    self._count("discarded")
+                    return
+                if status != _ext.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                self._discard(pc)
+                self._count("discarded")
+                return
+            pc.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(pc)
+        finally:
+            self._slots.release()
+
+    def prepared_set(self, conn: Any) -> set[str] | None:
+        """
+        Statements preparados de una conexión prestada (None si no es del pool).
+        El set es de esa conexión, que la usa un solo hilo a la vez.
+        """
+        with self._lock:
+            pc = self._in_use.get(id(conn))
+        return pc.prepared if pc is not None else None
+
+    def note_prepare(self) -> None:
+        self._count("prepares")
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pc in idle:
+            self._discard(pc)
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["idle"] = len(self._idle)
+            s["in_use"] = len(self._in_use)
+        s["backend"] = "postgres"
+        s["size"] = s["idle"] + s["in_use"]
+        s["max"] = self._maxconn
+        s["wait_avg_ms"] = s["wait_total_ms"] / s["checkouts"] if s["checkouts"] else 0.0
+        return s
+
+
+class _SqlitePool:
+    """
+    Una conexión SQLite reutilizable por hilo.
+    SQLite no gana nada con conexiones concurrentes sobre el mismo archivo,
+    así que cada hilo mantiene la suya mientras no cambie la ruta.
+    """
+
+    def __init__(self, max_lifetime: float) -> None:
+        self._local = threading.local()
+        self._max_lifetime = max_lifetime
+        self._lock = threading.Lock()
+        self._all: list[sqlite3.Connection] = []
+        self._stats = {"checkouts": 0, "created": 0, "recycled": 0, "discarded": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _connect(self, path: str) -> sqlite3.Connection:
+        # El cache de statements de sqlite3 evita re-compilar las queries del
+        # registro: mismo texto SQL → mismo statement ya preparado.
+        conn = sqlite3.connect(
+            path, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE,
+        )
+        if SQLITE_TUNED:
+            _tune_sqlite(conn)
+        with self._lock:
+            self._all.append(conn)
+            self._stats["created"] += 1
+        return conn
+
+    def _drop(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if conn in self._all:
+                self._all.remove(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self) -> sqlite3.Connection:
+        path = DB_PATH
+        now = time.monotonic()
+        conn = getattr(self._local, "conn", None)
         if conn is not None:
+            stale = getattr(self._local, "path", None) != path
+            expired = self._max_lifetime and now - self._local.created_at > self._max_lifetime
+            if stale or expired:
+                self._drop(conn)
+                self._count("recycled")
+                conn = None
+        if conn is None:
+            conn = self._connect(path)
+            self._local.conn = conn
+            self._local.path = path
+            self._local.created_at = now
+        self._count("checkouts")
+        return conn
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False) -> None:
+        if broken:
+            self._local.conn = None
+            self._drop(conn)
+            self._count("discarded")
+            return
+        try:
+            # Igual que al cerrar: lo no commiteado se descarta
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            self._local.conn = None
+            self._drop(conn)
+            self._count("discarded")
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
             try:
                 conn.close()
             except Exception:
                 pass
+        self._local = threading.local()
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["size"] = len(self._all)
+        s["backend"] = "sqlite"
+        s["tuned"] = SQLITE_TUNED
+        return s
+
+
+def _tune_sqlite(conn: sqlite3.Connection) -> None:
+    """
+    PRAGMAs para un solo nodo con muchas escrituras chicas.
+    Se aplican una vez por conexión del pool (journal_mode=WAL persiste en el archivo).
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+_pool: _PostgresPool | _SqlitePool | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> _PostgresPool | _SqlitePool:
+    """Crea el pool en el primer uso (lazy)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if _PG:
+                    _pool = _PostgresPool(
+                        DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+                        DB_POOL_MAX_LIFETIME, DB_POOL_HEALTHCHECK_IDLE,
+                    )
+                else:
+                    _pool = _SqlitePool(DB_POOL_MAX_LIFETIME)
+    return _pool
+
+
+@contextmanager
+def get_conn() -> Generator:
+    """
+    Context manager que presta una conexión del pool y la devuelve al salir.
+    Lo que no se haya commiteado se descarta (rollback) al devolverla.
+    """
+    pool = _get_pool()
+    conn = pool.acquire()
+    broken = False
+    try:
+        yield conn
+    except Exception:
+        broken = _is_connection_error(conn)
+        raise
+    finally:
+        pool.release(conn, broken=broken)
+
+
+def _is_connection_error(conn: Any) -> bool:
+    """True si la conexión quedó inutilizable (caída de red, server reiniciado)."""
+    return bool(getattr(conn, "closed", False))
+
+
+def pool_stats() -> dict:
+    """Estadísticas del pool: tamaño, checkouts, esperas, reciclados."""
+    return _get_pool().stats()
+
+
+def close_pool() -> None:
+    """Cierra todas las conexiones del pool (llamar al apagar el bot)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        logger.info("🗄️ Cerrando pool DB: %s", pool.stats())
+        pool.close()
 
 
 def _ph(name: str = "?") -> str:
     """Devuelve el placeholder correcto según el backend."""
-    return "%s" if _is_postgres() else "?"
+    return "%s" if _PG else "?"
 
 
 def _now_str() -> str | datetime:
     """Devuelve el timestamp actual en el formato adecuado para el backend."""
     now = datetime.now(timezone.utc)
-    return now if _is_postgres() else now.isoformat()
+    return now if _PG else now.isoformat()
+
+
+# ═══════════════════════════════════════════════════════════════
+# REGISTRO DE QUERIES
+# ═══════════════════════════════════════════════════════════════
+# Las queries frecuentes se escriben una sola vez con placeholders `?` y se
+# compilan al importar para el backend activo:
+#   • Postgres: PREPARE por conexión la primera vez que se usa y después
+#     EXECUTE, así el server no vuelve a parsear ni planificar.
+#   • SQLite: el texto queda fijo y lo reutiliza el cache de statements.
+
+
+class _Query:
+    """Statement del registro, ya armado para el backend activo."""
+
+    __slots__ = ("name", "sql", "prepare_sql", "execute_sql")
+
+    def __init__(self, name: str, sql: str) -> None:
+        self.name = name
+        if _PG:
+            n = sql.count("?")
+            counter = iter(range(1, n + 1))
+            numbered = re.sub(r"\?", lambda _: f"${next(counter)}", sql)
+            self.sql = sql.replace("?", "%s")
+            self.prepare_sql = f"PREPARE {name} AS {numbered}"
+            self.execute_sql = (
+                f"EXECUTE {name} ({', '.join(['%s'] * n)})" if n else f"EXECUTE {name}"
+            )
+        else:
+            self.sql = sql
+            self.prepare_sql = None
+            self.execute_sql = sql
+
+
+def _q(name: str, sql: str, pg_sql: str | None = None) -> _Query:
+    return _Query(f"bx_{name}", pg_sql if (_PG and pg_sql) else sql)
+
+
+_Q: dict[str, _Query] = {q.name[3:]: q for q in (
+    _q("log_interaction",
+       "INSERT INTO interactions (user_id, user_name, question, answer, created_at) "
+       "VALUES (?, ?, ?, ?, ?)"),
+    _q("save_report",
+       "INSERT INTO reports (reporter_id, reporter_name, reported_id, reported_name, "
+       "chat_id, reason, created_at, handled) VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+       pg_sql="INSERT INTO reports (reporter_id, reporter_name, reported_id, reported_name, "
+              "chat_id, reason, created_at, handled) VALUES (?, ?, ?, ?, ?, ?, ?, 0) "
+              "RETURNING id"),
+    _q("save_reminder",
+       "INSERT INTO reminders (user_id, user_name, chat_id, text, scheduled_at, "
+       "created_at, fired) VALUES (?, ?, ?, ?, ?, ?, 0)",
+       pg_sql="INSERT INTO reminders (user_id, user_name, chat_id, text, scheduled_at, "
+              "created_at, fired) VALUES (?, ?, ?, ?, ?, ?, 0) RETURNING id"),
+    _q("mark_reminder_fired",
+       "UPDATE reminders SET fired=1 WHERE id=?"),
+    _q("pending_reminders",
+       "SELECT id, chat_id, user_id, user_name, text, scheduled_at "
+       "FROM reminders WHERE fired=0 AND scheduled_at IS NOT NULL"),
+    _q("kb_search",
+       "SELECT title, content, source FROM kb_docs WHERE kb_docs MATCH ? "
+       "ORDER BY bm25(kb_docs, 2.0, 1.0, 0.0) LIMIT ?",
+       pg_sql="SELECT title, content, source FROM kb_docs, "
+              "to_tsquery('es_unaccent', ?) q WHERE search_vector @@ q "
+              "ORDER BY ts_rank(search_vector, q) DESC LIMIT ?"),
+    _q("kb_fingerprint",
+       "SELECT COUNT(*), MAX(rowid) FROM kb_docs",
+       pg_sql="SELECT COUNT(*), MAX(id) FROM kb_docs"),
+    _q("save_ai_message",
+       "INSERT INTO ai_history (user_id, role, content, created_at) VALUES (?, ?, ?, ?)"),
+    _q("load_ai_history",
+       "SELECT role, content FROM ("
+       "  SELECT id, role, content, created_at FROM ai_history "
+       "  WHERE user_id=? ORDER BY created_at DESC, id DESC LIMIT ?"
+       ") sub ORDER BY created_at ASC, id ASC"),
+    _q("xp_upsert",
+       "INSERT INTO user_stats (user_id, user_name, xp, level, last_message_at) "
+       "VALUES (?, ?, ?, 1, ?) "
+       "ON CONFLICT (user_id) DO UPDATE SET "
+       "user_name = excluded.user_name, "
+       "xp = user_stats.xp + excluded.xp, "
+       "last_message_at = excluded.last_message_at "
+       "RETURNING xp, level"),
+    _q("xp_set_level",
+       "UPDATE user_stats SET level = ? WHERE user_id = ?"),
+    _q("top_users",
+       "SELECT user_id, user_name, xp, level FROM user_stats ORDER BY xp DESC LIMIT ?"),
+    _q("all_user_stats",
+       "SELECT user_id, user_name, xp, level FROM user_stats"),
+    _q("user_stats",
+       "SELECT user_name, xp, level FROM user_stats WHERE user_id = ?"),
+    _q("get_setting",
+       "SELECT value FROM settings WHERE key = ?"),
+    _q("set_setting",
+       "INSERT INTO settings (key, value) VALUES (?, ?) "
+       "ON CONFLICT (key) DO UPDATE SET value = excluded.value"),
+)}
+
+
+def _prepare(conn: Any, cur: Any, q: _Query) -> str:
+    """
+    Devuelve el SQL a ejecutar para `q` en esta conexión.
+    En Postgres prepara el statement la primera vez que la conexión lo usa.
+    """
+    if q.prepare_sql is None:
+        return q.sql
+    pool = _get_pool()
+    prepared = pool.prepared_set(conn) if isinstance(pool, _PostgresPool) else None
+    if prepared is None:
+        return q.sql
+    if q.name not in prepared:
+        cur.execute(q.prepare_sql)
+        prepared.add(q.name)
+        pool.note_prepare()
+    return q.execute_sql
+
+
+def _exec(conn: Any, cur: Any, name: str, params: tuple = ()) -> Any:
+    """Ejecuta una query del registro por nombre."""
+    q = _Q[name]
+    cur.execute(_prepare(conn, cur, q), params)
+    return cur
+
+
+def _exec_many(conn: Any, cur: Any, name: str, seq: list[tuple]) -> Any:
+    """executemany sobre una query del registro."""
+    q = _Q[name]
+    cur.executemany(_prepare(conn, cur, q), seq)
+    return cur
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -55,15 +523,16 @@ def _now_str() -> str | datetime:
 # ═══════════════════════════════════════════════════════════════
 
 def init_db() -> None:
-    """Crea las tablas si no existen."""
+    """Crea las tablas si no existen y aplica las migraciones pendientes."""
     try:
         with get_conn() as conn:
             cur = conn.cursor()
-            if _is_postgres():
+            if _PG:
                 _init_postgres(cur)
             else:
                 _init_sqlite(cur)
             conn.commit()
+            _apply_migrations(conn)
     except Exception as e:
         logger.warning("Error inicializando DB: %s", e)
 
@@ -204,6 +673,131 @@ def _init_sqlite(cur: Any) -> None:
     """)
 
 
+# ═══════════════════════════════════════════════════════════════
+# MIGRACIONES
+# ═══════════════════════════════════════════════════════════════
+
+# Cada migración: (versión, descripción, statements Postgres, statements SQLite).
+# Se aplican en orden, una transacción por versión, y quedan registradas en
+# `schema_version`. Nunca editar una migración ya publicada: agregar otra.
+MIGRATIONS: list[tuple[int, str, list[str], list[str]]] = [
+    (
+        1, "índices de hot path",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_ai_history_user_created "
+            "ON ai_history (user_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_interactions_user_created "
+            "ON interactions (user_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_reminders_pending "
+            "ON reminders (scheduled_at) WHERE fired = 0",
+            "CREATE INDEX IF NOT EXISTS idx_user_stats_xp "
+            "ON user_stats (xp DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_reports_chat_created "
+            "ON reports (chat_id, created_at)",
+        ],
+        [
+            "CREATE INDEX IF NOT EXISTS idx_ai_history_user_created "
+            "ON ai_history (user_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_interactions_user_created "
+            "ON interactions (user_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_reminders_pending "
+            "ON reminders (scheduled_at) WHERE fired = 0",
+            "CREATE INDEX IF NOT EXISTS idx_user_stats_xp "
+            "ON user_stats (xp DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_reports_chat_created "
+            "ON reports (chat_id, created_at)",
+        ],
+    ),
+    (
+        2, "full-text search en kb_docs (español, sin acentos)",
+        [
+            "CREATE EXTENSION IF NOT EXISTS unaccent",
+            """
+            DO $$ BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+                    CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = pg_catalog.spanish);
+                    ALTER TEXT SEARCH CONFIGURATION es_unaccent
+                        ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+                END IF;
+            END $$
+            """,
+            "ALTER TABLE kb_docs ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('es_unaccent'::regconfig, coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('es_unaccent'::regconfig, coalesce(content, '')), 'B')"
+            ") STORED",
+            "CREATE INDEX IF NOT EXISTS idx_kb_docs_search ON kb_docs USING GIN (search_vector)",
+        ],
+        # SQLite ya usa FTS5 (unicode61 quita acentos por defecto)
+        [],
+    ),
+    (
+        3, "tablas de archivo para la retención",
+        [
+            "CREATE TABLE IF NOT EXISTS interactions_archive "
+            "(LIKE interactions, archived_at TIMESTAMPTZ DEFAULT NOW())",
+            "CREATE TABLE IF NOT EXISTS ai_history_archive "
+            "(LIKE ai_history, archived_at TIMESTAMPTZ DEFAULT NOW())",
+        ],
+        # En SQLite se archiva a archivos (ver retention), sólo si hay ARCHIVE_DIR
+        [],
+    ),
+]
+
+
+def _apply_migrations(conn: Any) -> None:
+    """Aplica en orden las migraciones que todavía no figuran en `schema_version`."""
+    cur = conn.cursor()
+    if _PG:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied_at TIMESTAMP
+            )
+        """)
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied_at TEXT
+            )
+        """)
+    conn.commit()
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current = cur.fetchone()[0]
+
+    p = _ph()
+    for version, name, pg_sql, sqlite_sql in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            for stmt in (pg_sql if _PG else sqlite_sql):
+                cur.execute(stmt)
+            cur.execute(
+                f"INSERT INTO schema_version (version, name, applied_at) VALUES ({p}, {p}, {p})",
+                (version, name, _now_str()),
+            )
+            conn.commit()
+            logger.info("🗄️ Migración %d aplicada: %s", version, name)
+        except Exception as e:
+            conn.rollback()
+            logger.warning("Error aplicando migración %d (%s): %s", version, name, e)
+            return
+
+
+def get_schema_version() -> int:
+    """Versión de esquema aplicada (0 si nunca se migró)."""
+    try:
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            return cur.fetchone()[0]
+    except Exception:
+        return 0
+
+
 # ═══════════════════════════════════════════════════════════════
 # OPERACIONES CRUD
 # ═══════════════════════════════════════════════════════════════
@@ -211,14 +805,10 @@ def _init_sqlite(cur: Any) -> None:
 def log_interaction(user_id: int, user_name: str | None, question: str, answer: str) -> None:
     """Guarda una interacción IA en la base."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(
-                f"INSERT INTO interactions (user_id, user_name, question, answer, created_at) "
-                f"VALUES ({p}, {p}, {p}, {p}, {p})",
-                (user_id, user_name or "", question, answer, _now_str()),
-            )
+            _exec(conn, cur, "log_interaction",
+                  (user_id, user_name or "", question, answer, _now_str()))
             conn.commit()
     except Exception as e:
         logger.debug("Error logging interaction: %s", e)
@@ -231,18 +821,15 @@ def save_report(
 ) -> int | None:
     """Guarda un reporte y devuelve el ID."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(
-                f"INSERT INTO reports (reporter_id, reporter_name, reported_id, reported_name, "
-                f"chat_id, reason, created_at, handled) "
-                f"VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p}, 0)",
-                (reporter_id, reporter_name, reported_id, reported_name,
-                 chat_id, reason, _now_str()),
-            )
+            _exec(conn, cur, "save_report",
+                  (reporter_id, reporter_name, reported_id, reported_name,
+                   chat_id, reason, _now_str()))
+            # En Postgres lastrowid no sirve (OID): el id viene por RETURNING
+            rid = cur.fetchone()[0] if _PG else cur.lastrowid
             conn.commit()
-            return cur.lastrowid
+            return rid
     except Exception as e:
         logger.warning("Error guardando reporte: %s", e)
         return None
@@ -254,16 +841,13 @@ def save_reminder(
 ) -> int | None:
     """Guarda un recordatorio y devuelve el ID."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(
-                f"INSERT INTO reminders (user_id, user_name, chat_id, text, scheduled_at, "
-                f"created_at, fired) VALUES ({p}, {p}, {p}, {p}, {p}, {p}, 0)",
-                (user_id, user_name, chat_id, text, scheduled_at, _now_str()),
-            )
+            _exec(conn, cur, "save_reminder",
+                  (user_id, user_name, chat_id, text, scheduled_at, _now_str()))
+            rid = cur.fetchone()[0] if _PG else cur.lastrowid
             conn.commit()
-            return cur.lastrowid
+            return rid
     except Exception as e:
         logger.debug("Error guardando reminder: %s", e)
         return None
@@ -272,10 +856,9 @@ def save_reminder(
 def mark_reminder_fired(reminder_id: int) -> None:
     """Marca un recordatorio como disparado."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(f"UPDATE reminders SET fired=1 WHERE id={p}", (reminder_id,))
+            _exec(conn, cur, "mark_reminder_fired", (reminder_id,))
             conn.commit()
     except Exception as e:
         logger.debug("Error marcando reminder: %s", e)
@@ -286,11 +869,7 @@ def get_pending_reminders() -> list[dict]:
     try:
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(
-                "SELECT id, chat_id, user_id, user_name, text, scheduled_at "
-                "FROM reminders WHERE fired=0 AND scheduled_at IS NOT NULL"
-            )
-            rows = cur.fetchall()
+            rows = _exec(conn, cur, "pending_reminders").fetchall()
             return [
                 {"id": r[0], "chat_id": r[1], "user_id": r[2],
                  "user_name": r[3], "text": r[4], "scheduled_at": r[5]}
@@ -301,31 +880,72 @@ def get_pending_reminders() -> list[dict]:
         return []
 
 
+_KB_STOPWORDS = frozenset({
+    "que", "qué", "como", "cómo", "cual", "cuál", "cuales", "para", "por", "porque",
+    "una", "uno", "unos", "unas", "los", "las", "del", "con", "sin", "sobre",
+    "mis", "tus", "sus", "hay", "esta", "este", "esto", "eso", "esa", "ese",
+    "son", "ser", "fue", "puedo", "podes", "podés", "tengo", "tiene", "hago",
+    "donde", "dónde", "cuando", "cuándo", "quien", "quién", "mas", "más", "muy",
+    "the", "and", "what", "how",
+})
+
+
+def _kb_terms(query: str, max_terms: int = 8) -> list[str]:
+    """
+    Extrae los términos útiles de una pregunta para buscar en la KB:
+    minúsculas, sin acentos, sin stopwords ni palabras de menos de 3 letras.
+    """
+    folded = unicodedata.normalize("NFKD", query.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    terms: list[str] = []
+    for word in re.findall(r"[a-z0-9]+", folded):
+        if len(word) < 3 or word in _KB_STOPWORDS or word in terms:
+            continue
+        terms.append(word)
+        if len(terms) >= max_terms:
+            break
+    return terms
+
+
 def query_kb(query: str, limit: int = 3) -> list[dict]:
-    """Busca en la Knowledge Base."""
-    if not query:
+    """
+    Busca en la Knowledge Base.
+    Ambos backends usan la misma semántica: cualquiera de los términos de la
+    pregunta (OR), ranking por relevancia con el título pesando más que el
+    contenido (ts_rank en Postgres, bm25 en SQLite FTS5).
+    """
+    terms = _kb_terms(query or "")
+    if not terms:
         return []
     try:
         with get_conn() as conn:
             cur = conn.cursor()
             p = _ph()
-            if _is_postgres():
-                pattern = f"%{query}%"
-                cur.execute(
-                    f"SELECT title, content, source FROM kb_docs "
-                    f"WHERE content ILIKE {p} OR title ILIKE {p} LIMIT {p}",
-                    (pattern, pattern, limit),
-                )
-            else:
+            if _PG:
                 try:
+                    _exec(conn, cur, "kb_search", (" | ".join(terms), limit))
+                except Exception:
+                    # Migración FTS no aplicada todavía
+                    conn.rollback()
+                    patterns = [f"%{t}%" for t in terms]
                     cur.execute(
-                        f"SELECT title, content, source FROM kb_docs WHERE kb_docs MATCH {p} LIMIT {p}",
-                        (query, limit),
+                        f"SELECT title, content, source FROM kb_docs "
+                        f"WHERE title ILIKE ANY({p}) OR content ILIKE ANY({p}) LIMIT {p}",
+                        (patterns, patterns, limit),
                     )
+            else:
+                try:
+                    _exec(conn, cur, "kb_search",
+                          (" OR ".join(f'"{t}"' for t in terms), limit))
                 except Exception:
+                    # Sin FTS5: tabla plana
+                    conds = " OR ".join([f"content LIKE {p} OR title LIKE {p}"] * len(terms))
+                    params: list[Any] = []
+                    for t in terms:
+                        params += [f"%{t}%", f"%{t}%"]
                     cur.execute(
-                        f"SELECT title, content, source FROM kb_docs WHERE content LIKE {p} OR title LIKE {p} LIMIT {p}",
-                        (f"%{query}%", f"%{query}%", limit),
+                        f"SELECT title, content, source FROM kb_docs WHERE {conds} LIMIT {p}",
+                        (*params, limit),
                     )
             rows = cur.fetchall()
             return [{"title": r[0], "content": r[1], "source": r[2] or ""} for r in rows]
@@ -333,38 +953,61 @@ def query_kb(query: str, limit: int = 3) -> list[dict]:
         return []
 
 
+def get_kb_version() -> str:
+    """
+    Huella de la Knowledge Base: versión explícita (setting `kb_version`,
+    la suben los scripts de ingesta) + cantidad de documentos + último id.
+    Cambia cuando se agregan, borran o reindexan documentos.
+    """
+    try:
+        with get_conn() as conn:
+            cur = conn.cursor()
+            count, last_id = _exec(conn, cur, "kb_fingerprint").fetchone()
+            explicit = _exec(conn, cur, "get_setting", ("kb_version",)).fetchone()
+        return f"{explicit[0] if explicit else 0}:{count}:{last_id or 0}"
+    except Exception as e:
+        logger.debug("Error leyendo versión de la KB: %s", e)
+        return ""
+
+
 # ── AI History ──
 
 def save_ai_message(user_id: int, role: str, content: str) -> None:
     """Persiste un mensaje del historial de IA."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(
-                f"INSERT INTO ai_history (user_id, role, content, created_at) "
-                f"VALUES ({p}, {p}, {p}, {p})",
-                (user_id, role, content, _now_str()),
-            )
+            _exec(conn, cur, "save_ai_message", (user_id, role, content, _now_str()))
             conn.commit()
     except Exception as e:
         logger.debug("Error guardando AI history: %s", e)
 
 
+def record_ai_exchange(user_id: int, user_name: str | None, question: str, answer: str) -> None:
+    """
+    Persiste un intercambio IA completo en una sola transacción:
+    la interacción y los dos mensajes del historial (user + assistant).
+    Los dos mensajes comparten timestamp; el orden lo desempata el id.
+    """
+    try:
+        now = _now_str()
+        with get_conn() as conn:
+            cur = conn.cursor()
+            _exec(conn, cur, "log_interaction",
+                  (user_id, user_name or "", question, answer, now))
+            _exec_many(conn, cur, "save_ai_message",
+                       [(user_id, "user", question, now), (user_id, "assistant", answer, now)])
+            conn.commit()
+    except Exception as e:
+        logger.warning("Error guardando intercambio IA: %s", e)
+
+
 def load_ai_history(user_id: int, limit: int = 8) -> list[dict]:
     """Carga los últimos mensajes del historial de IA de un usuario."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(
-                f"SELECT role, content FROM ("
-                f"  SELECT role, content, created_at FROM ai_history "
-                f"  WHERE user_id={p} ORDER BY created_at DESC LIMIT {p}"
-                f") sub ORDER BY created_at ASC",
-                (user_id, limit),
-            )
-            rows = cur.fetchall()
+            rows = _exec(conn, cur, "load_ai_history", (user_id, limit)).fetchall()
             return [{"role": r[0], "content": r[1]} for r in rows]
     except Exception:
         return []
@@ -374,61 +1017,34 @@ def load_ai_history(user_id: int, limit: int = 8) -> list[dict]:
 # RANKING Y REPUTACIÓN (XP)
 # ═══════════════════════════════════════════════════════════════
 
+def level_for_xp(xp: int) -> int:
+    """
+    Fórmula simple: Nivel = int(sqrt(XP / 25)) + 1
+    L1: 0, L2: 25, L3: 100, L4: 225, L5: 400
+    """
+    return int((xp / 25) ** 0.5) + 1
+
+
 def add_xp(user_id: int, user_name: str, amount: int) -> tuple[int, int, bool]:
     """
     Suma XP a un usuario. Si sube de nivel, level_up es True. 
     Retorna (xp_actual, nivel_actual, level_up).
     """
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            
-            if _is_postgres():
-                cur.execute(
-                    f"INSERT INTO user_stats (user_id, user_name, xp, level, last_message_at) "
-                    f"VALUES ({p}, {p}, {p}, 1, {p}) "
-                    f"ON CONFLICT (user_id) DO UPDATE SET "
-                    f"user_name = EXCLUDED.user_name, "
-                    f"xp = user_stats.xp + EXCLUDED.xp, "
-                    f"last_message_at = EXCLUDED.last_message_at "
-                    f"RETURNING xp, level",
-                    (user_id, user_name, amount, _now_str())
-                )
-                row = cur.fetchone()
-                if not row:
-                    return 0, 1, False
-                xp, level = row[0], row[1]
-            else:
-                cur.execute("SELECT xp, level FROM user_stats WHERE user_id = ?", (user_id,))
-                row = cur.fetchone()
-                now = _now_str()
-                if row:
-                    xp = row[0] + amount
-                    level = row[1]
-                    cur.execute(
-                        "UPDATE user_stats SET user_name = ?, xp = ?, last_message_at = ? WHERE user_id = ?",
-                        (user_name, xp, now, user_id)
-                    )
-                else:
-                    xp = amount
-                    level = 1
-                    cur.execute(
-                        "INSERT INTO user_stats (user_id, user_name, xp, level, last_message_at) VALUES (?, ?, ?, ?, ?)",
-                        (user_id, user_name, xp, level, now)
-                    )
-            
-            # Fórmula simple: Nivel = int(sqrt(XP / 25)) + 1
-            # L1: 0, L2: 25, L3: 100, L4: 225, L5: 400
-            new_level = int((xp / 25) ** 0.5) + 1
-            
+            # Upsert con RETURNING en ambos backends (SQLite >= 3.35)
+            row = _exec(conn, cur, "xp_upsert",
+                        (user_id, user_name, amount, _now_str())).fetchone()
+            if not row:
+                return 0, 1, False
+            xp, level = row[0], row[1]
+
+            new_level = level_for_xp(xp)
             level_up = new_level > level
             if level_up:
-                if _is_postgres():
-                    cur.execute(f"UPDATE user_stats SET level = {p} WHERE user_id = {p}", (new_level, user_id))
-                else:
-                    cur.execute("UPDATE user_stats SET level = ? WHERE user_id = ?", (new_level, user_id))
-            
+                _exec(conn, cur, "xp_set_level", (new_level, user_id))
+
             conn.commit()
             return xp, new_level, level_up
     except Exception as e:
@@ -436,18 +1052,56 @@ def add_xp(user_id: int, user_name: str, amount: int) -> tuple[int, int, bool]:
         return 0, 1, False
 
 
+def add_xp_bulk(rows: list[tuple[int, str, int, int]]) -> None:
+    """
+    Aplica incrementos de XP acumulados en un único upsert multi-fila.
+    Cada fila es (user_id, user_name, xp_a_sumar, nivel_calculado).
+    El nivel nunca baja: se guarda el máximo entre el actual y el calculado.
+    Propaga la excepción para que el llamador pueda reintentar.
+    """
+    if not rows:
+        return
+    now = _now_str()
+    values = [(uid, name, amount, level, now) for uid, name, amount, level in rows]
+    with get_conn() as conn:
+        cur = conn.cursor()
+        if _PG:
+            from psycopg2.extras import execute_values
+            execute_values(
+                cur,
+                "INSERT INTO user_stats (user_id, user_name, xp, level, last_message_at) "
+                "VALUES %s "
+                "ON CONFLICT (user_id) DO UPDATE SET "
+                "user_name = EXCLUDED.user_name, "
+                "xp = user_stats.xp + EXCLUDED.xp, "
+                "level = GREATEST(user_stats.level, EXCLUDED.level), "
+                "last_message_at = EXCLUDED.last_message_at",
+                values,
+            )
+        else:
+            # SQLite viejo limita a 999 parámetros por statement → chunks de 150 filas
+            for i in range(0, len(values), 150):
+                chunk = values[i:i + 150]
+                placeholders = ", ".join(["(?, ?, ?, ?, ?)"] * len(chunk))
+                cur.execute(
+                    f"INSERT INTO user_stats (user_id, user_name, xp, level, last_message_at) "
+                    f"VALUES {placeholders} "
+                    f"ON CONFLICT (user_id) DO UPDATE SET "
+                    f"user_name = excluded.user_name, "
+                    f"xp = user_stats.xp + excluded.xp, "
+                    f"level = MAX(user_stats.level, excluded.level), "
+                    f"last_message_at = excluded.last_message_at",
+                    [v for row in chunk for v in row],
+                )
+        conn.commit()
+
+
 def get_top_users(limit: int = 10) -> list[dict]:
     """Devuelve el leaderboard de usuarios."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(
-                f"SELECT user_id, user_name, xp, level FROM user_stats "
-                f"ORDER BY xp DESC LIMIT {p}", 
-                (limit,)
-            )
-            rows = cur.fetchall()
+            rows = _exec(conn, cur, "top_users", (limit,)).fetchall()
             return [
                 {"user_id": r[0], "user_name": r[1], "xp": r[2], "level": r[3]} 
                 for r in rows
@@ -457,14 +1111,29 @@ def get_top_users(limit: int = 10) -> list[dict]:
         return []
 
 
+def get_all_user_stats() -> list[dict] | None:
+    """
+    Devuelve XP y nivel de todos los usuarios (para reconstruir el leaderboard).
+    None si la lectura falla: no es lo mismo que "no hay usuarios".
+    """
+    try:
+        with get_conn() as conn:
+            cur = conn.cursor()
+            return [
+                {"user_id": r[0], "user_name": r[1], "xp": r[2], "level": r[3]}
+                for r in _exec(conn, cur, "all_user_stats").fetchall()
+            ]
+    except Exception as e:
+        logger.warning("Error leyendo user_stats: %s", e)
+        return None
+
+
 def get_user_stats(user_id: int) -> dict | None:
     """Devuelve las estadísticas (XP, nivel) de un usuario."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(f"SELECT user_name, xp, level FROM user_stats WHERE user_id = {p}", (user_id,))
-            r = cur.fetchone()
+            r = _exec(conn, cur, "user_stats", (user_id,)).fetchone()
             if r:
                 return {"user_name": r[0], "xp": r[1], "level": r[2]}
     except Exception as e:
@@ -472,6 +1141,133 @@ def get_user_stats(user_id: int) -> dict | None:
     return None
 
 
+# ═══════════════════════════════════════════════════════════════
+# RETENCIÓN Y ARCHIVO
+# ═══════════════════════════════════════════════════════════════
+
+# Tablas que crecen por usuario y se pueden archivar (columnas exportadas)
+ARCHIVABLE_TABLES: dict[str, tuple[str, ...]] = {
+    "interactions": ("id", "user_id", "user_name", "question", "answer", "created_at"),
+    "ai_history": ("id", "user_id", "role", "content", "created_at"),
+}
+
+
+def archive_cutoffs(table: str, keep_per_user: int) -> dict[int, tuple]:
+    """
+    Para cada usuario con más de `keep_per_user` filas, la clave
+    (created_at, id) de su fila archivable más reciente: se archiva toda fila
+    del usuario con clave <= a esa. Un solo recorrido con ventana por corrida.
+    """
+    p = _ph()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT user_id, created_at, id FROM ("
+            f"  SELECT user_id, created_at, id, ROW_NUMBER() OVER ("
+            f"    PARTITION BY user_id ORDER BY created_at DESC, id DESC"
+            f"  ) AS rn FROM {table}"
+            f") sub WHERE rn = {p}",
+            (keep_per_user + 1,),
+        )
+        return {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+
+
+def scan_row_keys(table: str, after_id: int, limit: int) -> list[tuple]:
+    """Página de (id, user_id, created_at) con id > `after_id`, por id (keyset)."""
+    p = _ph()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT id, user_id, created_at FROM {table} WHERE id > {p} ORDER BY id LIMIT {p}",
+            (after_id, limit),
+        )
+        return cur.fetchall()
+
+
+# SQLite acepta hasta 999 parámetros por sentencia en versiones viejas
+_SQLITE_IN_CHUNK = 500
+
+
+def _id_batches(ids: list[int]) -> list[tuple[str, tuple]]:
+    """Condición `id IN ...` y parámetros: un solo ANY(array) en Postgres, IN por tramos en SQLite."""
+    if _PG:
+        return [("id = ANY(%s)", (list(ids),))]
+    return [
+        (f"id IN ({', '.join('?' * len(chunk))})", tuple(chunk))
+        for chunk in (ids[i:i + _SQLITE_IN_CHUNK] for i in range(0, len(ids), _SQLITE_IN_CHUNK))
+    ]
+
+
+def fetch_rows_by_id(table: str, ids: list[int]) -> list[dict]:
+    """Filas completas (columnas de ARCHIVABLE_TABLES) de los ids dados, por id."""
+    cols = ARCHIVABLE_TABLES[table]
+    rows: list[dict] = []
+    with get_conn() as conn:
+        cur = conn.cursor()
+        for cond, params in _id_batches(ids):
+            cur.execute(f"SELECT {', '.join(cols)} FROM {table} WHERE {cond} ORDER BY id", params)
+            rows.extend(dict(zip(cols, r)) for r in cur.fetchall())
+    return rows
+
+
+def delete_rows_by_id(table: str, ids: list[int]) -> int:
+    """Borra filas por id en una sola transacción. Retorna la cantidad borrada."""
+    if table not in ARCHIVABLE_TABLES or not ids:
+        return 0
+    deleted = 0
+    with get_conn() as conn:
+        cur = conn.cursor()
+        for cond, params in _id_batches(ids):
+            cur.execute(f"DELETE FROM {table} WHERE {cond}", params)
+            deleted += cur.rowcount
+        conn.commit()
+    return deleted
+
+
+def archives_in_db() -> bool:
+    """True si la retención mueve filas a tablas `<tabla>_archive` (Postgres)."""
+    return _PG
+
+
+def move_rows_to_archive(table: str, ids: list[int]) -> int:
+    """
+    Mueve filas a `<tabla>_archive` en una sola sentencia (DELETE … RETURNING
+    dentro de un INSERT): o se mueven todas o no se borra ninguna.
+    Sólo Postgres. Retorna la cantidad movida.
+    """
+    if table not in ARCHIVABLE_TABLES or not ids:
+        return 0
+    cols = ", ".join(ARCHIVABLE_TABLES[table])
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"WITH moved AS (DELETE FROM {table} WHERE id = ANY(%s) RETURNING {cols}) "
+            f"INSERT INTO {table}_archive ({cols}) SELECT {cols} FROM moved",
+            (list(ids),),
+        )
+        moved = cur.rowcount
+        conn.commit()
+    return moved
+
+
+def vacuum_tables(tables: list[str]) -> None:
+    """Compacta la base después de borrar en masa."""
+    with get_conn() as conn:
+        if _PG:
+            # VACUUM no puede correr dentro de una transacción
+            conn.autocommit = True
+            try:
+                cur = conn.cursor()
+                for table in tables:
+                    if table in ARCHIVABLE_TABLES:
+                        cur.execute(f"VACUUM (ANALYZE) {table}")
+            finally:
+                conn.autocommit = False
+        else:
+            conn.commit()
+            conn.execute("VACUUM")
+
+
 # ═══════════════════════════════════════════════════════════════
 # CONFIGURACIONES Y ESTADO INTERNO (SETTINGS MIGRATION)
 # ═══════════════════════════════════════════════════════════════
@@ -479,11 +1275,9 @@ def get_user_stats(user_id: int) -> dict | None:
 def get_setting(key: str) -> str | None:
     """Obtiene un valor de la tabla settings."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            cur.execute(f"SELECT value FROM settings WHERE key = {p}", (key,))
-            r = cur.fetchone()
+            r = _exec(conn, cur, "get_setting", (key,)).fetchone()
             return r[0] if r else None
     except Exception as e:
         logger.warning("Error leyendo setting %s: %s", key, e)
@@ -492,21 +1286,9 @@ def get_setting(key: str) -> str | None:
 def set_setting(key: str, value: str) -> None:
     """Guarda (upsert) un valor en la tabla settings."""
     try:
-        p = _ph()
         with get_conn() as conn:
             cur = conn.cursor()
-            if _is_postgres():
-                cur.execute(
-                    f"INSERT INTO settings (key, value) VALUES ({p}, {p}) "
-                    f"ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value",
-                    (key, value)
-                )
-            else:
-                cur.execute(
-                    "INSERT INTO settings (key, value) VALUES (?, ?) "
-                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
-                    (key, value)
-                )
+            _exec(conn, cur, "set_setting", (key, value))
             conn.commit()
     except Exception as e:
         logger.warning("Error guardando setting %s: %s", key, e)
@@ -0,0 +1,178 @@
+"""
+Fachada async sobre db.py.
+
+Las funciones de db.py son síncronas (psycopg2 / sqlite3). Llamarlas
+directo desde un handler congela el event loop de python-telegram-bot
+durante cada viaje a la base. Acá se ejecutan en un executor dedicado
+con workers acotados, así una query lenta no frena al resto de los chats.
+
+Uso:
+    import db_async
+    xp, lvl, up = await db_async.add_xp(user_id, name, 3)
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+import db
+from config import DB_EXECUTOR_WORKERS, logger
+
+T = TypeVar("T")
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Crea el executor en el primer uso (lazy)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="beexy-db",
+        )
+    return _executor
+
+
+async def run(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Ejecuta una función síncrona de DB en el executor dedicado."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), functools.partial(fn, *args, **kwargs),
+    )
+
+
+# ═══════════════════════════════════════════════════════════════
+# WRITER EN SEGUNDO PLANO
+# ═══════════════════════════════════════════════════════════════
+
+# Escrituras que no necesitan resultado (p. ej. persistir un intercambio IA)
+# se encolan y las procesa una única tarea, fuera del camino de respuesta.
+_write_queue: asyncio.Queue | None = None
+_writer_task: asyncio.Task | None = None
+
+
+async def _writer_loop(queue: asyncio.Queue) -> None:
+    while True:
+        item = await queue.get()
+        try:
+            if item is None:
+                return
+            fn, args = item
+            await run(fn, *args)
+        except Exception as e:
+            logger.warning("Error en escritura en segundo plano: %s", e)
+        finally:
+            queue.task_done()
+
+
+def enqueue_write(fn: Callable[..., Any], *args: Any) -> None:
+    """Encola una escritura síncrona de db.py para ejecutarla en segundo plano."""
+    global _write_queue, _writer_task
+    if _writer_task is None or _writer_task.done():
+        _write_queue = asyncio.Queue()
+        _writer_task = asyncio.get_running_loop().create_task(_writer_loop(_write_queue))
+    _write_queue.put_nowait((fn, args))
+
+
+async def drain_writes() -> None:
+    """Procesa las escrituras pendientes y detiene el writer (llamar al apagar)."""
+    global _write_queue, _writer_task
+    if _writer_task is None or _write_queue is None:
+        return
+    if not _writer_task.done():
+        _write_queue.put_nowait(None)
+        await _writer_task
+    _write_queue = None
+    _writer_task = None
+
+
+def shutdown() -> None:
+    """Espera a que terminen las queries en curso y libera los workers."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+        logger.info("🗄️ Executor DB detenido")
+
+
+# ═══════════════════════════════════════════════════════════════
+# API ASYNC (mismos nombres y firmas que db.py)
+# ═══════════════════════════════════════════════════════════════
+
+async def init_db() -> None:
+    await run(db.init_db)
+
+
+async def log_interaction(user_id: int, user_name: str | None, question: str, answer: str) -> None:
+    await run(db.log_interaction, user_id, user_name, question, answer)
+
+
+async def save_report(
+    reporter_id: int, reporter_name: str,
+    reported_id: int | None, reported_name: str,
+    chat_id: int, reason: str,
+) -> int | None:
+    return await run(
+        db.save_report, reporter_id, reporter_name,
+        reported_id, reported_name, chat_id, reason,
+    )
+
+
+async def save_reminder(
+    user_id: int, user_name: str, chat_id: int,
+    text: str, scheduled_at: int,
+) -> int | None:
+    return await run(db.save_reminder, user_id, user_name, chat_id, text, scheduled_at)
+
+
+async def mark_reminder_fired(reminder_id: int) -> None:
+    await run(db.mark_reminder_fired, reminder_id)
+
+
+async def get_pending_reminders() -> list[dict]:
+    return await run(db.get_pending_reminders)
+
+
+async def query_kb(query: str, limit: int = 3) -> list[dict]:
+    return await run(db.query_kb, query, limit)
+
+
+async def get_kb_version() -> str:
+    return await run(db.get_kb_version)
+
+
+async def save_ai_message(user_id: int, role: str, content: str) -> None:
+    await run(db.save_ai_message, user_id, role, content)
+
+
+async def record_ai_exchange(user_id: int, user_name: str | None, question: str, answer: str) -> None:
+    await run(db.record_ai_exchange, user_id, user_name, question, answer)
+
+
+async def load_ai_history(user_id: int, limit: int = 8) -> list[dict]:
+    return await run(db.load_ai_history, user_id, limit)
+
+
+async def add_xp(user_id: int, user_name: str, amount: int) -> tuple[int, int, bool]:
+    return await run(db.add_xp, user_id, user_name, amount)
+
+
+async def get_top_users(limit: int = 10) -> list[dict]:
+    return await run(db.get_top_users, limit)
+
+
+async def get_all_user_stats() -> list[dict] | None:
+    return await run(db.get_all_user_stats)
+
+
+async def get_user_stats(user_id: int) -> dict | None:
+    return await run(db.get_user_stats, user_id)
+
+
+async def get_setting(key: str) -> str | None:
+    return await run(db.get_setting, key)
+
+
+async def set_setting(key: str, value: str) -> None:
+    await run(db.set_setting, key, value)
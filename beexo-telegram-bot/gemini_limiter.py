@@ -0,0 +1,290 @@
+"""
+Limitador global de llamadas a Gemini.
+
+Todas las llamadas (IA del chat, memes de noticias, reposición del pool de
+memes) comparten la misma cuota de la API. En vez de que cada pedido haga
+su propio loop de reintentos ante un 429 (lo que empeora la tormenta), pasan
+por acá:
+
+  • Token bucket de GEMINI_RPM llamadas por minuto.
+  • Cola con prioridad: primero los usuarios, después los jobs de fondo y
+    al final la reposición de memes.
+  • Ante un 429 se pausa la cola entera el tiempo que indica Gemini
+    ("retry in 17s") o con backoff exponencial, y se descarta la
+    reposición de memes pendiente.
+  • Quien queda en cola recibe su posición y una estimación de espera.
+
+Uso:
+    import gemini_limiter
+    answer = await gemini_limiter.call(
+        lambda: client.aio.models.generate_content(...),
+        priority=gemini_limiter.INTERACTIVE,
+    )
+"""
+
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from typing import Any, Awaitable, Callable
+
+from config import GEMINI_MAX_QUEUE, GEMINI_QUEUE_MAX_WAIT, GEMINI_RPM, logger
+
+# Prioridades (menor = antes)
+INTERACTIVE = 0   # preguntas de usuarios
+BACKGROUND = 1    # jobs programados (memes de noticias)
+REFILL = 2        # reposición del pool de memes: lo primero que se descarta
+
+_MAX_WAIT = {INTERACTIVE: GEMINI_QUEUE_MAX_WAIT, BACKGROUND: 120.0, REFILL: 30.0}
+_MIN_PAUSE = 1.0
+_BACKOFF_BASE = 10.0
+_BACKOFF_MAX = 120.0
+_ATTEMPTS = 3
+
+_RETRY_HINT = re.compile(r"retry(?:delay)?\D{0,12}?(\d+(?:\.\d+)?)\s*s\b", re.IGNORECASE)
+
+
+class GeminiBusy(Exception):
+    """No hay cupo para la llamada; `eta` estima en cuántos segundos lo habría."""
+
+    def __init__(self, eta: float) -> None:
+        super().__init__(f"Gemini saturado, reintentar en ~{eta:.0f}s")
+        self.eta = eta
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+_rate = GEMINI_RPM / 60.0
+_capacity = max(1.0, GEMINI_RPM / 4)
+_tokens = _capacity
+_tokens_at = time.monotonic()
+_pause_until = 0.0
+_backoff_s = 0.0
+
+_queue: list[_Waiter] = []
+_seq = itertools.count()
+_dispatcher: asyncio.Task | None = None
+
+_stats = {
+    "immediate": 0, "queued": 0, "granted": 0, "shed": 0,
+    "timeouts": 0, "rate_limited": 0, "errors": 0,
+}
+
+
+# ═══════════════════════════════════════════════════════════════
+# TOKEN BUCKET
+# ═══════════════════════════════════════════════════════════════
+
+def _refill(now: float) -> None:
+    global _tokens, _tokens_at
+    _tokens = min(_capacity, _tokens + (now - _tokens_at) * _rate)
+    _tokens_at = now
+
+
+def _try_take() -> bool:
+    global _tokens
+    now = time.monotonic()
+    if now < _pause_until:
+        return False
+    _refill(now)
+    if _tokens < 1:
+        return False
+    _tokens -= 1
+    return True
+
+
+def _eta(position: int) -> float:
+    """Segundos estimados hasta que se atienda el lugar `position` (1 = el próximo)."""
+    now = time.monotonic()
+    paused = max(0.0, _pause_until - now)
+    _refill(now)
+    tokens = 0.0 if paused else _tokens
+    return paused + max(0.0, position - tokens) / _rate
+
+
+def _pending() -> list[_Waiter]:
+    return [w for w in _queue if not w.future.done()]
+
+
+def _position(waiter: _Waiter) -> int:
+    return sum(1 for w in _pending() if w < waiter) + 1
+
+
+# ═══════════════════════════════════════════════════════════════
+# COLA
+# ═══════════════════════════════════════════════════════════════
+
+async def _dispatch() -> None:
+    """Entrega los tokens a la cola por orden de prioridad."""
+    while True:
+        while _queue and _queue[0].future.done():
+            heapq.heappop(_queue)
+        if not _queue:
+            return
+        now = time.monotonic()
+        if now < _pause_until:
+            await asyncio.sleep(_pause_until - now)
+            continue
+        if not _try_take():
+            await asyncio.sleep((1 - _tokens) / _rate)
+            continue
+        waiter = heapq.heappop(_queue)
+        if waiter.future.done():
+            _refund()
+            continue
+        waiter.future.set_result(None)
+        _stats["granted"] += 1
+
+
+def _refund() -> None:
+    global _tokens
+    _tokens = min(_capacity, _tokens + 1)
+
+
+def _ensure_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is None or _dispatcher.done():
+        _dispatcher = asyncio.get_running_loop().create_task(_dispatch())
+
+
+def _check_loop() -> None:
+    """Si cambió el event loop (tests, reinicios), la cola vieja ya no sirve."""
+    global _dispatcher
+    if _dispatcher is not None and _dispatcher.get_loop() is not asyncio.get_running_loop():
+        _dispatcher = None
+        _queue.clear()
+
+
+def _shed(reason: str) -> GeminiBusy:
+    _stats["shed"] += 1
+    logger.debug("Gemini: llamada descartada (%s)", reason)
+    return GeminiBusy(_eta(len(_pending()) + 1))
+
+
+async def acquire(
+    priority: int = INTERACTIVE,
+    on_queued: Callable[[int, float], Awaitable[None]] | None = None,
+    max_wait: float | None = None,
+) -> None:
+    """
+    Espera un turno para llamar a Gemini. Lanza GeminiBusy si la llamada se
+    descarta o si la espera supera `max_wait`. Si hay que hacer cola, llama a
+    `on_queued(posición, segundos_estimados)`.
+    """
+    _check_loop()
+    if not _pending() and _try_take():
+        _stats["immediate"] += 1
+        return
+    if priority >= REFILL and (_pending() or time.monotonic() < _pause_until):
+        raise _shed("reposición con la cola ocupada")
+    if len(_pending()) >= GEMINI_MAX_QUEUE:
+        raise _shed("cola llena")
+
+    waiter = _Waiter(priority, next(_seq), asyncio.get_running_loop().create_future())
+    heapq.heappush(_queue, waiter)
+    _stats["queued"] += 1
+    _ensure_dispatcher()
+
+    if on_queued is not None:
+        position = _position(waiter)
+        try:
+            await on_queued(position, _eta(position))
+        except Exception as e:
+            logger.debug("Error avisando posición en la cola de Gemini: %s", e)
+
+    timeout = _MAX_WAIT.get(priority, GEMINI_QUEUE_MAX_WAIT) if max_wait is None else max_wait
+    try:
+        await asyncio.wait_for(waiter.future, timeout)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        raise GeminiBusy(_eta(_position(waiter))) from None
+
+
+# ═══════════════════════════════════════════════════════════════
+# RATE LIMIT (429)
+# ═══════════════════════════════════════════════════════════════
+
+def is_rate_limit(exc: BaseException) -> bool:
+    """
+    True si la API respondió 429 / RESOURCE_EXHAUSTED. Se mira el código y
+    el status del error (google-genai APIError, httpx), nunca el texto: un
+    "429" en un conteo de tokens o un request id pausaría toda la cola.
+    """
+    code = getattr(exc, "code", None)
+    if code is None:
+        code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    if code == 429:
+        return True
+    status = getattr(exc, "status", None)
+    return isinstance(status, str) and status.upper() == "RESOURCE_EXHAUSTED"
+
+
+def retry_after_from(exc: BaseException) -> float | None:
+    """Extrae el retryDelay / "retry in Ns" que manda Gemini, si vino."""
+    match = _RETRY_HINT.search(str(exc))
+    return float(match.group(1)) if match else None
+
+
+def report_rate_limit(retry_after: float | None = None) -> float:
+    """Pausa la cola (Retry-After o backoff exponencial). Retorna la pausa en seg."""
+    global _pause_until, _backoff_s, _tokens
+    _backoff_s = min(_BACKOFF_MAX, _backoff_s * 2 if _backoff_s else _BACKOFF_BASE)
+    wait = max(_MIN_PAUSE, retry_after) if retry_after else _backoff_s
+    _pause_until = max(_pause_until, time.monotonic() + wait)
+    _tokens = 0.0
+    _stats["rate_limited"] += 1
+    logger.warning("⚠️ Gemini rate limit, cola en pausa %.0fs", wait)
+
+    # Lo primero que se descarta es la reposición de memes
+    for w in _queue:
+        if w.priority >= REFILL and not w.future.done():
+            w.future.set_exception(_shed("rate limit"))
+    return wait
+
+
+async def call(
+    fn: Callable[[], Awaitable[Any]],
+    priority: int = INTERACTIVE,
+    on_queued: Callable[[int, float], Awaitable[None]] | None = None,
+    max_wait: float | None = None,
+) -> Any:
+    """
+    Ejecuta `fn()` (la llamada a Gemini) cuando haya turno. Ante un 429
+    pausa la cola y vuelve a esperar turno, hasta _ATTEMPTS veces; si se
+    agotan, re-lanza el error. Lanza GeminiBusy si no consigue turno.
+    """
+    global _backoff_s
+    for attempt in range(1, _ATTEMPTS + 1):
+        await acquire(priority, on_queued, max_wait)
+        try:
+            result = await fn()
+        except Exception as e:
+            if not is_rate_limit(e):
+                _stats["errors"] += 1
+                raise
+            report_rate_limit(retry_after_from(e))
+            if attempt == _ATTEMPTS or priority >= REFILL:
+                raise
+            continue
+        _backoff_s = 0.0
+        return result
+
+
+def stats() -> dict:
+    s = dict(_stats)
+    s["waiting"] = len(_pending())
+    s["paused_s"] = max(0.0, _pause_until - time.monotonic())
+    return s
@@ -0,0 +1,180 @@
+"""
+GIFs precargados para las reacciones emocionales.
+
+Antes cada reacción hacía una búsqueda de imágenes en DuckDuckGo y le pasaba
+a Telegram una URL cualquiera, que muchas veces fallaba o tardaba. Ahora:
+
+  • Un job (gif_cache_job) busca en segundo plano GIFs para cada emoción de
+    EMOTION_REACTIONS y sólo guarda los que responden 200 con un GIF de
+    tamaño aceptable para Telegram.
+  • Al reaccionar se elige uno del cache: cero búsquedas en el momento.
+  • Después del primer envío se recuerda el file_id de Telegram y se reusa
+    (no vuelve a descargar la URL).
+  • Las URLs que Telegram rechaza (BadRequest) se descartan y no se vuelven
+    a probar. Flood control o errores de red no descartan nada.
+
+Uso:
+    import gif_cache
+    await gif_cache.send(msg, "pump")  # False si no hay GIF para esa emoción
+"""
+
+import random
+
+from telegram.error import BadRequest
+
+import http_clients
+import web_search
+from config import GIF_CACHE_PER_EMOTION, logger
+from content import EMOTION_REACTIONS
+
+_MAX_BYTES = 20 * 1024 * 1024   # Telegram no baja por URL animaciones más grandes
+_SEARCH_RESULTS = 20
+_MAX_BAD_URLS = 2000
+
+
+class _Gif:
+    __slots__ = ("url", "file_id", "sends")
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.file_id: str | None = None
+        self.sends = 0
+
+
+# emoción → GIFs validados
+_pool: dict[str, list[_Gif]] = {}
+# URLs que fallaron (validación o envío); no se vuelven a probar
+_bad_urls: set[str] = set()
+_stats = {
+    "sends": 0, "file_id_sends": 0, "misses": 0, "pruned": 0, "send_errors": 0,
+    "validated": 0, "rejected": 0,
+}
+
+
+# ═══════════════════════════════════════════════════════════════
+# VALIDACIÓN Y REFRESCO
+# ═══════════════════════════════════════════════════════════════
+
+async def _is_valid_gif(url: str) -> bool:
+    """Pide la URL y mira sólo los headers: 200, image/gif y tamaño aceptable."""
+    try:
+        async with http_clients.get("images").stream("GET", url) as resp:
+            if resp.status_code != 200:
+                return False
+            if "gif" not in resp.headers.get("content-type", "").lower():
+                return False
+            size = resp.headers.get("content-length")
+            return size is None or int(size) <= _MAX_BYTES
+    except Exception as e:
+        logger.debug("GIF inválido %s: %s", url, e)
+        return False
+
+
+def _mark_bad(url: str) -> None:
+    if len(_bad_urls) >= _MAX_BAD_URLS:
+        _bad_urls.clear()
+    _bad_urls.add(url)
+
+
+async def refresh_emotion(emotion: str) -> int:
+    """Completa el cache de una emoción hasta GIF_CACHE_PER_EMOTION. Retorna cuántos agregó."""
+    pool = _pool.setdefault(emotion, [])
+    if len(pool) >= GIF_CACHE_PER_EMOTION:
+        return 0
+    query = EMOTION_REACTIONS[emotion]["gif_query"]
+    results = await web_search.images(f"{query} gif", max_results=_SEARCH_RESULTS)
+    known = {g.url for g in pool}
+    added = 0
+    for r in results:
+        url = r.get("image") or ""
+        if not url.lower().endswith(".gif") or url in known or url in _bad_urls:
+            continue
+        if await _is_valid_gif(url):
+            pool.append(_Gif(url))
+            known.add(url)
+            added += 1
+            _stats["validated"] += 1
+            if len(pool) >= GIF_CACHE_PER_EMOTION:
+                break
+        else:
+            _mark_bad(url)
+            _stats["rejected"] += 1
+    return added
+
+
+async def refresh() -> int:
+    """Completa el cache de todas las emociones (llamar desde un job)."""
+    total = 0
+    for emotion in EMOTION_REACTIONS:
+        try:
+            total += await refresh_emotion(emotion)
+        except Exception as e:
+            logger.warning("⚠️ Error refrescando GIFs de %s: %s", emotion, e)
+    if total:
+        logger.info("🎞️ GIFs de reacciones: +%d (%s)", total, stats()["per_emotion"])
+    return total
+
+
+# ═══════════════════════════════════════════════════════════════
+# ENVÍO
+# ═══════════════════════════════════════════════════════════════
+
+def _pick(emotion: str) -> _Gif | None:
+    pool = _pool.get(emotion)
+    if not pool:
+        return None
+    # Preferir los que ya tienen file_id: salen al instante
+    ready = [g for g in pool if g.file_id]
+    return random.choice(ready if ready and random.random() < 0.8 else pool)
+
+
+def _prune(emotion: str, gif: _Gif) -> None:
+    pool = _pool.get(emotion, [])
+    if gif in pool:
+        pool.remove(gif)
+        _stats["pruned"] += 1
+    _mark_bad(gif.url)
+
+
+async def send(msg, emotion: str) -> bool:
+    """Responde a `msg` con un GIF cacheado de la emoción. False si no hubo GIF o falló."""
+    gif = _pick(emotion)
+    if gif is None:
+        _stats["misses"] += 1
+        return False
+
+    by_file_id = gif.file_id is not None
+    try:
+        sent = await msg.reply_animation(animation=gif.file_id or gif.url)
+    except BadRequest as e:
+        # Telegram rechazó el archivo o la URL
+        if by_file_id:
+            # El file_id dejó de servir: la próxima vez se usa la URL
+            gif.file_id = None
+        else:
+            logger.debug("GIF descartado (%s): %s", gif.url, e)
+            _prune(emotion, gif)
+        return False
+    except Exception as e:
+        # RetryAfter, TimedOut, NetworkError...: el GIF no tiene la culpa
+        _stats["send_errors"] += 1
+        logger.debug("No se pudo enviar GIF (%s): %s", gif.url, e)
+        return False
+
+    gif.sends += 1
+    _stats["sends"] += 1
+    if by_file_id:
+        _stats["file_id_sends"] += 1
+    else:
+        media = getattr(sent, "animation", None) or getattr(sent, "document", None)
+        if media is not None:
+            gif.file_id = media.file_id
+    return True
+
+
+def stats() -> dict:
+    s = dict(_stats)
+    s["per_emotion"] = {e: len(p) for e, p in _pool.items()}
+    s["with_file_id"] = sum(1 for p in _pool.values() for g in p if g.file_id)
+    s["bad_urls"] = len(_bad_urls)
+    return s
@@ -4,22 +4,27 @@ Incluye: on_message, bienvenida de miembros, reminder_fire,
 detección emocional, y lógica de mención al bot.
 """
 
+import asyncio
 import io
 import re
 import random
-from datetime import datetime, timedelta
+import time
+from typing import Awaitable, Callable
 
 from telegram import Update, ChatMember
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ContextTypes
 
-from config import TZ, SCAM_ALERT_COOLDOWN_MIN, logger
+from config import AI_STREAM_EDIT_INTERVAL, logger
 from content import (
-    SCAM_ALERT, WELCOME_MESSAGES, EMOTION_REACTIONS, 
-    contains_wallet_keywords, 
-    SIGNALS_ALERT, contains_signals_keywords
+    SCAM_ALERT, WELCOME_MESSAGES, EMOTION_REACTIONS,
+    SIGNALS_ALERT, classify, detected_emotion,
 )
-from db import mark_reminder_fired, add_xp
+import db_async
+import gif_cache
+import state_store
+import xp_buffer
 from ai_chat import ask_ai
 from image_tools import search_image, generate_image, detect_image_request, _mentions_real_person
 
@@ -36,17 +41,82 @@ async def safe_reply(msg, text: str, **kwargs):
             return None
 
 
+class StreamingEditor:
+    """
+    Va editando un mensaje ("Pensando...") a medida que llega la respuesta
+    de la IA. Telegram limita las ediciones, así que se edita como mucho una
+    vez cada AI_STREAM_EDIT_INTERVAL seg. y sólo si el texto creció algo;
+    ante un RetryAfter se espera lo que pida antes de volver a editar.
+    Si la pregunta queda en la cola de Gemini, muestra posición y espera.
+    """
+
+    _MAX_LEN = 4096
+    _MIN_GROWTH = 24  # caracteres nuevos mínimos para justificar una edición
+    _CURSOR = " ▌"
+
+    def __init__(self, message, interval: float = AI_STREAM_EDIT_INTERVAL) -> None:
+        self._msg = message
+        self._interval = interval
+        self._next_edit_at = 0.0
+        self._retry_until = 0.0
+        self._shown = ""
+
+    async def _edit(self, text: str) -> bool:
+        if self._msg is None:
+            return False
+        if text == self._shown:
+            return True
+        try:
+            await self._msg.edit_text(text[:self._MAX_LEN])
+        except RetryAfter as e:
+            wait = e.retry_after
+            wait = wait.total_seconds() if hasattr(wait, "total_seconds") else float(wait)
+            self._retry_until = self._next_edit_at = time.monotonic() + wait
+            return False
+        except BadRequest as e:
+            # "Message is not modified" no es un error real
+            if "not modified" not in str(e).lower():
+                logger.debug("No se pudo editar respuesta parcial: %s", e)
+                return False
+        except Exception as e:
+            logger.debug("No se pudo editar respuesta parcial: %s", e)
+            return False
+        self._shown = text
+        self._next_edit_at = time.monotonic() + self._interval
+        return True
+
+    async def update(self, partial: str) -> None:
+        """Texto acumulado hasta ahora; edita sólo si toca."""
+        if time.monotonic() < self._next_edit_at:
+            return
+        if self._shown and len(partial) - len(self._shown) < self._MIN_GROWTH:
+            return
+        await self._edit(partial[:self._MAX_LEN - len(self._CURSOR)] + self._CURSOR)
+
+    async def queued(self, position: int, eta: float) -> None:
+        """Avisa en el mensaje que la pregunta está en la cola de Gemini."""
+        await self._edit(f"⏳ Hay mucha demanda: estás #{position} en la fila (~{max(1, round(eta))}s)...")
+        # El aviso no cuenta como texto ya mostrado de la respuesta
+        self._shown = ""
+        self._next_edit_at = 0.0
+
+    async def finish(self, text: str) -> bool:
+        """Edición final con la respuesta completa. Retorna False si no se pudo."""
+        wait = self._retry_until - time.monotonic()
+        if wait > 0:
+            # Un RetryAfter reciente: la edición final no se puede saltear
+            await asyncio.sleep(wait)
+        return await self._edit(text)
+
+
 # ═══════════════════════════════════════════════════════════════
 # ESTADO (almacenado en bot_data para thread-safety)
 # ═══════════════════════════════════════════════════════════════
 
-# Keys para context.bot_data
-_KEY_LAST_SCAM = "last_scam_alert_at"
-_KEY_LAST_SIGNALS = "last_signals_alert_at"
-_KEY_LAST_EMOTION = "last_emotion_at"
-_KEY_WELCOMED = "recently_welcomed"
+# Keys para context.bot_data (los cooldowns viven en state_store)
 _KEY_BOT_INFO = "bot_info"
-_KEY_XP_COOLDOWN = "xp_cooldown"
+
+_EMOTION_COOLDOWN = 15 * 60  # seg. entre reacciones emocionales
 
 
 def _get_bot_data(context: ContextTypes.DEFAULT_TYPE) -> dict:
@@ -72,7 +142,7 @@ async def reminder_fire(context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.info("⏰ Recordatorio enviado a %s", data["user_name"])
     rid = data.get("reminder_id")
     if rid:
-        mark_reminder_fired(rid)
+        await db_async.mark_reminder_fired(rid)
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -83,21 +153,13 @@ async def welcome_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Da la bienvenida a nuevos miembros (fallback vía mensaje de servicio)."""
     if not update.message or not update.message.new_chat_members:
         return
-    bd = _get_bot_data(context)
-    welcomed: set = bd.setdefault(_KEY_WELCOMED, set())
-
     for member in update.message.new_chat_members:
-        if member.is_bot or member.id in welcomed:
+        if member.is_bot or not state_store.welcomed.try_acquire(member.id):
             continue
-        welcomed.add(member.id)
         name = member.first_name or "amigo"
         welcome = random.choice(WELCOME_MESSAGES).format(name=name)
         await update.message.reply_text(welcome, parse_mode=ParseMode.MARKDOWN)
         logger.info("👋 Bienvenida enviada a %s (service msg)", name)
-        context.job_queue.run_once(
-            lambda ctx, uid=member.id: bd.setdefault(_KEY_WELCOMED, set()).discard(uid),
-            when=300, name=f"welcome_cleanup_{member.id}",
-        )
 
 
 async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -114,44 +176,29 @@ async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     member = result.new_chat_member.user
-    bd = _get_bot_data(context)
-    welcomed: set = bd.setdefault(_KEY_WELCOMED, set())
-    if member.is_bot or member.id in welcomed:
+    if member.is_bot or not state_store.welcomed.try_acquire(member.id):
         return
 
-    welcomed.add(member.id)
     name = member.first_name or "amigo"
     welcome = random.choice(WELCOME_MESSAGES).format(name=name)
     await context.bot.send_message(
         chat_id=result.chat.id, text=welcome, parse_mode=ParseMode.MARKDOWN,
     )
     logger.info("👋 Bienvenida enviada a %s (chat_member)", name)
-    context.job_queue.run_once(
-        lambda ctx, uid=member.id: bd.setdefault(_KEY_WELCOMED, set()).discard(uid),
-        when=300, name=f"welcome_cleanup_{member.id}",
-    )
 
 
 # ═══════════════════════════════════════════════════════════════
 # REACCIONES EMOCIONALES
 # ═══════════════════════════════════════════════════════════════
 
-async def _maybe_react_emotion(msg, text: str, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Detecta emociones en el chat y reacciona con texto + GIF."""
-    bd = _get_bot_data(context)
-    now = datetime.now(TZ)
-    last = bd.get(_KEY_LAST_EMOTION)
-    if last and (now - last) < timedelta(minutes=15):
+async def _maybe_react_emotion(msg, text: str, categories: set[str]) -> None:
+    """Detecta emociones en el chat (ver content.classify) y reacciona con texto + GIF."""
+    if state_store.alert_cooldowns.active("emotion"):
         return
     if len(text) < 4:
         return
 
-    text_lower = text.lower()
-    detected = None
-    for emotion, edata in EMOTION_REACTIONS.items():
-        if any(kw in text_lower for kw in edata["keywords"]):
-            detected = emotion
-            break
+    detected = detected_emotion(categories)
     if not detected:
         return
     
@@ -159,24 +206,14 @@ async def _maybe_react_emotion(msg, text: str, context: ContextTypes.DEFAULT_TYP
     if random.random() > 0.75:
         return
 
-    bd[_KEY_LAST_EMOTION] = now
+    state_store.alert_cooldowns.set("emotion", ttl=_EMOTION_COOLDOWN)
     edata = EMOTION_REACTIONS[detected]
 
     response = random.choice(edata["responses"])
     await msg.reply_text(response)
 
-    try:
-        from duckduckgo_search import DDGS
-        with DDGS() as ddgs:
-            results = list(ddgs.images(
-                f"{edata['gif_query']} gif", max_results=8,
-            ))
-        gif_urls = [r["image"] for r in results if r.get("image", "").lower().endswith(".gif")]
-        if gif_urls:
-            gif_url = random.choice(gif_urls[:5])
-            await msg.reply_animation(animation=gif_url)
-    except Exception:
-        pass
+    # GIF precargado por gif_cache_job: sin búsqueda en el momento
+    await gif_cache.send(msg, detected)
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -235,105 +272,192 @@ async def handle_image_request(msg, action: str, topic: str) -> None:
 # ON_MESSAGE PRINCIPAL
 # ═══════════════════════════════════════════════════════════════
 
-async def on_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handler principal para todos los mensajes de texto."""
-    msg = update.effective_message
-    if not msg or not msg.text:
-        return
-
-    text = msg.text
-    logger.info("📩 Mensaje recibido en chat %s (tipo: %s): %s", msg.chat_id, msg.chat.type, text[:20])
-    bd = _get_bot_data(context)
-
-    # ── Anti-scam ──
-    if contains_wallet_keywords(text):
-        now = datetime.now(TZ)
-        last = bd.get(_KEY_LAST_SCAM)
-        if last is None or (now - last) > timedelta(minutes=SCAM_ALERT_COOLDOWN_MIN):
-            bd[_KEY_LAST_SCAM] = now
-            await safe_reply(msg, SCAM_ALERT, parse_mode=ParseMode.MARKDOWN)
-
-    # ── Anti-spam (Señales/Trading) ──
-    if contains_signals_keywords(text):
-        now = datetime.now(TZ)
-        last_sig = bd.get(_KEY_LAST_SIGNALS)
-        if last_sig is None or (now - last_sig) > timedelta(minutes=SCAM_ALERT_COOLDOWN_MIN):
-            bd[_KEY_LAST_SIGNALS] = now
-            await safe_reply(msg, SIGNALS_ALERT, parse_mode=ParseMode.MARKDOWN)
-
-    # ── Sistema de Experiencia (XP) ──
-    user_id = msg.from_user.id
-    user_name = msg.from_user.first_name or "Usuario"
-    xp_cd = bd.setdefault(_KEY_XP_COOLDOWN, {})
-    now = datetime.now(TZ)
-    last_xp = xp_cd.get(user_id)
-    
-    if len(text.strip()) >= 5:
-        if not last_xp or (now - last_xp) > timedelta(minutes=1):
-            xp_cd[user_id] = now
-            gained = random.randint(1, 4)
-            _, n_lvl, level_up = add_xp(user_id, user_name, gained)
-            if level_up:
-                # Opcional: avisar nivel
-                await safe_reply(
-                    msg, 
-                    f"🎉 ¡Felicidades [{user_name}](tg://user?id={user_id})! "
-                    f"Has subido al *Nivel {n_lvl}* 🏆", 
-                    parse_mode=ParseMode.MARKDOWN
-                )
+# Nombre del bot escrito a mano ("beexy", "Bee Xy", "bee-xy"...)
+_BEEXY_PATTERN = re.compile(r"bee[\s\-_]?xy", re.IGNORECASE)
+
+
+class _IncomingMessage:
+    """
+    Un mensaje de texto pasando por el pipeline. Las etapas comparten las
+    versiones normalizadas del texto, que se calculan una sola vez y sólo si
+    alguna etapa las pide.
+    """
+
+    __slots__ = ("update", "context", "msg", "text", "bd", "alerted", "_lower", "_categories")
+
+    def __init__(self, update: Update, context: ContextTypes.DEFAULT_TYPE, msg) -> None:
+        self.update = update
+        self.context = context
+        self.msg = msg
+        self.text: str = msg.text
+        self.bd = _get_bot_data(context)
+        self.alerted = False  # ya se respondió con una alerta (scam/señales)
+        self._lower: str | None = None
+        self._categories: set[str] | None = None
+
+    @property
+    def lower(self) -> str:
+        if self._lower is None:
+            self._lower = self.text.lower()
+        return self._lower
+
+    @property
+    def categories(self) -> set[str]:
+        """Keywords (scam, señales, emociones) detectadas en una sola pasada."""
+        if self._categories is None:
+            self._categories = classify(self.text)
+        return self._categories
+
+
+_Stage = Callable[[_IncomingMessage], Awaitable[bool]]
+
+# Etapas en orden de ejecución; cada una retorna True si el mensaje ya quedó resuelto
+_STAGES: list[tuple[str, _Stage]] = []
+# etapa → calls / stops / errors / total_us / max_us
+_stage_stats: dict[str, dict] = {}
+
+
+def _stage(name: str) -> Callable[[_Stage], _Stage]:
+    """Registra una etapa del pipeline de on_message (en orden de definición)."""
+    def register(fn: _Stage) -> _Stage:
+        _STAGES.append((name, fn))
+        _stage_stats[name] = {"calls": 0, "stops": 0, "errors": 0, "total_us": 0.0, "max_us": 0.0}
+        return fn
+    return register
+
+
+@_stage("scam")
+async def _scam_stage(m: _IncomingMessage) -> bool:
+    if "wallet" in m.categories and state_store.alert_cooldowns.try_acquire("scam"):
+        m.alerted = True
+        await safe_reply(m.msg, SCAM_ALERT, parse_mode=ParseMode.MARKDOWN)
+    return False
+
+
+@_stage("signals")
+async def _signals_stage(m: _IncomingMessage) -> bool:
+    if "signals" in m.categories and state_store.alert_cooldowns.try_acquire("signals"):
+        m.alerted = True
+        await safe_reply(m.msg, SIGNALS_ALERT, parse_mode=ParseMode.MARKDOWN)
+    return False
+
+
+@_stage("xp")
+async def _xp_stage(m: _IncomingMessage) -> bool:
+    if len(m.text.strip()) < 5 or m.msg.from_user is None:
+        return False
+    user_id = m.msg.from_user.id
+    if not state_store.xp_cooldowns.try_acquire(user_id):
+        return False
+
+    user_name = m.msg.from_user.first_name or "Usuario"
+    gained = random.randint(1, 4)
+    _, n_lvl, level_up = await xp_buffer.award(user_id, user_name, gained)
+    if level_up:
+        await safe_reply(
+            m.msg,
+            f"🎉 ¡Felicidades [{user_name}](tg://user?id={user_id})! "
+            f"Has subido al *Nivel {n_lvl}* 🏆",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    return False
 
-    # ── Mención al bot ──
-    bot_info = bd.get(_KEY_BOT_INFO)
-    bot_username = (bot_info.username or "").lower() if bot_info else ""
-    beexy_pattern = re.compile(r"bee[\s\-_]?xy", re.IGNORECASE)
 
-    is_reply_to_bot = False
+def _is_reply_to_bot(msg) -> bool:
     try:
-        if msg.reply_to_message and msg.reply_to_message.from_user and msg.reply_to_message.from_user.is_bot:
-            is_reply_to_bot = True
+        reply = msg.reply_to_message
+        return bool(reply and reply.from_user and reply.from_user.is_bot)
     except Exception:
-        pass
+        return False
 
-    mentioned = (
-        is_reply_to_bot
-        or (bot_username and f"@{bot_username}" in text.lower())
-        or bool(beexy_pattern.search(text))
+
+@_stage("mention")
+async def _mention_stage(m: _IncomingMessage) -> bool:
+    """Pregunta a BeeXy (mención, @usuario o respuesta a un mensaje del bot)."""
+    bot_info = m.bd.get(_KEY_BOT_INFO)
+    bot_username = (bot_info.username or "").lower() if bot_info else ""
+    at_username = f"@{bot_username}" if bot_username else ""
+
+    named = _BEEXY_PATTERN.search(m.text) is not None
+    if not (named or (at_username and at_username in m.lower) or _is_reply_to_bot(m.msg)):
+        return False
+
+    question = m.lower.replace(at_username, "") if at_username else m.lower
+    if named:
+        question = _BEEXY_PATTERN.sub("", question)
+    question = question.strip()
+    msg = m.msg
+
+    if len(question) < 3:
+        await safe_reply(
+            msg,
+            "🐝 ¡Hola! Soy *BeeXy*. Preguntame lo que quieras.\n"
+            "Ejemplo: `BeeXy ¿qué es DeFi?`\n"
+            "También puedo buscar o generar imágenes 🎨",
+            parse_mode=ParseMode.MARKDOWN,
+        )
+        return True
+
+    # Detectar pedido de imagen
+    img_req = detect_image_request(question)
+    if img_req:
+        action, topic = img_req
+        await handle_image_request(msg, action, topic)
+        return True
+
+    user = m.update.effective_user
+    thinking_msg = await safe_reply(msg, "🐝 Pensando...")
+    editor = StreamingEditor(thinking_msg)
+    user_name = user.username or user.first_name or ""
+    answer = await ask_ai(
+        user.id, question, user_name,
+        on_partial=editor.update, on_queued=editor.queued,
     )
+    if not await editor.finish(answer):
+        # Si no se puede editar, intentar enviar como mensaje nuevo
+        await m.context.bot.send_message(chat_id=msg.chat_id, text=answer)
+    return True
 
-    if mentioned:
-        question = text
-        if bot_username:
-            question = re.sub(fr"@{re.escape(bot_username)}", "", question, flags=re.IGNORECASE)
-        question = beexy_pattern.sub("", question).strip().lower()
-
-        if len(question) < 3:
-            await safe_reply(
-                msg,
-                "🐝 ¡Hola! Soy *BeeXy*. Preguntame lo que quieras.\n"
-                "Ejemplo: `BeeXy ¿qué es DeFi?`\n"
-                "También puedo buscar o generar imágenes 🎨",
-                parse_mode=ParseMode.MARKDOWN,
-            )
-            return
 
-        # Detectar pedido de imagen
-        img_req = detect_image_request(question)
-        if img_req:
-            action, topic = img_req
-            await handle_image_request(msg, action, topic)
-            return
+@_stage("emotion")
+async def _emotion_stage(m: _IncomingMessage) -> bool:
+    # Después de una alerta de seguridad no corresponde festejar
+    if not m.alerted:
+        await _maybe_react_emotion(m.msg, m.text, m.categories)
+    return False
 
 
+async def on_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler principal para todos los mensajes de texto: corre las etapas en orden."""
+    msg = update.effective_message
+    if not msg or not msg.text:
+        return
 
-        thinking_msg = await safe_reply(msg, "🐝 Pensando...")
-        user_name = update.effective_user.username or update.effective_user.first_name or ""
-        answer = await ask_ai(update.effective_user.id, question, user_name)
+    logger.debug("📩 Mensaje en chat %s (tipo: %s): %s", msg.chat_id, msg.chat.type, msg.text[:20])
+    m = _IncomingMessage(update, context, msg)
+    for name, stage in _STAGES:
+        st = _stage_stats[name]
+        t0 = time.perf_counter()
         try:
-            await thinking_msg.edit_text(answer)
+            done = await stage(m)
         except Exception:
-            # Si no se puede editar, intentar enviar como mensaje nuevo
-            await context.bot.send_message(chat_id=msg.chat_id, text=answer)
-        return
+            st["errors"] += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - t0) * 1e6
+            st["calls"] += 1
+            st["total_us"] += elapsed
+            st["max_us"] = max(st["max_us"], elapsed)
+        if done:
+            st["stops"] += 1
+            return
+
 
-    # ── Reacciones emocionales ──
-    await _maybe_react_emotion(msg, text, context)
+def pipeline_stats() -> dict[str, dict]:
+    """Tiempo acumulado y cortes por etapa de on_message."""
+    out = {}
+    for name, st in _stage_stats.items():
+        s = dict(st)
+        s["avg_us"] = s["total_us"] / s["calls"] if s["calls"] else 0.0
+        out[name] = s
+    return out
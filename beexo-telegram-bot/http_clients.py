@@ -0,0 +1,110 @@
+"""
+Clientes HTTP compartidos por todo el proceso.
+
+Un `httpx.AsyncClient` por upstream (CoinGecko, Groq, Pollinations, HF...),
+creado al arrancar y reutilizado en cada llamada: se paga DNS + TCP + TLS
+una vez y después viajan por conexiones keep-alive.
+
+Cada upstream define su timeout y su tope de conexiones; HTTP/2 se activa
+si está instalado `h2` (y HTTP2_ENABLED no lo apaga). Los upstreams
+compartidos entre pedidos de distintos usuarios contra hosts de terceros
+("images") no guardan cookies: un cliente compartido las arrastraría de
+un pedido a otro.
+
+Importar este módulo (y los que lo usan: image_tools, market_data,
+gif_cache...) requiere `config`, o sea las variables de entorno del bot.
+
+Uso:
+    import http_clients
+    resp = await http_clients.get("coingecko").get(url, params=...)
+"""
+
+import importlib.util
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+
+from config import HTTP2_ENABLED, HTTP_KEEPALIVE_EXPIRY, logger
+
+
+class _Upstream:
+    """Configuración de conexión de un upstream."""
+
+    __slots__ = ("timeout", "connect", "max_connections", "follow_redirects", "http2", "cookies")
+
+    def __init__(
+        self, timeout: float, connect: float = 5.0, max_connections: int = 8,
+        follow_redirects: bool = False, http2: bool = True, cookies: bool = True,
+    ) -> None:
+        self.timeout = timeout
+        self.connect = connect
+        self.max_connections = max_connections
+        self.follow_redirects = follow_redirects
+        self.http2 = http2
+        self.cookies = cookies
+
+
+UPSTREAMS: dict[str, _Upstream] = {
+    "coingecko": _Upstream(timeout=10, max_connections=8),
+    "groq": _Upstream(timeout=20, max_connections=8),
+    "pollinations": _Upstream(timeout=120, connect=10, max_connections=4, follow_redirects=True),
+    "huggingface": _Upstream(timeout=120, connect=10, max_connections=4),
+    "twitter": _Upstream(timeout=15, max_connections=2, follow_redirects=True),
+    # Imágenes de resultados de búsqueda: muchos hosts distintos, casi sin reuso
+    "images": _Upstream(
+        timeout=15, max_connections=16, follow_redirects=True, http2=False, cookies=False,
+    ),
+}
+
+_H2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _no_cookies() -> CookieJar:
+    """Jar que rechaza toda cookie (ningún dominio permitido)."""
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+def _build(name: str) -> httpx.AsyncClient:
+    up = UPSTREAMS[name]
+    return httpx.AsyncClient(
+        cookies=None if up.cookies else _no_cookies(),
+        timeout=httpx.Timeout(up.timeout, connect=up.connect),
+        limits=httpx.Limits(
+            max_connections=up.max_connections,
+            max_keepalive_connections=up.max_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=up.http2 and HTTP2_ENABLED and _H2_AVAILABLE,
+        follow_redirects=up.follow_redirects,
+    )
+
+
+def get(name: str) -> httpx.AsyncClient:
+    """Cliente compartido del upstream `name` (se crea si todavía no existe)."""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build(name)
+    return client
+
+
+async def start() -> None:
+    """Crea todos los clientes (llamar en post_init)."""
+    for name in UPSTREAMS:
+        get(name)
+    logger.info(
+        "🌐 Clientes HTTP listos: %s (HTTP/2 %s)",
+        ", ".join(_clients), "activo" if HTTP2_ENABLED and _H2_AVAILABLE else "no disponible",
+    )
+
+
+async def close() -> None:
+    """Cierra los clientes y sus conexiones (llamar al apagar el bot)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug("Error cerrando cliente HTTP: %s", e)
@@ -4,13 +4,20 @@ Módulo de imágenes para BeeXy.
 - Generación de imágenes vía Hugging Face Inference API (100% gratis)
   Modelo: FLUX.1-schnell (Black Forest Labs) - alta calidad
 - Detección inteligente: personas reales → búsqueda, creativo → generación
+
+Usa los clientes de http_clients y web_search, que leen `config`: importar
+este módulo requiere las variables de entorno del bot (TELEGRAM_BOT_TOKEN,
+TARGET_CHAT_IDS).
 """
 
 import os
 import re
 import random
-import httpx
-from duckduckgo_search import DDGS
+import asyncio
+
+import http_clients
+import web_search
+from keyword_engine import KeywordEngine
 
 
 def _get_hf_token() -> str:
@@ -45,13 +52,12 @@ REAL_PEOPLE = [
 ]
 
 
+_REAL_PEOPLE_ENGINE = KeywordEngine({"person": REAL_PEOPLE})
+
+
 def _mentions_real_person(text: str) -> bool:
     """Detecta si el texto menciona una persona real."""
-    text_lower = text.lower()
-    for person in REAL_PEOPLE:
-        if person in text_lower:
-            return True
-    return False
+    return bool(_REAL_PEOPLE_ENGINE.match(text))
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -64,40 +70,41 @@ async def _optimize_search_query(query: str) -> str:
     if not api_key:
         return query
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": "llama-3.3-70b-versatile",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": (
-                                "You optimize image search queries. RULES:\n"
-                                "1. OUTPUT ONLY the search query, nothing else.\n"
-                                "2. Translate to English for wider results.\n"
-                                "3. Keep it short: 2-6 keywords max.\n"
-                                "4. Add 'HD' or 'high quality' if appropriate.\n"
-                                "5. For people: use their full real name + what the user wants.\n"
-                                "6. For memes/funny: keep the original intent.\n"
-                                "7. Remove filler words, keep only meaningful terms.\n"
-                                "Examples:\n"
-                                "- 'cr7 con la camiseta del real madrid' → 'Cristiano Ronaldo Real Madrid jersey HD'\n"
-                                "- 'messi celebrando gol' → 'Lionel Messi goal celebration HD'\n"
-                                "- 'bitcoin logo' → 'Bitcoin logo HD transparent'\n"
-                                "- 'gato gracioso' → 'funny cat meme HD'\n"
-                            ),
-                        },
-                        {"role": "user", "content": query},
-                    ],
-                    "max_tokens": 60,
-                    "temperature": 0.3,
-                },
-            )
+        client = http_clients.get("groq")
+        resp = await client.post(
+            "https://api.groq.com/openai/v1/chat/completions",
+            timeout=15,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": "llama-3.3-70b-versatile",
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": (
+                            "You optimize image search queries. RULES:\n"
+                            "1. OUTPUT ONLY the search query, nothing else.\n"
+                            "2. Translate to English for wider results.\n"
+                            "3. Keep it short: 2-6 keywords max.\n"
+                            "4. Add 'HD' or 'high quality' if appropriate.\n"
+                            "5. For people: use their full real name + what the user wants.\n"
+                            "6. For memes/funny: keep the original intent.\n"
+                            "7. Remove filler words, keep only meaningful terms.\n"
+                            "Examples:\n"
+                            "- 'cr7 con la camiseta del real madrid' → 'Cristiano Ronaldo Real Madrid jersey HD'\n"
+                            "- 'messi celebrando gol' → 'Lionel Messi goal celebration HD'\n"
+                            "- 'bitcoin logo' → 'Bitcoin logo HD transparent'\n"
+                            "- 'gato gracioso' → 'funny cat meme HD'\n"
+                        ),
+                    },
+                    {"role": "user", "content": query},
+                ],
+                "max_tokens": 60,
+                "temperature": 0.3,
+            },
+        )
         if resp.status_code == 200:
             optimized = resp.json()["choices"][0]["message"]["content"].strip()
             optimized = optimized.strip('"\'')
@@ -119,19 +126,15 @@ async def search_image(query: str, max_results: int = 15) -> tuple[bytes, str] |
 
     # Buscar con query optimizado + fallback con original
     all_results = []
-    for q in [optimized_query, query]:
-        try:
-            with DDGS() as ddgs:
-                results = list(ddgs.images(
-                    q,
-                    region="wt-wt",
-                    safesearch="moderate",
-                    size="Large",
-                    max_results=max_results,
-                ))
-                all_results.extend(results)
-        except Exception:
-            continue
+    searches = await asyncio.gather(*(
+        web_search.images(
+            q, region="wt-wt", safesearch="moderate", size="Large", max_results=max_results,
+        )
+        for q in (optimized_query, query)
+    ), return_exceptions=True)
+    for results in searches:
+        if isinstance(results, list):
+            all_results.extend(results)
 
     if not all_results:
         return None
@@ -149,33 +152,33 @@ async def search_image(query: str, max_results: int = 15) -> tuple[bytes, str] |
     # Tomar los primeros 10 sin mezclar para mantener relevancia
     candidates = unique[:12]
 
-    async with httpx.AsyncClient(timeout=15, follow_redirects=True) as client:
-        for r in candidates:
-            url = r.get("image", "")
-            title = r.get("title", "Imagen encontrada")
-            if not url:
+    client = http_clients.get("images")
+    for r in candidates:
+        url = r.get("image", "")
+        title = r.get("title", "Imagen encontrada")
+        if not url:
+            continue
+        try:
+            resp = await client.get(url)
+            if resp.status_code != 200:
                 continue
-            try:
-                resp = await client.get(url)
-                if resp.status_code != 200:
-                    continue
-                content = resp.content
-                # Mínimo 10KB para asegurar calidad decente
-                if len(content) < 10000:
-                    continue
-                ct = resp.headers.get("content-type", "")
-                is_img = (
-                    "image" in ct
-                    or url.lower().endswith((".jpg", ".jpeg", ".png", ".gif", ".webp"))
-                )
-                if not is_img:
-                    continue
-                # Límite Telegram: 10 MB para fotos
-                if len(content) > 10 * 1024 * 1024:
-                    continue
-                return (content, title)
-            except Exception:
+            content = resp.content
+            # Mínimo 10KB para asegurar calidad decente
+            if len(content) < 10000:
+                continue
+            ct = resp.headers.get("content-type", "")
+            is_img = (
+                "image" in ct
+                or url.lower().endswith((".jpg", ".jpeg", ".png", ".gif", ".webp"))
+            )
+            if not is_img:
+                continue
+            # Límite Telegram: 10 MB para fotos
+            if len(content) > 10 * 1024 * 1024:
                 continue
+            return (content, title)
+        except Exception:
+            continue
 
     return None
 
@@ -197,50 +200,50 @@ async def _enhance_prompt(prompt: str) -> str:
     if not api_key:
         return prompt
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            resp = await client.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": "llama-3.3-70b-versatile",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": (
-                                "You are an expert prompt engineer for FLUX AI image generation.\n\n"
-                                "RULES:\n"
-                                "1. OUTPUT ONLY the optimized English prompt. Nothing else.\n"
-                                "2. Be extremely descriptive: subject, action, environment, "
-                                "lighting (golden hour, studio light, neon, etc.), "
-                                "camera angle (close-up, wide shot, bird's eye), "
-                                "art style, mood, color palette, textures.\n"
-                                "3. Add quality tags: 'masterpiece, best quality, ultra detailed, "
-                                "sharp focus, high resolution, 8K'.\n"
-                                "4. For photorealistic: 'photorealistic, DSLR photograph, "
-                                "natural lighting, bokeh, depth of field, film grain'.\n"
-                                "5. For artistic: specify style explicitly "
-                                "(oil painting, watercolor, anime, cyberpunk, concept art, "
-                                "pixel art, etc.).\n"
-                                "6. For characters/people: describe pose, expression, clothing, "
-                                "hair, skin tone, body type in detail.\n"
-                                "7. For landscapes: describe sky, vegetation, water, structures, "
-                                "time of day, weather, atmosphere.\n"
-                                "8. Max 120 words. Every word must add visual information.\n"
-                                "9. NEVER include text/words TO APPEAR in the image unless "
-                                "the user specifically requests it.\n"
-                                "10. Do NOT mention real people's names - instead describe "
-                                "their distinctive visual features if the user asks for someone.\n"
-                            ),
-                        },
-                        {"role": "user", "content": prompt},
-                    ],
-                    "max_tokens": 250,
-                    "temperature": 0.6,
-                },
-            )
+        client = http_clients.get("groq")
+        resp = await client.post(
+            "https://api.groq.com/openai/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": "llama-3.3-70b-versatile",
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": (
+                            "You are an expert prompt engineer for FLUX AI image generation.\n\n"
+                            "RULES:\n"
+                            "1. OUTPUT ONLY the optimized English prompt. Nothing else.\n"
+                            "2. Be extremely descriptive: subject, action, environment, "
+                            "lighting (golden hour, studio light, neon, etc.), "
+                            "camera angle (close-up, wide shot, bird's eye), "
+                            "art style, mood, color palette, textures.\n"
+                            "3. Add quality tags: 'masterpiece, best quality, ultra detailed, "
+                            "sharp focus, high resolution, 8K'.\n"
+                            "4. For photorealistic: 'photorealistic, DSLR photograph, "
+                            "natural lighting, bokeh, depth of field, film grain'.\n"
+                            "5. For artistic: specify style explicitly "
+                            "(oil painting, watercolor, anime, cyberpunk, concept art, "
+                            "pixel art, etc.).\n"
+                            "6. For characters/people: describe pose, expression, clothing, "
+                            "hair, skin tone, body type in detail.\n"
+                            "7. For landscapes: describe sky, vegetation, water, structures, "
+                            "time of day, weather, atmosphere.\n"
+                            "8. Max 120 words. Every word must add visual information.\n"
+                            "9. NEVER include text/words TO APPEAR in the image unless "
+                            "the user specifically requests it.\n"
+                            "10. Do NOT mention real people's names - instead describe "
+                            "their distinctive visual features if the user asks for someone.\n"
+                        ),
+                    },
+                    {"role": "user", "content": prompt},
+                ],
+                "max_tokens": 250,
+                "temperature": 0.6,
+            },
+        )
         if resp.status_code == 200:
             enhanced = resp.json()["choices"][0]["message"]["content"].strip()
             enhanced = enhanced.strip('"\'')
@@ -259,13 +262,13 @@ async def _generate_pollinations(enhanced_prompt: str) -> bytes | None:
     url = POLLINATIONS_URL.format(prompt=encoded, seed=seed)
 
     try:
-        async with httpx.AsyncClient(timeout=120, follow_redirects=True) as client:
-            resp = await client.get(url)
-            if resp.status_code == 200:
-                content = resp.content
-                ct = resp.headers.get("content-type", "")
-                if ("image" in ct or len(content) > 10000):
-                    return content
+        client = http_clients.get("pollinations")
+        resp = await client.get(url)
+        if resp.status_code == 200:
+            content = resp.content
+            ct = resp.headers.get("content-type", "")
+            if ("image" in ct or len(content) > 10000):
+                return content
     except Exception:
         pass
 
@@ -273,10 +276,10 @@ async def _generate_pollinations(enhanced_prompt: str) -> bytes | None:
     try:
         seed2 = random.randint(1, 999999)
         url2 = POLLINATIONS_URL.format(prompt=encoded, seed=seed2)
-        async with httpx.AsyncClient(timeout=120, follow_redirects=True) as client:
-            resp = await client.get(url2)
-            if resp.status_code == 200 and len(resp.content) > 5000:
-                return resp.content
+        client = http_clients.get("pollinations")
+        resp = await client.get(url2)
+        if resp.status_code == 200 and len(resp.content) > 5000:
+            return resp.content
     except Exception:
         pass
 
@@ -301,26 +304,26 @@ async def _generate_hf(enhanced_prompt: str) -> bytes | None:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
+        client = http_clients.get("huggingface")
+        resp = await client.post(HF_ROUTER_URL, headers=headers, json=payload)
+
+        # Si el modelo se está cargando, esperar y reintentar
+        if resp.status_code == 503:
+            import asyncio
+            wait_time = 20
+            try:
+                data = resp.json()
+                wait_time = min(data.get("estimated_time", 20), 60)
+            except Exception:
+                pass
+            await asyncio.sleep(wait_time)
             resp = await client.post(HF_ROUTER_URL, headers=headers, json=payload)
 
-            # Si el modelo se está cargando, esperar y reintentar
-            if resp.status_code == 503:
-                import asyncio
-                wait_time = 20
-                try:
-                    data = resp.json()
-                    wait_time = min(data.get("estimated_time", 20), 60)
-                except Exception:
-                    pass
-                await asyncio.sleep(wait_time)
-                resp = await client.post(HF_ROUTER_URL, headers=headers, json=payload)
-
-            if resp.status_code == 200:
-                content = resp.content
-                ct = resp.headers.get("content-type", "")
-                if "image" in ct and len(content) > 5000:
-                    return content
+        if resp.status_code == 200:
+            content = resp.content
+            ct = resp.headers.get("content-type", "")
+            if "image" in ct and len(content) > 5000:
+                return content
     except Exception:
         pass
     return None
@@ -8,7 +8,6 @@ import os
 import random
 from datetime import datetime, time, timedelta
 
-import httpx
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
@@ -17,7 +16,16 @@ from chat_roles import community_chats, memes_chat
 from content import GOOD_MORNING, GOOD_NIGHT, POLLS
 from trivias_data import TRIVIAS_DATA as TRIVIAS
 from crypto_data import CRYPTO_EPHEMERIDES, CRYPTO_FUN_FACTS
-from db import get_setting, set_setting
+import answer_cache
+import coin_matcher
+import db_async
+import gif_cache
+import http_clients
+import leaderboard
+import market_data
+import retention
+import web_search
+import xp_buffer
 import re
 import json
 from meme_pool import pick_meme, use_and_replace, init_pool
@@ -75,32 +83,66 @@ async def engagement_job(context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 
+# ═══════════════════════════════════════════════════════════════
+# MANTENIMIENTO
+# ═══════════════════════════════════════════════════════════════
+
+async def xp_flush_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Vuelca a la DB el XP acumulado en memoria (y reintenta cargar el leaderboard)."""
+    await xp_buffer.flush_async()
+    if not leaderboard.is_loaded():
+        ranked = await xp_buffer.load_leaderboard()
+        if ranked is not None:
+            logger.info("🏆 Leaderboard cargado: %d usuarios", ranked)
+
+
+async def retention_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Archiva el historial IA viejo y compacta la DB (diario, de madrugada)."""
+    await db_async.run(retention.run_retention)
+
+
+async def answer_cache_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Vacía el cache de respuestas IA si cambió la Knowledge Base."""
+    await answer_cache.refresh_kb_version()
+    logger.debug("🧠 Cache de respuestas IA: %s", answer_cache.stats())
+
+
+# ═══════════════════════════════════════════════════════════════
+# CACHES EN SEGUNDO PLANO
+# ═══════════════════════════════════════════════════════════════
+
+async def market_refresh_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Mantiene caliente el cache de precios (monedas seguidas y consultadas hace poco)."""
+    await market_data.refresh()
+
+
+async def coin_list_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Recarga el listado de monedas de CoinGecko para la detección en preguntas."""
+    await coin_matcher.refresh_coin_list()
+
+
+async def gif_cache_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Completa los GIFs validados de las reacciones emocionales."""
+    await gif_cache.refresh()
+
+
 # ═══════════════════════════════════════════════════════════════
 # RESUMEN CRIPTO DIARIO
 # ═══════════════════════════════════════════════════════════════
 
 async def daily_crypto_summary_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Envía resumen diario del mercado cripto a las 10am."""
-    try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.get(
-                "https://api.coingecko.com/api/v3/simple/price",
-                params={
-                    "ids": "bitcoin,ethereum,binancecoin,solana,ripple,cardano,dogecoin,polkadot",
-                    "vs_currencies": "usd",
-                    "include_24hr_change": "true",
-                },
-            )
-            data = resp.json()
-    except Exception as e:
-        logger.warning("⚠️ Error en crypto summary: %s", e)
-        return
-
     coins_map = {
         "bitcoin": ("BTC", "₿"), "ethereum": ("ETH", "⟠"), "binancecoin": ("BNB", "🔶"),
         "solana": ("SOL", "◎"), "ripple": ("XRP", "💧"), "cardano": ("ADA", "🔵"),
         "dogecoin": ("DOGE", "🐕"), "polkadot": ("DOT", "⬡"),
     }
+    try:
+        data = await market_data.get_prices(list(coins_map))
+    except Exception as e:
+        logger.warning("⚠️ Error en crypto summary: %s", e)
+        return
+
     lines = ["📊 *Resumen Diario del Mercado Cripto*\n"]
     valid_coins = 0
     for coin_id, (symbol, icon) in coins_map.items():
@@ -163,12 +205,10 @@ async def weekly_news_job(context: ContextTypes.DEFAULT_TYPE) -> None:
         return
 
     try:
-        from duckduckgo_search import DDGS
-        with DDGS() as ddgs:
-            results = list(ddgs.news(
-                "criptomonedas bitcoin ethereum crypto noticias",
-                region="es-ar", max_results=5,
-            ))
+        results = await web_search.news(
+            "criptomonedas bitcoin ethereum crypto noticias",
+            region="es-ar", max_results=5,
+        )
     except Exception as e:
         logger.warning("⚠️ Error en weekly news: %s", e)
         return
@@ -214,8 +254,7 @@ async def beexo_radio_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Revisa si hay un nuevo tweet de @beexowallet con 'beexo radio' y lo envía al chat."""
     try:
         url = "https://syndication.twitter.com/srv/timeline-profile/screen-name/beexowallet"
-        async with httpx.AsyncClient(timeout=15, follow_redirects=True) as client:
-            resp = await client.get(url)
+        resp = await http_clients.get("twitter").get(url)
             
         m = re.search(r'<script id="__NEXT_DATA__" type="application/json">(.+?)</script>', resp.text)
         if not m:
@@ -225,7 +264,7 @@ async def beexo_radio_job(context: ContextTypes.DEFAULT_TYPE) -> None:
         data = json.loads(m.group(1))
         entries = data.get("props", {}).get("pageProps", {}).get("timeline", {}).get("entries", [])
         
-        last_id_str = get_setting("last_beexo_radio_tweet_id")
+        last_id_str = await db_async.get_setting("last_beexo_radio_tweet_id")
         last_id = int(last_id_str) if last_id_str else 0
         
         # Recorremos desde el más antiguo al más nuevo en los resultados parseados
@@ -258,7 +297,7 @@ async def beexo_radio_job(context: ContextTypes.DEFAULT_TYPE) -> None:
                 newest_id_str = t["id_str"]
                 
         if newest_id_str:
-            set_setting("last_beexo_radio_tweet_id", newest_id_str)
+            await db_async.set_setting("last_beexo_radio_tweet_id", newest_id_str)
             
     except Exception as e:
         logger.warning("⚠️ Error en beexo_radio_job: %s", e)
@@ -0,0 +1,95 @@
+"""
+Motor de keywords multi-patrón (Aho-Corasick).
+
+Los detectores del bot (anti-scam, anti-señales, emociones, personas reales)
+buscaban cada keyword por separado con `k in texto`: el mensaje se recorría
+una vez por keyword. Acá todas las keywords de todas las categorías se
+compilan en un único autómata al importar, y un solo recorrido del texto
+devuelve todas las categorías que aparecen. El costo es proporcional al
+largo del texto, no a la cantidad de keywords.
+
+Texto y keywords se normalizan igual (minúsculas y sin acentos), así que
+"señales", "senales" y "SEÑALES" matchean lo mismo. La semántica sigue
+siendo de substring, como el `k in texto` original.
+
+Uso:
+    engine = KeywordEngine({"wallet": ["seed", "wallet"], "spam": ["grupo vip"]})
+    engine.match("Pasame tu SEED")  # → {"wallet"}
+"""
+
+import unicodedata
+from collections import deque
+from typing import Iterable
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin acentos (la ñ queda como n)."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class KeywordEngine:
+    """Autómata Aho-Corasick: categoría → keywords, armado una sola vez."""
+
+    __slots__ = ("_goto", "_fail", "_out", "categories")
+
+    def __init__(self, keywords: dict[str, Iterable[str]]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._out: list[frozenset[str]] = [frozenset()]
+        self.categories = tuple(keywords)
+
+        for category, words in keywords.items():
+            for word in words:
+                self._add(fold(word), category)
+        self._fail = self._link()
+
+    def _add(self, word: str, category: str) -> None:
+        if not word:
+            return
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._out.append(frozenset())
+            state = nxt
+        self._out[state] = self._out[state] | {category}
+
+    def _link(self) -> list[int]:
+        """Calcula los enlaces de fallo (BFS) y propaga las salidas."""
+        fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in self._goto[f]:
+                    f = fail[f]
+                fail[nxt] = self._goto[f].get(ch, 0)
+                if self._out[fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] | self._out[fail[nxt]]
+        return fail
+
+    def match(self, text: str, folded: bool = False) -> set[str]:
+        """
+        Categorías con al menos una keyword en el texto, en una sola pasada.
+        Con `folded=True` se asume que el texto ya pasó por fold().
+        """
+        found: set[str] = set()
+        if not text:
+            return found
+        goto, fail, out = self._goto, self._fail, self._out
+        total = len(self.categories)
+        state = 0
+        for ch in (text if folded else fold(text)):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+                if len(found) == total:
+                    break
+        return found
@@ -0,0 +1,97 @@
+"""
+Leaderboard de XP en memoria.
+
+Se reconstruye desde `user_stats` al arrancar y se mantiene al día a medida
+que se otorga XP (ver xp_buffer.award), así /top se responde sin query y
+/me puede mostrar la posición del usuario.
+
+Estructura:
+  • _keys: lista ordenada de (-xp, user_id) → top-N es un slice y el
+    ranking de un usuario es una búsqueda binaria (O(log n))
+  • _entries: user_id → (xp, level, user_name)
+
+Costo de update: un usuario que gana XP sólo se desplaza sobre los que pasa
+en el ranking (O(log n + posiciones ganadas)); en el caso común no pasa a
+nadie y se reemplaza en su lugar. Los usuarios nuevos entran con poco XP,
+cerca del final de la lista, así que el insert mueve pocos elementos.
+"""
+
+from bisect import bisect_left, insort
+
+_keys: list[tuple[int, int]] = []
+_entries: dict[int, tuple[int, int, str]] = {}
+_loaded = False
+
+
+def rebuild(rows: list[dict]) -> int:
+    """Reconstruye el leaderboard desde filas de user_stats. Retorna la cantidad de usuarios."""
+    global _keys, _entries, _loaded
+    entries: dict[int, tuple[int, int, str]] = {}
+    for r in rows:
+        entries[r["user_id"]] = (r["xp"] or 0, r["level"] or 1, r["user_name"] or "")
+    _entries = entries
+    _keys = sorted((-xp, uid) for uid, (xp, _, _) in entries.items())
+    _loaded = True
+    return len(_entries)
+
+
+def is_loaded() -> bool:
+    return _loaded
+
+
+def update(user_id: int, user_name: str, xp: int, level: int) -> None:
+    """Registra el nuevo total de un usuario y lo reubica en el ranking."""
+    old = _entries.get(user_id)
+    new_key = (-xp, user_id)
+    if old is None:
+        insort(_keys, new_key)
+    elif old[0] != xp:
+        old_key = (-old[0], user_id)
+        i = bisect_left(_keys, old_key)
+        if i < len(_keys) and _keys[i] == old_key:
+            _move(i, new_key)
+        else:
+            insort(_keys, new_key)
+    _entries[user_id] = (xp, level, user_name or (old[2] if old else ""))
+
+
+def _move(i: int, new_key: tuple[int, int]) -> None:
+    """Mueve la clave en `i` a su nueva posición corriendo sólo el tramo intermedio."""
+    if new_key < _keys[i]:
+        # Ganó XP: sube; los que pasó bajan un lugar
+        j = bisect_left(_keys, new_key, 0, i)
+        _keys[j + 1:i + 1] = _keys[j:i]
+    else:
+        # Perdió XP: baja; los que lo pasan suben un lugar
+        j = bisect_left(_keys, new_key, i + 1) - 1
+        _keys[i:j] = _keys[i + 1:j + 1]
+    _keys[j] = new_key
+
+
+def get(user_id: int) -> dict | None:
+    """Estadísticas de un usuario, o None si no tiene XP."""
+    e = _entries.get(user_id)
+    if e is None:
+        return None
+    return {"user_name": e[2], "xp": e[0], "level": e[1]}
+
+
+def top(limit: int = 10) -> list[dict]:
+    """Los `limit` usuarios con más XP (mismo formato que db.get_top_users)."""
+    result = []
+    for neg_xp, uid in _keys[:limit]:
+        xp, level, name = _entries[uid]
+        result.append({"user_id": uid, "user_name": name, "xp": xp, "level": level})
+    return result
+
+
+def rank(user_id: int) -> int | None:
+    """Posición 1-based del usuario en el ranking, o None si no figura."""
+    e = _entries.get(user_id)
+    if e is None:
+        return None
+    return bisect_left(_keys, (-e[0], user_id)) + 1
+
+
+def size() -> int:
+    return len(_keys)
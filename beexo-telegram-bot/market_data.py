@@ -0,0 +1,324 @@
+"""
+Servicio compartido de datos de mercado (CoinGecko).
+
+La IA, /precio, el resumen diario y los memes de noticias leen de acá en vez
+de pegarle a la API cada uno por su cuenta. Se mantiene una foto en memoria:
+
+  • Precios por moneda (usd, ars, cambio 24h, market cap) con TTL:
+      - fresco (< MARKET_FRESH_TTL)  → se sirve directo
+      - viejo  (< MARKET_STALE_TTL)  → se sirve y se refresca en segundo plano
+      - vencido o ausente            → se pide, sólo por los IDs que faltan
+  • Datos globales, top del mercado y trending con la misma política.
+  • Pedidos concurrentes por el mismo dato comparten un único viaje.
+  • refresh() (job periódico) mantiene al día las monedas seguidas y las
+    consultadas hace poco.
+  • Ante un 429 se respeta Retry-After y mientras tanto se sirve lo cacheado.
+
+Uso:
+    import market_data
+    prices = await market_data.get_prices(["bitcoin", "ethereum"])
+    # → {"bitcoin": {"usd": ..., "ars": ..., "usd_24h_change": ..., ...}, ...}
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+import http_clients
+from config import MARKET_FRESH_TTL, MARKET_STALE_TTL, MARKET_TRACKED_COINS, logger
+
+COINGECKO_BASE = "https://api.coingecko.com/api/v3"
+
+_MAX_IDS_PER_CALL = 50    # IDs por llamada a simple/price
+_HOT_WINDOW = 600         # seg.: lo consultado en esta ventana entra al refresco
+_DEFAULT_BACKOFF = 60.0   # seg. de pausa ante un 429 sin Retry-After
+
+_PRICE_PARAMS = {
+    "vs_currencies": "usd,ars",
+    "include_24hr_change": "true",
+    "include_market_cap": "true",
+}
+
+
+class _Entry:
+    """Valor cacheado con el momento (monotonic) en que se obtuvo."""
+
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value: Any, fetched_at: float) -> None:
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+# coin_id → cotización tal como la devuelve simple/price
+_prices: dict[str, _Entry] = {}
+# "global" | "markets" | "trending" → respuesta cacheada
+_blobs: dict[str, _Entry] = {}
+# coin_id → última vez que alguien la pidió
+_last_requested: dict[str, float] = {}
+# clave → tarea de fetch en curso (single-flight)
+_inflight: dict[str, asyncio.Task] = {}
+_backoff_until = 0.0
+_stats = {
+    "hits": 0, "stale_hits": 0, "misses": 0,
+    "upstream_calls": 0, "upstream_errors": 0, "rate_limited": 0,
+}
+
+
+# ═══════════════════════════════════════════════════════════════
+# UPSTREAM
+# ═══════════════════════════════════════════════════════════════
+
+def _retry_after(resp: httpx.Response) -> float:
+    try:
+        return max(1.0, float(resp.headers.get("retry-after", "")))
+    except ValueError:
+        return _DEFAULT_BACKOFF
+
+
+async def _get_json(path: str, params: dict | None = None) -> Any | None:
+    """GET a CoinGecko. Devuelve el JSON o None (error, rate limit o backoff activo)."""
+    global _backoff_until
+    if time.monotonic() < _backoff_until:
+        return None
+    _stats["upstream_calls"] += 1
+    try:
+        resp = await http_clients.get("coingecko").get(f"{COINGECKO_BASE}{path}", params=params)
+    except Exception as e:
+        _stats["upstream_errors"] += 1
+        logger.warning("⚠️ CoinGecko %s: %s", path, e)
+        return None
+    if resp.status_code == 429:
+        wait = _retry_after(resp)
+        _backoff_until = time.monotonic() + wait
+        _stats["rate_limited"] += 1
+        logger.warning("⚠️ CoinGecko rate limit, pausa de %.0fs", wait)
+        return None
+    if resp.status_code != 200:
+        _stats["upstream_errors"] += 1
+        logger.warning("⚠️ CoinGecko %s → HTTP %d", path, resp.status_code)
+        return None
+    try:
+        return resp.json()
+    except ValueError:
+        _stats["upstream_errors"] += 1
+        return None
+
+
+async def _fetch_prices(coin_ids: list[str]) -> None:
+    for i in range(0, len(coin_ids), _MAX_IDS_PER_CALL):
+        chunk = coin_ids[i:i + _MAX_IDS_PER_CALL]
+        data = await _get_json("/simple/price", {"ids": ",".join(chunk), **_PRICE_PARAMS})
+        if not isinstance(data, dict):
+            continue
+        now = time.monotonic()
+        for cid, quote in data.items():
+            if isinstance(quote, dict) and quote:
+                _prices[cid] = _Entry(quote, now)
+
+
+async def _fetch_global() -> dict | None:
+    data = await _get_json("/global")
+    return data.get("data") if isinstance(data, dict) else None
+
+
+async def _fetch_markets() -> list | None:
+    data = await _get_json("/coins/markets", {
+        "vs_currency": "usd",
+        "order": "market_cap_desc",
+        "per_page": 25,
+        "page": 1,
+        "price_change_percentage": "24h",
+    })
+    return data if isinstance(data, list) else None
+
+
+async def _fetch_trending() -> dict | None:
+    data = await _get_json("/search/trending")
+    return data if isinstance(data, dict) else None
+
+
+# ═══════════════════════════════════════════════════════════════
+# SINGLE-FLIGHT
+# ═══════════════════════════════════════════════════════════════
+
+def _running(key: str) -> asyncio.Task | None:
+    """Tarea en curso para `key` en este event loop, si hay."""
+    task = _inflight.get(key)
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        return None
+    return task
+
+
+def _spawn(keys: list[str], coro: Awaitable[Any]) -> asyncio.Task:
+    """Lanza un fetch y lo registra bajo todas sus claves."""
+    task = asyncio.get_running_loop().create_task(coro)
+    for key in keys:
+        _inflight[key] = task
+
+    def _done(t: asyncio.Task) -> None:
+        for key in keys:
+            if _inflight.get(key) is t:
+                del _inflight[key]
+        if not t.cancelled() and t.exception() is not None:
+            logger.warning("⚠️ Error refrescando datos de mercado: %s", t.exception())
+
+    task.add_done_callback(_done)
+    return task
+
+
+async def _wait(tasks: set[asyncio.Task]) -> None:
+    # shield: si el que espera se cancela, el fetch compartido sigue para los demás
+    await asyncio.gather(*(asyncio.shield(t) for t in tasks), return_exceptions=True)
+
+
+def _start_price_fetch(coin_ids: list[str]) -> asyncio.Task | None:
+    todo = [cid for cid in coin_ids if _running(f"price:{cid}") is None]
+    if not todo:
+        return None
+    return _spawn([f"price:{cid}" for cid in todo], _fetch_prices(todo))
+
+
+# ═══════════════════════════════════════════════════════════════
+# API
+# ═══════════════════════════════════════════════════════════════
+
+async def get_prices(coin_ids: list[str]) -> dict[str, dict]:
+    """
+    Cotizaciones de las monedas pedidas, en el formato de simple/price.
+    Las que no se pudieron obtener no aparecen en el resultado.
+    """
+    now = time.monotonic()
+    result: dict[str, dict] = {}
+    stale: list[str] = []
+    missing: list[str] = []
+    waits: set[asyncio.Task] = set()
+
+    for cid in dict.fromkeys(coin_ids):
+        _last_requested[cid] = now
+        entry = _prices.get(cid)
+        age = now - entry.fetched_at if entry is not None else None
+        if age is not None and age < MARKET_STALE_TTL:
+            result[cid] = entry.value
+            if age < MARKET_FRESH_TTL:
+                _stats["hits"] += 1
+            else:
+                _stats["stale_hits"] += 1
+                stale.append(cid)
+            continue
+        _stats["misses"] += 1
+        task = _running(f"price:{cid}")
+        if task is not None:
+            waits.add(task)
+        else:
+            missing.append(cid)
+
+    if stale:
+        _start_price_fetch(stale)
+    if missing:
+        task = _start_price_fetch(missing)
+        if task is not None:
+            waits.add(task)
+    if waits:
+        await _wait(waits)
+        now = time.monotonic()
+        for cid in coin_ids:
+            entry = _prices.get(cid)
+            if cid not in result and entry is not None and now - entry.fetched_at < MARKET_STALE_TTL:
+                result[cid] = entry.value
+    return result
+
+
+async def _refresh_blob(key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+    value = await fetch()
+    if value is not None:
+        _blobs[key] = _Entry(value, time.monotonic())
+
+
+async def _get_blob(key: str, fetch: Callable[[], Awaitable[Any]]) -> Any | None:
+    """Misma política fresco / viejo / vencido que get_prices, para un único valor."""
+    now = time.monotonic()
+    entry = _blobs.get(key)
+    if entry is not None and now - entry.fetched_at < MARKET_STALE_TTL:
+        if now - entry.fetched_at < MARKET_FRESH_TTL:
+            _stats["hits"] += 1
+        else:
+            _stats["stale_hits"] += 1
+            if _running(key) is None:
+                _spawn([key], _refresh_blob(key, fetch))
+        return entry.value
+
+    _stats["misses"] += 1
+    task = _running(key) or _spawn([key], _refresh_blob(key, fetch))
+    await _wait({task})
+    entry = _blobs.get(key)
+    if entry is not None and time.monotonic() - entry.fetched_at < MARKET_STALE_TTL:
+        return entry.value
+    return None
+
+
+async def get_global() -> dict | None:
+    """Datos globales del mercado (market cap total, dominancia, etc.)."""
+    return await _get_blob("global", _fetch_global)
+
+
+async def get_markets() -> list[dict]:
+    """Top 25 por market cap con cambio 24h (coins/markets)."""
+    return await _get_blob("markets", _fetch_markets) or []
+
+
+async def get_trending() -> dict | None:
+    """Respuesta de search/trending."""
+    return await _get_blob("trending", _fetch_trending)
+
+
+async def refresh() -> int:
+    """
+    Refresca en una sola llamada las monedas seguidas más las consultadas
+    en los últimos minutos, y los datos globales. Retorna cuántas monedas pidió.
+    """
+    now = time.monotonic()
+    for cid, ts in list(_last_requested.items()):
+        if now - ts > _HOT_WINDOW:
+            del _last_requested[cid]
+    coin_ids = list(dict.fromkeys([*MARKET_TRACKED_COINS, *_last_requested]))
+    tasks = set()
+    task = _start_price_fetch(coin_ids)
+    if task is not None:
+        tasks.add(task)
+    if _running("global") is None:
+        tasks.add(_spawn(["global"], _refresh_blob("global", _fetch_global)))
+    await _wait(tasks)
+    return len(coin_ids)
+
+
+async def fetch_coin_list() -> list[dict]:
+    """
+    Listado completo de CoinGecko (id, symbol, name). Es pesado y cambia
+    poco: no se cachea acá, lo pide coin_matcher una vez por día.
+    """
+    data = await _get_json("/coins/list")
+    return data if isinstance(data, list) else []
+
+
+async def fetch_top_coin_ids(limit: int) -> list[str]:
+    """IDs de las `limit` monedas con más market cap (máx. 250, una sola página)."""
+    data = await _get_json("/coins/markets", {
+        "vs_currency": "usd",
+        "order": "market_cap_desc",
+        "per_page": limit,
+        "page": 1,
+    })
+    if not isinstance(data, list):
+        return []
+    return [c["id"] for c in data if isinstance(c, dict) and c.get("id")]
+
+
+def stats() -> dict:
+    s = dict(_stats)
+    s["cached_coins"] = len(_prices)
+    s["hot_coins"] = len(_last_requested)
+    s["backoff_s"] = max(0.0, _backoff_until - time.monotonic())
+    return s
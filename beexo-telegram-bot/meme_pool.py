@@ -232,6 +232,7 @@ async def generate_replacement_meme() -> Optional[dict]:
     """
     try:
         from google import genai
+        import gemini_limiter
         from config import GEMINI_API_KEY, GEMINI_MODEL
 
         if not GEMINI_API_KEY:
@@ -241,14 +242,22 @@ async def generate_replacement_meme() -> Optional[dict]:
         client = genai.Client(api_key=GEMINI_API_KEY)
         category = random.choice(CATEGORIES)
 
-        response = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=MEME_GENERATION_PROMPT.format(category=category["name"]),
-            config={
-                "temperature": 0.9,
-                "max_output_tokens": 150,
-            },
-        )
+        # Reponer memes es lo menos urgente: si Gemini está saturado se descarta
+        try:
+            response = await gemini_limiter.call(
+                lambda: client.aio.models.generate_content(
+                    model=GEMINI_MODEL,
+                    contents=MEME_GENERATION_PROMPT.format(category=category["name"]),
+                    config={
+                        "temperature": 0.9,
+                        "max_output_tokens": 150,
+                    },
+                ),
+                priority=gemini_limiter.REFILL,
+            )
+        except gemini_limiter.GeminiBusy:
+            logger.info("Gemini ocupado, se saltea la reposición del meme")
+            return None
 
         text = response.text.strip() if response and response.text else ""
         if not text:
@@ -0,0 +1,140 @@
+"""
+Armado del prompt de ask_ai con presupuesto de tokens.
+
+El contexto (KB, precios, noticias, web) y el historial se suman a la
+pregunta sin control de tamaño, y cada token de entrada es latencia y costo.
+Acá se estima cuántos tokens ocupa cada sección y se recorta por prioridad
+hasta entrar en AI_PROMPT_TOKEN_BUDGET:
+
+    precios en vivo  >  Knowledge Base  >  noticias / web  >  historial viejo
+
+La pregunta y el system prompt siempre van. Las secciones que no entran
+enteras se recortan por líneas; si ni así entran, se descartan. El historial
+se completa de lo más reciente a lo más viejo con lo que sobre.
+
+Uso:
+    plan = prompt_builder.build(question, context, history, system=SYSTEM_PROMPT)
+    contents = [*plan.history, {"role": "user", "content": plan.user_msg}]
+"""
+
+import math
+
+from config import AI_PROMPT_TOKEN_BUDGET, logger
+
+_CHARS_PER_TOKEN = 4        # estimación gruesa, sin llamar a count_tokens
+_MIN_SECTION_TOKENS = 40    # menos que esto no vale la pena como recorte
+_TRUNCATED = "\n[…recortado]"
+_CONTEXT_HEADER = "\n\n[CONTEXTO INTERNO - NO MOSTRAR LITERALMENTE AL USUARIO]:\n"
+
+# fuente de contexto → prioridad (menor = más importante)
+_PRIORITY = {
+    "prices": 0, "top_prices": 0, "global": 0,
+    "kb": 1,
+    "news": 2, "web": 2,
+}
+_DEFAULT_PRIORITY = 2
+
+_stats = {"prompts": 0, "tokens_total": 0, "tokens_max": 0, "truncated": 0, "dropped": 0}
+
+
+class PromptPlan:
+    """Resultado del armado: qué va a Gemini y cuánto se estima que ocupa."""
+
+    __slots__ = ("history", "user_msg", "tokens", "sections")
+
+    def __init__(self, history: list[dict], user_msg: str, tokens: int, sections: dict[str, str]) -> None:
+        self.history = history
+        self.user_msg = user_msg
+        self.tokens = tokens
+        self.sections = sections  # sección → "ok" | "recortada" | "descartada" | "3/8 turnos"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / _CHARS_PER_TOKEN) if text else 0
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Recorta `text` a ~`tokens`, en un corte de línea si hay uno razonable."""
+    max_chars = tokens * _CHARS_PER_TOKEN - len(_TRUNCATED)
+    cut = text[:max_chars]
+    nl = cut.rfind("\n")
+    if nl > max_chars // 2:
+        cut = cut[:nl]
+    return cut.rstrip() + _TRUNCATED
+
+
+def _fit_context(context: dict[str, str], available: int, sections: dict[str, str]) -> tuple[list[str], int]:
+    """Elige los bloques de contexto que entran. Retorna (bloques en orden original, tokens usados)."""
+    names = [n for n, text in context.items() if text]
+    kept: dict[str, str] = {}
+    used = 0
+    for name in sorted(names, key=lambda n: _PRIORITY.get(n, _DEFAULT_PRIORITY)):
+        text = context[name]
+        cost = estimate_tokens(text) + 1  # + separador
+        if cost <= available - used:
+            kept[name] = text
+            sections[name] = "ok"
+            used += cost
+        elif available - used >= _MIN_SECTION_TOKENS:
+            kept[name] = _truncate(text, available - used - 1)
+            sections[name] = "recortada"
+            _stats["truncated"] += 1
+            used = available
+        else:
+            sections[name] = "descartada"
+            _stats["dropped"] += 1
+    return [kept[n] for n in names if n in kept], used
+
+
+def _fit_history(history: list[dict], available: int) -> tuple[list[dict], int]:
+    """Los turnos más recientes que entran, sin cortar en el medio."""
+    kept: list[dict] = []
+    used = 0
+    for turn in reversed(history):
+        cost = estimate_tokens(turn["content"]) + 2  # + rol
+        if used + cost > available:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+    # Gemini espera que la charla arranque con un turno del usuario
+    while kept and kept[0]["role"] != "user":
+        used -= estimate_tokens(kept.pop(0)["content"]) + 2
+    return kept, used
+
+
+def build(
+    question: str, context: dict[str, str], history: list[dict],
+    system: str = "", budget: int | None = None,
+) -> PromptPlan:
+    """
+    Arma el mensaje del usuario (pregunta + contexto) y elige el historial
+    dentro del presupuesto de tokens.
+    """
+    budget = AI_PROMPT_TOKEN_BUDGET if budget is None else budget
+    sections: dict[str, str] = {}
+
+    fixed = estimate_tokens(system) + estimate_tokens(question) + estimate_tokens(_CONTEXT_HEADER)
+    blocks, context_tokens = _fit_context(context, max(0, budget - fixed), sections)
+    turns, history_tokens = _fit_history(history, max(0, budget - fixed - context_tokens))
+    sections["historial"] = f"{len(turns)}/{len(history)} turnos"
+
+    user_msg = question
+    if blocks:
+        user_msg = question + _CONTEXT_HEADER + "\n\n".join(blocks)
+    tokens = fixed + context_tokens + history_tokens
+
+    _stats["prompts"] += 1
+    _stats["tokens_total"] += tokens
+    _stats["tokens_max"] = max(_stats["tokens_max"], tokens)
+    logger.info(
+        "📏 Prompt IA ≈%d tokens (presupuesto %d): %s",
+        tokens, budget, ", ".join(f"{k}={v}" for k, v in sections.items()),
+    )
+    return PromptPlan(turns, user_msg, tokens, sections)
+
+
+def stats() -> dict:
+    s = dict(_stats)
+    s["tokens_avg"] = s["tokens_total"] / s["prompts"] if s["prompts"] else 0.0
+    return s
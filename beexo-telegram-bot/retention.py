@@ -0,0 +1,104 @@
+"""
+Retención y archivo del historial de IA.
+
+`interactions` y `ai_history` crecen para siempre, pero `load_ai_history`
+sólo lee las últimas MAX_AI_HISTORY filas de cada usuario. Este módulo deja
+en caliente las RETENTION_KEEP_TURNS más recientes por usuario y mueve el
+resto, en lotes, fuera de las tablas calientes. Al terminar compacta la
+base (VACUUM).
+
+  • Postgres: a `<tabla>_archive`, en la misma sentencia que las borra.
+  • SQLite: a archivos JSONL comprimidos con gzip en ARCHIVE_DIR, sólo si
+    está configurado (el filesystem de la instancia puede ser efímero, por
+    ej. en Railway: tiene que ser un volumen persistente). Sin ARCHIVE_DIR
+    no se borra nada. Orden por lote: primero se escribe el archivo, después
+    se borra de la DB, así una caída a mitad de camino puede duplicar filas
+    archivadas pero nunca perderlas.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+
+import db
+from config import ARCHIVE_DIR, RETENTION_BATCH, RETENTION_KEEP_TURNS, logger
+
+
+def _archive_path(table: str, stamp: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{table}-{stamp}.jsonl.gz")
+
+
+def _archive_to_file(table: str, ids: list[int], path: str) -> int:
+    """Escribe las filas en el archivo y recién entonces las borra de la DB."""
+    if not ARCHIVE_DIR:
+        raise RuntimeError("ARCHIVE_DIR no configurado: no se borra historial sin archivarlo")
+    rows = db.fetch_rows_by_id(table, ids)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+    return db.delete_rows_by_id(table, [r["id"] for r in rows])
+
+
+def _is_archivable(row_key: tuple, cutoffs: dict[int, tuple]) -> bool:
+    row_id, user_id, created_at = row_key
+    cutoff = cutoffs.get(user_id)
+    return cutoff is not None and (created_at, row_id) <= cutoff
+
+
+def archive_table(table: str, keep_per_user: int, batch: int, stamp: str) -> int:
+    """
+    Archiva y borra las filas viejas de una tabla. Retorna cuántas movió.
+
+    El corte de cada usuario se calcula una vez; después se recorre la tabla
+    una sola vez por id (keyset), así el costo es lineal en el tamaño de la
+    tabla aunque el atraso sea grande.
+    """
+    cutoffs = db.archive_cutoffs(table, keep_per_user)
+    if not cutoffs:
+        return 0
+    moved = 0
+    last_id = 0
+    path = _archive_path(table, stamp)
+    while True:
+        keys = db.scan_row_keys(table, last_id, batch)
+        if not keys:
+            break
+        last_id = keys[-1][0]
+        ids = [k[0] for k in keys if _is_archivable(k, cutoffs)]
+        if ids and db.archives_in_db():
+            moved += db.move_rows_to_archive(table, ids)
+        elif ids:
+            moved += _archive_to_file(table, ids, path)
+        if len(keys) < batch:
+            break
+    return moved
+
+
+def run_retention(
+    keep_per_user: int = RETENTION_KEEP_TURNS, batch: int = RETENTION_BATCH,
+) -> dict[str, int]:
+    """
+    Corre la retención sobre todas las tablas archivables.
+    Síncrono: llamarlo vía db_async.run desde el event loop.
+    """
+    if not db.archives_in_db() and not ARCHIVE_DIR:
+        logger.info("🗃️ Retención desactivada: configurar ARCHIVE_DIR en un volumen persistente")
+        return dict.fromkeys(db.ARCHIVABLE_TABLES, 0)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    moved: dict[str, int] = {}
+    for table in db.ARCHIVABLE_TABLES:
+        try:
+            moved[table] = archive_table(table, keep_per_user, batch, stamp)
+        except Exception as e:
+            logger.warning("Error archivando %s: %s", table, e)
+            moved[table] = 0
+    touched = [t for t, n in moved.items() if n]
+    if touched:
+        try:
+            db.vacuum_tables(touched)
+        except Exception as e:
+            logger.warning("Error compactando la DB: %s", e)
+    logger.info("🗃️ Retención: %s", moved)
+    return moved
@@ -0,0 +1,115 @@
+"""
+Estado efímero en memoria con vencimiento (cooldowns y deduplicación).
+
+Antes esto vivía en bot_data: un dict usuario → datetime para el cooldown
+de XP que nunca se limpiaba, y un set de bienvenidas que programaba un job
+de limpieza por cada miembro nuevo. Acá cada store guarda registros
+compactos (con __slots__) y un heap ordenado por vencimiento; en cada
+escritura se descartan los vencidos, así que la memoria queda acotada a lo
+que está vigente y no hace falta ningún job.
+
+Uso:
+    import state_store
+    if state_store.xp_cooldowns.try_acquire(user_id):
+        ...  # no estaba en cooldown; ahora sí por `ttl` segundos
+"""
+
+import heapq
+import itertools
+import time
+from typing import Any, Hashable
+
+from config import SCAM_ALERT_COOLDOWN_MIN
+
+
+class _Record:
+    __slots__ = ("expires_at", "value")
+
+    def __init__(self, expires_at: float, value: Any) -> None:
+        self.expires_at = expires_at
+        self.value = value
+
+
+class TTLStore:
+    """Claves que vencen solas después de `ttl` segundos."""
+
+    __slots__ = ("name", "ttl", "_items", "_heap", "_seq", "expired")
+
+    def __init__(self, name: str, ttl: float) -> None:
+        self.name = name
+        self.ttl = ttl
+        self._items: dict[Hashable, _Record] = {}
+        # (vence, desempate, clave); puede tener entradas viejas de claves renovadas
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def sweep(self, now: float | None = None) -> int:
+        """Descarta las claves vencidas. Retorna cuántas se borraron."""
+        now = time.monotonic() if now is None else now
+        heap, items = self._heap, self._items
+        removed = 0
+        while heap and heap[0][0] <= now:
+            expires_at, _, key = heapq.heappop(heap)
+            rec = items.get(key)
+            # Si la clave se renovó, esta entrada del heap es vieja
+            if rec is not None and rec.expires_at == expires_at:
+                del items[key]
+                removed += 1
+        # Demasiadas entradas viejas (claves renovadas muchas veces): rearmar
+        if len(heap) > 2 * len(items) + 64:
+            self._heap = [(r.expires_at, next(self._seq), k) for k, r in items.items()]
+            heapq.heapify(self._heap)
+        self.expired += removed
+        return removed
+
+    def set(self, key: Hashable, value: Any = None, ttl: float | None = None) -> None:
+        now = time.monotonic()
+        self.sweep(now)
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._items[key] = _Record(expires_at, value)
+        heapq.heappush(self._heap, (expires_at, next(self._seq), key))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        rec = self._items.get(key)
+        if rec is None or rec.expires_at <= time.monotonic():
+            return default
+        return rec.value
+
+    def active(self, key: Hashable) -> bool:
+        rec = self._items.get(key)
+        return rec is not None and rec.expires_at > time.monotonic()
+
+    def try_acquire(self, key: Hashable, ttl: float | None = None) -> bool:
+        """Cooldown: False si `key` sigue vigente; si no, la marca y retorna True."""
+        if self.active(key):
+            return False
+        self.set(key, ttl=ttl)
+        return True
+
+    def discard(self, key: Hashable) -> None:
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._heap.clear()
+
+
+# Un mensaje con XP por usuario por minuto
+xp_cooldowns = TTLStore("xp", ttl=60)
+# Usuarios recién bienvenidos (el service message y chat_member llegan ambos)
+welcomed = TTLStore("welcome", ttl=300)
+# Alertas de scam / señales / reacciones emocionales
+alert_cooldowns = TTLStore("alerts", ttl=SCAM_ALERT_COOLDOWN_MIN * 60)
+
+_STORES = (xp_cooldowns, welcomed, alert_cooldowns)
+
+
+def stats() -> dict[str, dict]:
+    return {
+        s.name: {"size": len(s), "heap": len(s._heap), "expired": s.expired}
+        for s in _STORES
+    }
@@ -0,0 +1,80 @@
+"""Benchmark de escrituras SQLite: modo por defecto vs. modo afinado (SQLITE_TUNED).
+
+Mide mensajes/segundo a través de `db.add_xp` y `db.save_ai_message`
+sobre una base temporal, con uno o varios hilos escribiendo a la vez.
+
+Uso:
+  python beexo-telegram-bot/tools/bench_db.py
+  python beexo-telegram-bot/tools/bench_db.py --messages 5000 --threads 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# El benchmark siempre corre sobre SQLite local
+os.environ.pop("DATABASE_URL", None)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "0")
+
+import logging
+
+import db
+
+logging.getLogger("beexy").setLevel(logging.WARNING)
+
+
+def _worker(thread_idx: int, count: int) -> None:
+    for i in range(count):
+        uid = thread_idx * 1_000_000 + (i % 500)
+        db.add_xp(uid, f"user{uid}", 2)
+        db.save_ai_message(uid, "user", f"mensaje de prueba {i}")
+
+
+def run(tuned: bool, messages: int, threads: int) -> float:
+    """Corre el benchmark en una base nueva y devuelve mensajes/segundo."""
+    tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    tmp.close()
+    db.close_pool()
+    db.DB_PATH = tmp.name
+    db.SQLITE_TUNED = tuned
+    try:
+        db.init_db()
+        per_thread = max(1, messages // threads)
+        workers = [
+            threading.Thread(target=_worker, args=(t, per_thread))
+            for t in range(threads)
+        ]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - t0
+        return (per_thread * threads) / elapsed
+    finally:
+        db.close_pool()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(tmp.name + suffix)
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--messages", type=int, default=2000, help="Mensajes totales por corrida")
+    p.add_argument("--threads", type=int, default=1, help="Hilos escribiendo en paralelo")
+    args = p.parse_args()
+
+    base = run(False, args.messages, args.threads)
+    print(f"default : {base:10.1f} msg/s")
+    tuned = run(True, args.messages, args.threads)
+    print(f"tuned   : {tuned:10.1f} msg/s  (x{tuned / base:.1f})")
@@ -1,5 +1,6 @@
 import os
 import sqlite3
+import time
 import argparse
 from html.parser import HTMLParser
 
@@ -63,6 +64,15 @@ def ingest_folder(folder: str, source_label: str = "local"):
                     cur.execute("INSERT INTO kb_docs (title, content, source) VALUES (?, ?, ?)", (title, text, source_label))
                 except Exception as e:
                     print("Failed to insert", path, e)
+    # Avisar al bot que la KB cambió (invalida el cache de respuestas IA)
+    try:
+        cur.execute(
+            "INSERT INTO settings (key, value) VALUES ('kb_version', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (str(int(time.time())),),
+        )
+    except sqlite3.Error as e:
+        print("No se pudo actualizar kb_version:", e)
     conn.commit()
     conn.close()
 
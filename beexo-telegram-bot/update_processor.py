@@ -0,0 +1,109 @@
+"""
+Procesamiento concurrente de updates con orden por chat.
+
+Por defecto python-telegram-bot procesa los updates de a uno: un /generar
+lento o una respuesta larga de Gemini frena a todos los demás chats. Con
+ChatOrderedProcessor:
+
+  • Updates de chats distintos se procesan en paralelo, hasta
+    UPDATE_CONCURRENCY a la vez.
+  • Los de un mismo chat (o del mismo usuario, si no hay chat) se procesan
+    de a uno y en el orden en que llegaron.
+  • El tope global se toma *después* del turno del chat: los updates que
+    esperan detrás de uno lento de su propio chat no ocupan lugares de
+    trabajo, así que no frenan a los demás.
+
+Uso:
+    ApplicationBuilder().concurrent_updates(ChatOrderedProcessor()) ...
+"""
+
+import asyncio
+from typing import Any, Awaitable, Hashable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import UPDATE_CONCURRENCY, UPDATE_MAX_PENDING, logger
+
+
+class _ChatTurn:
+    """Lock de un chat y cuántos updates lo están usando o esperando."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+def _sequence_key(update: object) -> Hashable | None:
+    """Clave que define el orden: el chat, o el usuario si no hay chat."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return ("chat", update.effective_chat.id)
+    if update.effective_user is not None:
+        return ("user", update.effective_user.id)
+    return None
+
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    """Updates en paralelo entre chats y en orden dentro de cada chat."""
+
+    __slots__ = ("_workers", "_turns", "_stats")
+
+    def __init__(
+        self, concurrency: int = UPDATE_CONCURRENCY, max_pending: int = UPDATE_MAX_PENDING,
+    ) -> None:
+        # El semáforo de la clase base acota los updates en vuelo (procesando o
+        # esperando turno); el propio acota los que realmente se procesan.
+        super().__init__(max_concurrent_updates=max(max_pending, concurrency))
+        self._workers = asyncio.Semaphore(concurrency)
+        self._turns: dict[Hashable, _ChatTurn] = {}
+        self._stats = {"processed": 0, "waited_for_chat": 0, "errors": 0, "max_chat_backlog": 0}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _sequence_key(update)
+        if key is None:
+            async with self._workers:
+                await self._run(coroutine)
+            return
+
+        turn = self._turns.get(key)
+        if turn is None:
+            turn = self._turns[key] = _ChatTurn()
+        turn.users += 1
+        if turn.lock.locked():
+            self._stats["waited_for_chat"] += 1
+            self._stats["max_chat_backlog"] = max(self._stats["max_chat_backlog"], turn.users - 1)
+        try:
+            async with turn.lock:
+                async with self._workers:
+                    await self._run(coroutine)
+        finally:
+            turn.users -= 1
+            if turn.users == 0 and self._turns.get(key) is turn:
+                del self._turns[key]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        try:
+            await coroutine
+        except Exception:
+            # Application ya manda los errores de los handlers al error handler;
+            # esto es sólo por si algo se escapa.
+            self._stats["errors"] += 1
+            logger.exception("Error procesando update")
+        finally:
+            self._stats["processed"] += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._turns.clear()
+
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        s["active_chats"] = len(self._turns)
+        s["in_flight"] = self.current_concurrent_updates
+        return s
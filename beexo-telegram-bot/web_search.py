@@ -0,0 +1,178 @@
+"""
+Búsqueda web (DuckDuckGo) sin bloquear el event loop.
+
+El cliente `DDGS` es síncrono: llamarlo directo desde un handler congela
+al bot entero mientras dura la búsqueda. Acá:
+  • Se ejecuta en un thread pool acotado (SEARCH_WORKERS).
+  • Los resultados se cachean por query normalizada durante SEARCH_CACHE_TTL,
+    y búsquedas idénticas en vuelo comparten una sola llamada.
+  • Un presupuesto compartido (SEARCH_BUDGET_PER_MIN) limita las búsquedas
+    reales; si DDG responde rate limit se hace backoff exponencial.
+    Sin presupuesto o en backoff se sirve lo cacheado (aunque esté vencido)
+    o una lista vacía.
+
+Uso:
+    import web_search
+    results = await web_search.news("bitcoin", region="es-ar", max_results=5)
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SEARCH_BUDGET_PER_MIN, SEARCH_CACHE_TTL, SEARCH_WORKERS, logger
+
+# DuckDuckGo search is optional at import time
+try:
+    from duckduckgo_search import DDGS  # type: ignore
+    from duckduckgo_search.exceptions import RatelimitException  # type: ignore
+except Exception:
+    DDGS = None
+    RatelimitException = Exception
+
+_CACHE_MAX = 512
+_BACKOFF_BASE = 30.0
+_BACKOFF_MAX = 600.0
+
+_executor: ThreadPoolExecutor | None = None
+# clave → (guardado_en, resultados); orden LRU
+_cache: "OrderedDict[tuple, tuple[float, list[dict]]]" = OrderedDict()
+_inflight: dict[tuple, asyncio.Task] = {}
+
+# Presupuesto: token bucket que se recarga a SEARCH_BUDGET_PER_MIN por minuto
+_tokens = float(SEARCH_BUDGET_PER_MIN)
+_tokens_at = time.monotonic()
+_backoff_until = 0.0
+_backoff_s = 0.0
+
+_stats = {"hits": 0, "misses": 0, "searches": 0, "errors": 0, "rate_limited": 0, "throttled": 0}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="beexy-ddg")
+    return _executor
+
+
+def normalize(query: str) -> str:
+    """Minúsculas, espacios colapsados y sin signos sueltos en los bordes."""
+    q = re.sub(r"\s+", " ", query.lower()).strip()
+    return q.strip("¿?¡!.,;: ")
+
+
+def _take_token() -> bool:
+    """Consume una búsqueda del presupuesto compartido, si queda."""
+    global _tokens, _tokens_at
+    now = time.monotonic()
+    if now < _backoff_until:
+        return False
+    rate = SEARCH_BUDGET_PER_MIN / 60.0
+    _tokens = min(float(SEARCH_BUDGET_PER_MIN), _tokens + (now - _tokens_at) * rate)
+    _tokens_at = now
+    if _tokens < 1:
+        return False
+    _tokens -= 1
+    return True
+
+
+def _on_rate_limit() -> None:
+    global _backoff_until, _backoff_s
+    _backoff_s = min(_BACKOFF_MAX, _backoff_s * 2 if _backoff_s else _BACKOFF_BASE)
+    _backoff_until = time.monotonic() + _backoff_s
+    _stats["rate_limited"] += 1
+    logger.warning("⚠️ DuckDuckGo rate limit, pausa de %.0fs", _backoff_s)
+
+
+def _run(kind: str, query: str, kwargs: dict) -> list[dict]:
+    """Corre en el thread pool: la llamada síncrona a DDGS."""
+    with DDGS() as ddgs:
+        return list(getattr(ddgs, kind)(query, **kwargs))
+
+
+async def _search(key: tuple, kind: str, query: str, kwargs: dict) -> list[dict] | None:
+    global _backoff_s
+    loop = asyncio.get_running_loop()
+    _stats["searches"] += 1
+    try:
+        results = await loop.run_in_executor(_get_executor(), _run, kind, query, kwargs)
+    except RatelimitException:
+        _on_rate_limit()
+        return None
+    except Exception as e:
+        _stats["errors"] += 1
+        logger.debug("Error buscando en DuckDuckGo (%s): %s", kind, e)
+        return None
+    _backoff_s = 0.0
+    _cache[key] = (time.monotonic(), results)
+    _cache.move_to_end(key)
+    while len(_cache) > _CACHE_MAX:
+        _cache.popitem(last=False)
+    return results
+
+
+async def _cached_search(kind: str, query: str, **kwargs) -> list[dict]:
+    if DDGS is None or not query or not query.strip():
+        return []
+    norm = normalize(query)
+    key = (kind, norm, tuple(sorted(kwargs.items())))
+    cached = _cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < SEARCH_CACHE_TTL:
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+        return cached[1]
+    _stats["misses"] += 1
+
+    task = _inflight.get(key)
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        if not _take_token():
+            _stats["throttled"] += 1
+            return cached[1] if cached is not None else []
+        task = asyncio.get_running_loop().create_task(_search(key, kind, norm, kwargs))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+    results = await asyncio.shield(task)
+    if results is None:
+        return cached[1] if cached is not None else []
+    return results
+
+
+# ═══════════════════════════════════════════════════════════════
+# API
+# ═══════════════════════════════════════════════════════════════
+
+async def text(query: str, region: str = "es-ar", max_results: int = 5) -> list[dict]:
+    """Resultados web (title, body, href)."""
+    return await _cached_search("text", query, region=region, max_results=max_results)
+
+
+async def news(query: str, region: str = "es-ar", max_results: int = 5) -> list[dict]:
+    """Noticias (title, body, url, date, source)."""
+    return await _cached_search("news", query, region=region, max_results=max_results)
+
+
+async def images(
+    query: str, region: str = "wt-wt", safesearch: str = "moderate",
+    size: str | None = None, max_results: int = 10,
+) -> list[dict]:
+    """Imágenes (image, title, url...)."""
+    return await _cached_search(
+        "images", query, region=region, safesearch=safesearch, size=size, max_results=max_results,
+    )
+
+
+def stats() -> dict:
+    s = dict(_stats)
+    s["cached"] = len(_cache)
+    s["backoff_s"] = max(0.0, _backoff_until - time.monotonic())
+    return s
+
+
+def shutdown() -> None:
+    """Libera el thread pool (llamar al apagar el bot)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
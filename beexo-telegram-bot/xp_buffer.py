@@ -0,0 +1,163 @@
+"""
+Acumulador write-behind de XP.
+
+En vez de un upsert por mensaje, los incrementos se suman en memoria
+por usuario y se vuelcan a `user_stats` en un único upsert multi-fila
+cada XP_FLUSH_INTERVAL segundos (y al apagar el bot).
+
+Los totales de cada usuario se cachean (se cargan del leaderboard o de la DB
+cuando gana XP), así la subida de nivel se detecta al instante sin esperar
+al flush. Después de cada flush se sueltan los usuarios sin XP pendiente:
+la DB ya tiene su total, y el cache queda acotado a los activos del último
+intervalo. Cada award también actualiza el leaderboard en memoria.
+"""
+
+import threading
+
+import db
+import db_async
+import leaderboard
+from config import logger
+
+
+class _UserXP:
+    """Total conocido de un usuario (DB + pendiente de volcar)."""
+
+    __slots__ = ("xp", "level")
+
+    def __init__(self, xp: int, level: int) -> None:
+        self.xp = xp
+        self.level = level
+
+
+# user_id → totales cacheados (sólo usuarios con XP reciente)
+_totals: dict[int, _UserXP] = {}
+# user_id → [user_name, xp_pendiente, nivel]
+_pending: dict[int, list] = {}
+_lock = threading.Lock()
+_stats = {"awards": 0, "flushes": 0, "rows_written": 0, "flush_errors": 0}
+
+
+async def _ensure_loaded(user_id: int) -> _UserXP:
+    """Devuelve los totales del usuario, cargándolos de la DB si hace falta."""
+    cached = _totals.get(user_id)
+    if cached is not None:
+        return cached
+    if leaderboard.is_loaded():
+        # El leaderboard ya tiene a todos los usuarios de la DB
+        stats = leaderboard.get(user_id)
+    else:
+        stats = await db_async.get_user_stats(user_id)
+    # Otro mensaje del mismo usuario pudo cargarlo mientras esperábamos
+    cached = _totals.get(user_id)
+    if cached is None:
+        if stats:
+            cached = _UserXP(stats["xp"], stats["level"])
+        else:
+            cached = _UserXP(0, 1)
+        _totals[user_id] = cached
+    return cached
+
+
+async def award(user_id: int, user_name: str, amount: int) -> tuple[int, int, bool]:
+    """
+    Suma XP en memoria y lo encola para el próximo flush.
+    Retorna (xp_actual, nivel_actual, level_up), igual que db.add_xp.
+    """
+    totals = await _ensure_loaded(user_id)
+    with _lock:
+        # Un flush pudo soltarlo mientras se cargaba: volver a registrarlo
+        totals = _totals.setdefault(user_id, totals)
+        totals.xp += amount
+        new_level = db.level_for_xp(totals.xp)
+        level_up = new_level > totals.level
+        if level_up:
+            totals.level = new_level
+        entry = _pending.get(user_id)
+        if entry is None:
+            _pending[user_id] = [user_name, amount, totals.level]
+        else:
+            entry[0] = user_name
+            entry[1] += amount
+            entry[2] = totals.level
+        _stats["awards"] += 1
+        leaderboard.update(user_id, user_name, totals.xp, totals.level)
+        return totals.xp, totals.level, level_up
+
+
+async def load_leaderboard() -> int | None:
+    """
+    Reconstruye el leaderboard desde la DB. Si la lectura falla retorna None
+    y el leaderboard queda sin cargar: los awards siguen leyendo cada usuario
+    de la DB en vez de tomarlo como nuevo (0 XP, nivel 1).
+    """
+    rows = await db_async.get_all_user_stats()
+    if rows is None:
+        return None
+    with _lock:
+        ranked = leaderboard.rebuild(rows)
+        # Los totales en memoria incluyen XP que la DB todavía no tiene
+        for uid, totals in _totals.items():
+            leaderboard.update(uid, "", totals.xp, totals.level)
+    return ranked
+
+
+def get_cached(user_id: int) -> dict | None:
+    """Totales en memoria del usuario (incluye XP aún no volcado)."""
+    cached = _totals.get(user_id)
+    if cached is None:
+        return None
+    return {"xp": cached.xp, "level": cached.level}
+
+
+def pending_count() -> int:
+    return len(_pending)
+
+
+def flush() -> int:
+    """
+    Vuelca todo el XP pendiente en un único upsert.
+    Si falla, los incrementos vuelven a la cola para el próximo intento.
+    Retorna la cantidad de filas escritas.
+    """
+    global _pending
+    with _lock:
+        if not _pending:
+            return 0
+        batch, _pending = _pending, {}
+    rows = [(uid, name, amount, level) for uid, (name, amount, level) in batch.items()]
+    try:
+        db.add_xp_bulk(rows)
+    except Exception as e:
+        logger.warning("Error volcando XP (%d usuarios), se reintenta: %s", len(rows), e)
+        with _lock:
+            _stats["flush_errors"] += 1
+            for uid, (name, amount, level) in batch.items():
+                entry = _pending.get(uid)
+                if entry is None:
+                    _pending[uid] = [name, amount, level]
+                else:
+                    entry[1] += amount
+                    entry[2] = max(entry[2], level)
+        return 0
+    with _lock:
+        _stats["flushes"] += 1
+        _stats["rows_written"] += len(rows)
+        for uid in batch:
+            if uid not in _pending:
+                _totals.pop(uid, None)
+    logger.debug("XP volcado: %d usuarios", len(rows))
+    return len(rows)
+
+
+async def flush_async() -> int:
+    """flush() en el executor de DB, para usar desde handlers y jobs."""
+    return await db_async.run(flush)
+
+
+def stats() -> dict:
+    with _lock:
+        s = dict(_stats)
+        s["pending"] = len(_pending)
+        s["cached_users"] = len(_totals)
+    return s
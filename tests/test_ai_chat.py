@@ -11,6 +11,9 @@ os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
 os.environ.setdefault("TARGET_CHAT_IDS", "123")
 os.environ.setdefault("GROQ_API_KEY", "test_key")
 
+import asyncio
+
+import ai_chat
 from ai_chat import _detect_coins, _is_price_question, _needs_web_search
 
 
@@ -89,3 +92,261 @@ class TestNeedsWebSearch:
 
     def test_como_funciona(self):
         assert _needs_web_search("cómo funciona staking") is True
+
+
+class TestGatherContext:
+    """Tests para la recolección de contexto en paralelo."""
+
+    @staticmethod
+    def _patch_sources(monkeypatch, delays: dict[str, float]):
+        def source(name):
+            async def fn(*args):
+                await asyncio.sleep(delays[name])
+                return f"[{name}]"
+            return fn
+
+        monkeypatch.setattr(ai_chat, "_kb_source", source("kb"))
+        monkeypatch.setattr(ai_chat, "_price_source", source("prices"))
+        monkeypatch.setattr(ai_chat, "_web_news", source("news"))
+        monkeypatch.setattr(ai_chat, "_web_search", source("web"))
+
+    def test_sources_run_concurrently_in_stable_order(self, monkeypatch):
+        self._patch_sources(monkeypatch, {"kb": 0.05, "prices": 0.05, "news": 0.05, "web": 0.01})
+        parts = asyncio.run(ai_chat._gather_context("noticias de bitcoin hoy"))
+        assert list(parts.values()) == ["[kb]", "[prices]", "[news]", "[web]"]
+
+    def test_late_sources_are_dropped(self, monkeypatch):
+        monkeypatch.setattr(ai_chat, "AI_CONTEXT_DEADLINE", 0.1)
+        self._patch_sources(monkeypatch, {"kb": 0.01, "prices": 0.01, "news": 5, "web": 5})
+        parts = asyncio.run(ai_chat._gather_context("noticias de bitcoin hoy"))
+        assert list(parts) == ["kb", "prices"]
+        assert ai_chat.context_stats()["web"]["late"] >= 1
+
+    def test_per_source_timeout(self, monkeypatch):
+        monkeypatch.setitem(ai_chat._SOURCE_TIMEOUTS, "kb", 0.02)
+        self._patch_sources(monkeypatch, {"kb": 1, "prices": 0.01, "news": 0, "web": 0})
+        parts = asyncio.run(ai_chat._gather_context("cuánto vale btc"))
+        assert parts == {"prices": "[prices]"}
+        assert ai_chat.context_stats()["kb"]["timeout"] >= 1
+
+
+class TestHistoryCache:
+    """Tests para el LRU de conversaciones en memoria."""
+
+    @staticmethod
+    def _setup(monkeypatch, loaded: dict[int, list[dict]]):
+        calls: list[int] = []
+
+        async def fake_load(user_id, limit=8):
+            calls.append(user_id)
+            return list(loaded.get(user_id, []))
+
+        monkeypatch.setattr(ai_chat.db_async, "load_ai_history", fake_load)
+        monkeypatch.setattr(ai_chat, "_histories", ai_chat.OrderedDict())
+        monkeypatch.setattr(ai_chat, "_history_stats", dict.fromkeys(ai_chat._history_stats, 0))
+        return calls
+
+    def test_hydrates_once_then_hits(self, monkeypatch):
+        calls = self._setup(monkeypatch, {1: [{"role": "user", "content": "hola"}]})
+
+        async def scenario():
+            first = await ai_chat._get_history(1)
+            second = await ai_chat._get_history(1)
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first is second
+        assert list(first) == [{"role": "user", "content": "hola"}]
+        assert calls == [1]
+        assert ai_chat.history_stats()["hits"] == 1
+
+    def test_evicts_least_recently_used(self, monkeypatch):
+        calls = self._setup(monkeypatch, {})
+        monkeypatch.setattr(ai_chat, "AI_HISTORY_MAX_USERS", 2)
+
+        async def scenario():
+            for uid in (1, 2, 1, 3):
+                await ai_chat._get_history(uid)
+
+        asyncio.run(scenario())
+        # El 1 se volvió a usar antes de que entrara el 3: no se recargó
+        assert calls == [1, 2, 3]
+        assert list(ai_chat._histories) == [1, 3]
+        assert ai_chat.history_stats()["evictions"] == 1
+
+    def test_idle_conversation_is_rehydrated(self, monkeypatch):
+        calls = self._setup(monkeypatch, {})
+        monkeypatch.setattr(ai_chat, "AI_HISTORY_IDLE_TTL", 0.0)
+
+        async def scenario():
+            await ai_chat._get_history(1)
+            await asyncio.sleep(0.01)
+            await ai_chat._get_history(1)
+
+        asyncio.run(scenario())
+        assert calls == [1, 1]
+
+    def test_turns_are_bounded(self, monkeypatch):
+        self._setup(monkeypatch, {})
+        turns = asyncio.run(ai_chat._get_history(1))
+        for i in range(ai_chat.MAX_AI_HISTORY + 5):
+            turns.append({"role": "user", "content": str(i)})
+        assert len(turns) == ai_chat.MAX_AI_HISTORY
+
+
+class _FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    async def generate_content_stream(self, **kwargs):
+        async def gen():
+            for piece in self.pieces:
+                yield _FakeChunk(piece)
+        return gen()
+
+    async def generate_content(self, **kwargs):
+        return _FakeChunk("".join(p for p in self.pieces if p))
+
+
+class _FakeClient:
+    def __init__(self, pieces):
+        self.aio = type("Aio", (), {"models": _FakeModels(pieces)})()
+
+
+class TestGenerate:
+    """Tests para la llamada a Gemini con y sin streaming."""
+
+    def test_streams_accumulated_text(self, monkeypatch):
+        monkeypatch.setattr(ai_chat, "_get_gemini_client", lambda: _FakeClient(["Hola", None, " mundo "]))
+        monkeypatch.setattr(ai_chat, "AI_STREAMING", True)
+        partials: list[str] = []
+
+        async def on_partial(text):
+            partials.append(text)
+
+        answer = asyncio.run(ai_chat._generate([], on_partial))
+        assert answer == "Hola mundo"
+        assert partials == ["Hola", "Hola mundo "]
+
+    def test_streaming_disabled_uses_single_call(self, monkeypatch):
+        monkeypatch.setattr(ai_chat, "_get_gemini_client", lambda: _FakeClient(["Hola", " mundo"]))
+        monkeypatch.setattr(ai_chat, "AI_STREAMING", False)
+        partials: list[str] = []
+
+        async def on_partial(text):
+            partials.append(text)
+
+        assert asyncio.run(ai_chat._generate([], on_partial)) == "Hola mundo"
+        assert partials == []
+
+
+class TestStreamingEditor:
+    """Tests para las ediciones progresivas del mensaje de respuesta."""
+
+    class _Msg:
+        def __init__(self, fail_with=None):
+            self.edits: list[str] = []
+            self.fail_with = fail_with
+
+        async def edit_text(self, text):
+            if self.fail_with is not None:
+                exc, self.fail_with = self.fail_with, None
+                raise exc
+            self.edits.append(text)
+
+    def test_edits_are_throttled(self):
+        from handlers import StreamingEditor
+
+        msg = self._Msg()
+        editor = StreamingEditor(msg, interval=60)
+
+        async def scenario():
+            await editor.update("a" * 30)
+            await editor.update("a" * 80)  # dentro del intervalo: se omite
+            return await editor.finish("a" * 100)
+
+        assert asyncio.run(scenario()) is True
+        assert msg.edits == ["a" * 30 + StreamingEditor._CURSOR, "a" * 100]
+
+    def test_retry_after_delays_final_edit(self):
+        from telegram.error import RetryAfter
+        from handlers import StreamingEditor
+
+        msg = self._Msg(fail_with=RetryAfter(0.05))
+        editor = StreamingEditor(msg, interval=0)
+
+        async def scenario():
+            await editor.update("parcial " * 5)
+            return await editor.finish("respuesta completa")
+
+        assert asyncio.run(scenario()) is True
+        assert msg.edits == ["respuesta completa"]
+
+    def test_finish_without_message_reports_failure(self):
+        from handlers import StreamingEditor
+
+        assert asyncio.run(StreamingEditor(None).finish("hola")) is False
+
+
+class TestAnswerCacheIsolation:
+    """Tests para que el cache de respuestas no mezcle charlas de usuarios."""
+
+    @staticmethod
+    def _setup(monkeypatch) -> list[int]:
+        histories = {
+            1: ai_chat.deque([
+                {"role": "user", "content": "mi wallet es la de Beexo"},
+                {"role": "assistant", "content": "Anotado."},
+            ]),
+            2: ai_chat.deque(),
+        }
+        prompts: list[int] = []
+
+        async def fake_history(user_id):
+            return histories[user_id]
+
+        async def fake_context(question):
+            return {}
+
+        async def fake_generate(contents, on_partial=None):
+            prompts.append(len(contents))
+            return f"respuesta con {len(contents)} mensajes"
+
+        async def fake_call(fn, **kwargs):
+            return await fn()
+
+        monkeypatch.setattr(ai_chat, "GEMINI_API_KEY", "test")
+        monkeypatch.setattr(ai_chat, "_get_history", fake_history)
+        monkeypatch.setattr(ai_chat, "_gather_context", fake_context)
+        monkeypatch.setattr(ai_chat, "_generate", fake_generate)
+        monkeypatch.setattr(ai_chat, "_remember_exchange", lambda *a: None)
+        monkeypatch.setattr(ai_chat.gemini_limiter, "call", fake_call)
+        ai_chat.answer_cache.clear()
+        return prompts
+
+    def test_faq_from_user_with_history_is_shared(self, monkeypatch):
+        prompts = self._setup(monkeypatch)
+        question = "cómo se exporta una seed phrase"
+
+        a = asyncio.run(ai_chat.ask_ai(1, question))
+        b = asyncio.run(ai_chat.ask_ai(2, question))
+
+        # El prompt de A no llevó su historial, y B lo recibe del cache
+        assert a == b == "respuesta con 1 mensajes"
+        assert prompts == [1]
+
+    def test_personal_question_uses_history_and_is_not_shared(self, monkeypatch):
+        prompts = self._setup(monkeypatch)
+        question = "cómo exporto mi seed phrase"
+
+        a = asyncio.run(ai_chat.ask_ai(1, question))
+        b = asyncio.run(ai_chat.ask_ai(2, question))
+
+        assert a == "respuesta con 3 mensajes"
+        assert b == "respuesta con 1 mensajes"
+        assert prompts == [3, 1]
@@ -0,0 +1,72 @@
+"""
+Tests para answer_cache.py — cache de respuestas de preguntas frecuentes.
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+import pytest
+import answer_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    answer_cache.clear()
+    monkeypatch.setattr(answer_cache, "_stats", dict.fromkeys(answer_cache._stats, 0))
+    monkeypatch.setattr(answer_cache, "_kb_version", None)
+    yield
+
+
+class TestAnswerCache:
+    """Tests para normalización, TTL, invalidación y estadísticas."""
+
+    def test_normalized_variants_share_answer(self):
+        answer_cache.put("¿Qué es una seed phrase?", "Son 12 palabras.")
+        assert answer_cache.get("que es una SEED phrase") == "Son 12 palabras."
+        assert answer_cache.get("qué es una seed-phrase!!") == "Son 12 palabras."
+
+    def test_short_and_follow_up_questions_skip_cache(self):
+        answer_cache.put("y eso cómo se hace?", "respuesta")
+        answer_cache.put("seed?", "respuesta")
+        assert answer_cache.get("y eso cómo se hace?") is None
+        assert answer_cache.stats()["size"] == 0
+
+    def test_personal_questions_skip_cache(self):
+        answer_cache.put("cómo recupero mi wallet", "Con tu seed.")
+        answer_cache.put("qué te dije hace un rato", "Que...")
+        assert answer_cache.stats()["size"] == 0
+
+    def test_expired_entry_is_a_miss(self, monkeypatch):
+        answer_cache.put("cómo se recupera una wallet", "Con tu seed.")
+        monkeypatch.setattr(answer_cache, "AI_ANSWER_CACHE_TTL", -1)
+        assert answer_cache.get("cómo se recupera una wallet") is None
+
+    def test_kb_change_invalidates(self, monkeypatch):
+        versions = iter(["0:1:1", "0:1:1", "0:2:2"])
+
+        async def fake_version():
+            return next(versions)
+
+        monkeypatch.setattr(answer_cache.db_async, "get_kb_version", fake_version)
+
+        async def scenario():
+            await answer_cache.refresh_kb_version()
+            answer_cache.put("cómo se recupera una wallet", "Con tu seed.")
+            unchanged = await answer_cache.refresh_kb_version()
+            changed = await answer_cache.refresh_kb_version()
+            return unchanged, changed
+
+        assert asyncio.run(scenario()) == (False, True)
+        assert answer_cache.get("cómo se recupera una wallet") is None
+
+    def test_hit_rate(self):
+        answer_cache.put("cómo se recupera una wallet", "Con tu seed.")
+        answer_cache.get("cómo se recupera una wallet")
+        answer_cache.get("qué es una seed phrase")
+        assert answer_cache.stats()["hit_rate"] == 0.5
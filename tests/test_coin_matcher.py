@@ -0,0 +1,106 @@
+"""
+Tests para coin_matcher.py — detección de monedas con un trie por palabras.
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+import pytest
+import coin_matcher
+
+COIN_LIST = [
+    {"id": "dogwifcoin", "symbol": "wif", "name": "dogwifhat"},
+    {"id": "fetch-ai", "symbol": "fet", "name": "Artificial Superintelligence Alliance"},
+    {"id": "bitcoin-cash", "symbol": "bch", "name": "Bitcoin Cash"},
+    {"id": "hola-token", "symbol": "hola", "name": "Hola"},
+    {"id": "que-coin", "symbol": "que", "name": "Que Coin"},
+    {"id": "fake-btc", "symbol": "btc", "name": "Fake Bitcoin"},
+    {"id": "dup-a", "symbol": "dup", "name": "Duplicate"},
+    {"id": "dup-b", "symbol": "dup", "name": "Duplicate"},
+    {"id": "tiny-cap", "symbol": "tny", "name": "Pregunta"},
+    {"id": "pasa-finance", "symbol": "pasa", "name": "Pasa Finance"},
+    {"id": "grupo-dao", "symbol": "grupo", "name": "Grupo DAO"},
+]
+# Top por market cap: el resto de los nombres no se busca en texto libre
+TOP_IDS = ["bitcoin-cash", "dogwifcoin", "fetch-ai"]
+
+
+@pytest.fixture
+def full_list(monkeypatch):
+    """Matcher cargado con un listado de CoinGecko de juguete."""
+    async def fake_fetch():
+        return COIN_LIST
+
+    async def fake_top(limit):
+        return TOP_IDS[:limit]
+
+    monkeypatch.setattr(coin_matcher.market_data, "fetch_coin_list", fake_fetch)
+    monkeypatch.setattr(coin_matcher.market_data, "fetch_top_coin_ids", fake_top)
+    monkeypatch.setattr(coin_matcher, "_matcher", coin_matcher._matcher)
+    monkeypatch.setattr(coin_matcher, "_loaded_at", coin_matcher._loaded_at)
+    asyncio.run(coin_matcher.refresh_coin_list())
+
+
+class TestCuratedAliases:
+    """Tests para los alias curados (disponibles desde el import)."""
+
+    def test_order_of_appearance(self):
+        assert coin_matcher.find("sol vs eth vs btc") == ["solana", "ethereum", "bitcoin"]
+
+    def test_whole_words_only(self):
+        assert coin_matcher.find("estoy solo y desolado") == []
+        assert coin_matcher.find("btc/usdt") == ["bitcoin", "tether"]
+
+    def test_longest_multiword_alias(self):
+        assert coin_matcher.find("qué onda near protocol?") == ["near"]
+
+    def test_case_insensitive(self):
+        assert coin_matcher.find("ETH y Doge") == ["ethereum", "dogecoin"]
+
+
+class TestCoinList:
+    """Tests para el listado completo de CoinGecko."""
+
+    def test_symbols_need_uppercase_or_dollar(self, full_list):
+        assert coin_matcher.find("compré FET y $wif") == ["fetch-ai", "dogwifcoin"]
+        assert coin_matcher.find("compré fet y wif") == []
+
+    def test_multiword_names(self, full_list):
+        assert coin_matcher.find("cómo viene bitcoin cash?") == ["bitcoin-cash"]
+
+    def test_common_words_and_ambiguous_symbols_skipped(self, full_list):
+        assert coin_matcher.find("hola, que tal, DUP") == []
+
+    def test_all_caps_sentence_is_not_tickers(self, full_list):
+        assert coin_matcher.find("QUE PASA CON EL GRUPO") == []
+
+    def test_symbols_outside_top_need_dollar(self, full_list):
+        assert coin_matcher.find("compré $PASA y $que") == ["pasa-finance", "que-coin"]
+
+    def test_names_outside_top_only_resolve(self, full_list):
+        assert coin_matcher.find("tengo una pregunta sobre wallets") == []
+        assert coin_matcher.resolve("pregunta") == "tiny-cap"
+
+    def test_curated_alias_wins(self, full_list):
+        assert coin_matcher.find("BTC") == ["bitcoin"]
+
+    def test_resolve_symbol_name_or_id(self, full_list):
+        assert coin_matcher.resolve("wif") == "dogwifcoin"
+        assert coin_matcher.resolve("Bitcoin Cash") == "bitcoin-cash"
+        assert coin_matcher.resolve("fetch-ai") == "fetch-ai"
+        assert coin_matcher.resolve("nada") is None
+
+    def test_failed_download_keeps_matcher(self, monkeypatch):
+        async def empty():
+            return []
+
+        monkeypatch.setattr(coin_matcher.market_data, "fetch_coin_list", empty)
+        before = coin_matcher._matcher
+        assert asyncio.run(coin_matcher.refresh_coin_list()) == 0
+        assert coin_matcher._matcher is before
@@ -14,7 +14,7 @@ os.environ.setdefault("TARGET_CHAT_IDS", "123")
 os.environ.setdefault("GROQ_API_KEY", "test_key")
 os.environ.setdefault("GEMINI_API_KEY", "test_key")
 
-from content import contains_wallet_keywords
+from content import classify, contains_wallet_keywords, detected_emotion
 
 
 class TestContainsWalletKeywords:
@@ -68,3 +68,23 @@ class TestContainsWalletKeywords:
     def test_case_insensitive(self):
         assert contains_wallet_keywords("SEED PHRASE") is True
         assert contains_wallet_keywords("Conectar Wallet") is True
+
+
+class TestClassify:
+    """Tests para la clasificación de keywords en una sola pasada."""
+
+    def test_returns_every_category(self):
+        cats = classify("Unite al canal de señales VIP, todo verde!!")
+        assert {"signals", "emotion:pump"} <= cats
+
+    def test_accents_and_case_are_folded(self):
+        assert "signals" in classify("UNETE A MI CANAL")
+        assert "wallet" in classify("FRASE DE RECUPERACION")
+
+    def test_keeps_substring_semantics(self):
+        # Igual que `k in texto`: "dm" dentro de "admin" también cuenta
+        assert "wallet" in classify("hablá con el admin")
+
+    def test_emotion_order_follows_reactions(self):
+        assert detected_emotion(classify("pump y después dump")) == "pump"
+        assert detected_emotion(classify("hola a todos")) is None
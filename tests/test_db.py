@@ -26,6 +26,7 @@ import config
 config.DB_PATH = _tmp.name
 
 import db
+import db_async
 
 # Patch db module to use test path
 db.DB_PATH = _tmp.name
@@ -40,7 +41,8 @@ def fresh_db():
     # Drop tables if exist  
     conn = sqlite3.connect(_tmp.name)
     cur = conn.cursor()
-    for table in ["interactions", "reports", "reminders", "ai_history", "kb_docs"]:
+    for table in ["interactions", "reports", "reminders", "ai_history", "kb_docs",
+                  "user_stats", "settings", "schema_version"]:
         cur.execute(f"DROP TABLE IF EXISTS {table}")
     conn.commit()
     conn.close()
@@ -66,6 +68,249 @@ class TestGetConn:
             pass
         # No debería haber leak
 
+    def test_conn_is_reused(self):
+        with db.get_conn() as c1:
+            pass
+        with db.get_conn() as c2:
+            pass
+        assert c1 is c2
+
+    def test_uncommitted_work_is_discarded(self):
+        with db.get_conn() as conn:
+            conn.cursor().execute(
+                "INSERT INTO settings (key, value) VALUES ('tmp', 'x')"
+            )
+        assert db.get_setting("tmp") is None
+
+    def test_pool_stats(self):
+        with db.get_conn():
+            pass
+        stats = db.pool_stats()
+        assert stats["backend"] == "sqlite"
+        assert stats["checkouts"] >= 1
+        assert stats["size"] >= 1
+
+
+class FakePgCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=()):
+        if self.conn.broken:
+            import psycopg2
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.executed.append(sql)
+
+    def fetchone(self):
+        return (1,)
+
+
+class FakePgConn:
+    """Conexión psycopg2 mínima: registra el SQL y puede romperse a pedido."""
+
+    def __init__(self):
+        from psycopg2 import extensions
+        from types import SimpleNamespace
+
+        self.closed = 0
+        self.broken = False
+        self.executed: list[str] = []
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        return FakePgCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def fake_pg(monkeypatch):
+    """psycopg2.connect falso; devuelve la lista de conexiones creadas."""
+    import psycopg2
+
+    created: list[FakePgConn] = []
+
+    def connect(dsn):
+        created.append(FakePgConn())
+        return created[-1]
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    return created
+
+
+def _pg_pool(maxconn=2, timeout=1.0, max_lifetime=0.0, healthcheck_idle=60.0):
+    return db._PostgresPool("postgres://test", 0, maxconn, timeout, max_lifetime, healthcheck_idle)
+
+
+class TestPostgresPool:
+    """Tests para el pool de Postgres con psycopg2 falso."""
+
+    def test_bounded_by_max_connections(self, fake_pg):
+        pool = _pg_pool(maxconn=1, timeout=0.05)
+        conn = pool.acquire()
+        with pytest.raises(TimeoutError):
+            pool.acquire()
+        pool.release(conn)
+        assert pool.acquire() is conn
+        assert pool.stats()["timeouts"] == 1
+        assert len(fake_pg) == 1
+
+    def test_reuses_most_recent_connection(self, fake_pg):
+        pool = _pg_pool(maxconn=3)
+        a, b = pool.acquire(), pool.acquire()
+        pool.release(a)
+        pool.release(b)
+        assert pool.acquire() is b
+        assert pool.stats()["created"] == 2
+
+    def test_failed_healthcheck_replaces_connection(self, fake_pg):
+        pool = _pg_pool(healthcheck_idle=0.0)
+        old = pool.acquire()
+        pool.release(old)
+        old.broken = True
+        new = pool.acquire()
+        assert new is not old
+        assert old.closed
+        assert pool.stats()["healthcheck_failures"] == 1
+
+    def test_recycles_after_max_lifetime(self, fake_pg):
+        import time
+
+        pool = _pg_pool(max_lifetime=0.01)
+        old = pool.acquire()
+        pool.release(old)
+        time.sleep(0.02)
+        assert pool.acquire() is not old
+        assert pool.stats()["recycled"] == 1
+
+    def test_counters_are_exact_across_threads(self, fake_pg):
+        import threading
+
+        pool = _pg_pool(maxconn=4)
+
+        def worker():
+            for _ in range(200):
+                pool.release(pool.acquire())
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        s = pool.stats()
+        assert s["checkouts"] == 1600
+        assert s["in_use"] == 0
+        assert s["created"] <= 4
+
+
+class TestPreparedStatements:
+    """Tests para PREPARE/EXECUTE por conexión en Postgres."""
+
+    def test_one_prepare_per_connection_then_execute(self, fake_pg, monkeypatch):
+        monkeypatch.setattr(db, "_PG", True)
+        pool = _pg_pool(maxconn=2)
+        monkeypatch.setattr(db, "_pool", pool)
+        monkeypatch.setitem(db._Q, "demo", db._Query("bx_demo", "SELECT a FROM t WHERE b = ?"))
+
+        def run():
+            with db.get_conn() as conn:
+                db._exec(conn, conn.cursor(), "demo", (1,))
+
+        run()
+        run()
+        # Dos conexiones a la vez: la segunda prepara por su cuenta
+        with db.get_conn() as busy:
+            db._exec(busy, busy.cursor(), "demo", (1,))
+            run()
+
+        first, second = fake_pg
+        prepare = "PREPARE bx_demo AS SELECT a FROM t WHERE b = $1"
+        execute = "EXECUTE bx_demo (%s)"
+        assert first.executed == [prepare, execute, execute, execute]
+        assert second.executed == [prepare, execute]
+        assert pool.stats()["prepares"] == 2
+
+
+class TestSqliteTuned:
+    """Tests para el modo SQLite afinado (opt-in)."""
+
+    def test_pragmas_applied_per_connection(self, monkeypatch):
+        monkeypatch.setattr(db, "SQLITE_TUNED", True)
+        db.close_pool()
+        try:
+            with db.get_conn() as conn:
+                cur = conn.cursor()
+                cur.execute("PRAGMA journal_mode")
+                assert cur.fetchone()[0] == "wal"
+                cur.execute("PRAGMA synchronous")
+                assert cur.fetchone()[0] == 1  # NORMAL
+                cur.execute("PRAGMA busy_timeout")
+                assert cur.fetchone()[0] == db.SQLITE_BUSY_TIMEOUT_MS
+        finally:
+            db.close_pool()
+
+
+class TestMigrations:
+    """Tests para el versionado de esquema."""
+
+    def test_applies_latest_version(self):
+        assert db.get_schema_version() == db.MIGRATIONS[-1][0]
+
+    def test_creates_indexes(self):
+        with db.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+            names = {r[0] for r in cur.fetchall()}
+        assert "idx_ai_history_user_created" in names
+        assert "idx_reminders_pending" in names
+        assert "idx_user_stats_xp" in names
+
+    def test_idempotent(self):
+        db.init_db()
+        with db.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM schema_version")
+            assert cur.fetchone()[0] == len(db.MIGRATIONS)
+
+    def test_history_query_uses_index(self):
+        with db.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "EXPLAIN QUERY PLAN SELECT role, content FROM ai_history "
+                "WHERE user_id = 1 ORDER BY created_at DESC LIMIT 8"
+            )
+            plan = " ".join(str(r) for r in cur.fetchall())
+        assert "idx_ai_history_user_created" in plan
+
+
+class TestQueryRegistry:
+    """Tests para el registro de queries precompiladas."""
+
+    def test_postgres_statement_shapes(self, monkeypatch):
+        monkeypatch.setattr(db, "_PG", True)
+        q = db._Query("bx_demo", "SELECT a FROM t WHERE b = ? AND c = ? LIMIT ?")
+        assert q.sql == "SELECT a FROM t WHERE b = %s AND c = %s LIMIT %s"
+        assert q.prepare_sql == "PREPARE bx_demo AS SELECT a FROM t WHERE b = $1 AND c = $2 LIMIT $3"
+        assert q.execute_sql == "EXECUTE bx_demo (%s, %s, %s)"
+
+    def test_sqlite_uses_plain_text(self):
+        q = db._Q["get_setting"]
+        assert q.prepare_sql is None
+        assert q.execute_sql == q.sql
+        assert "?" in q.sql
+
+    def test_add_xp_upsert_returns_totals(self):
+        assert db.add_xp(5, "ana", 20) == (20, 1, False)
+        assert db.add_xp(5, "ana", 10) == (30, 2, True)
+        assert db.get_user_stats(5) == {"user_name": "ana", "xp": 30, "level": 2}
+
 
 class TestLogInteraction:
     """Tests para log_interaction."""
@@ -118,6 +363,49 @@ class TestReminders:
         assert len(pending) == 0
 
 
+class TestQueryKb:
+    """Tests para la búsqueda en la Knowledge Base."""
+
+    def _insert(self, title, content):
+        with db.get_conn() as conn:
+            conn.cursor().execute(
+                "INSERT INTO kb_docs (title, content, source) VALUES (?, ?, 'test')",
+                (title, content),
+            )
+            conn.commit()
+
+    def test_terms_fold_accents_and_stopwords(self):
+        assert db._kb_terms("¿Qué es una Seed Phrase?") == ["seed", "phrase"]
+        assert db._kb_terms("cómo recupero mi wallet") == ["recupero", "wallet"]
+
+    def test_matches_full_question(self):
+        self._insert("Seed phrase", "Las 12 palabras que controlan tu billetera.")
+        self._insert("Staking", "Cómo generar rendimiento bloqueando tokens.")
+        hits = db.query_kb("¿qué es una seed phrase?")
+        assert hits and hits[0]["title"] == "Seed phrase"
+
+    def test_accent_insensitive(self):
+        self._insert("Recuperación", "Pasos para la recuperación de tu wallet.")
+        hits = db.query_kb("recuperacion de wallet")
+        assert hits and hits[0]["title"] == "Recuperación"
+
+    def test_title_ranks_higher(self):
+        self._insert("General", "Texto que menciona staking de pasada.")
+        self._insert("Staking", "Guía completa.")
+        hits = db.query_kb("staking")
+        assert hits[0]["title"] == "Staking"
+
+    def test_no_terms(self):
+        assert db.query_kb("¿qué es?") == []
+
+    def test_kb_version_changes_on_insert_and_bump(self):
+        v0 = db.get_kb_version()
+        self._insert("Seed phrase", "Las 12 palabras.")
+        v1 = db.get_kb_version()
+        db.set_setting("kb_version", "2")
+        assert len({v0, v1, db.get_kb_version()}) == 3
+
+
 class TestAIHistory:
     """Tests para save_ai_message y load_ai_history."""
 
@@ -143,3 +431,234 @@ class TestAIHistory:
         assert len(h1) == 1
         assert len(h2) == 1
         assert h1[0]["content"] == "hola user 1"
+
+
+class TestRecordAiExchange:
+    """Tests para record_ai_exchange (una sola transacción)."""
+
+    def test_writes_all_rows(self):
+        db.record_ai_exchange(5, "dani", "qué es DeFi", "Finanzas descentralizadas")
+        history = db.load_ai_history(5)
+        assert history == [
+            {"role": "user", "content": "qué es DeFi"},
+            {"role": "assistant", "content": "Finanzas descentralizadas"},
+        ]
+        with db.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT question, answer FROM interactions WHERE user_id = 5")
+            assert cur.fetchall() == [("qué es DeFi", "Finanzas descentralizadas")]
+
+    def test_background_writer(self):
+        import asyncio
+
+        async def scenario():
+            db_async.enqueue_write(db.record_ai_exchange, 6, "eli", "hola", "chau")
+            await db_async.drain_writes()
+
+        asyncio.run(scenario())
+        assert len(db.load_ai_history(6)) == 2
+
+
+class TestRetention:
+    """Tests para el archivo de historial viejo."""
+
+    def test_keeps_recent_and_archives_rest(self, tmp_path, monkeypatch):
+        import gzip
+        import json
+        import retention
+
+        monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+        for i in range(10):
+            db.save_ai_message(1, "user", f"viejo {i}")
+        db.save_ai_message(2, "user", "único")
+
+        moved = retention.run_retention(keep_per_user=3, batch=4)
+
+        assert moved["ai_history"] == 7
+        assert [m["content"] for m in db.load_ai_history(1, limit=10)] == [
+            "viejo 7", "viejo 8", "viejo 9",
+        ]
+        assert len(db.load_ai_history(2)) == 1
+        files = list(tmp_path.glob("ai_history-*.jsonl.gz"))
+        assert len(files) == 1
+        with gzip.open(files[0], "rt", encoding="utf-8") as f:
+            archived = [json.loads(line)["content"] for line in f]
+        assert archived == [f"viejo {i}" for i in range(7)]
+
+    def test_nothing_to_archive(self, tmp_path, monkeypatch):
+        import retention
+
+        monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+        db.save_ai_message(1, "user", "hola")
+        assert retention.run_retention(keep_per_user=3) == {"interactions": 0, "ai_history": 0}
+        assert not list(tmp_path.iterdir())
+
+    def test_without_archive_dir_nothing_is_deleted(self, monkeypatch):
+        import retention
+
+        monkeypatch.setattr(retention, "ARCHIVE_DIR", "")
+        for i in range(10):
+            db.save_ai_message(1, "user", f"viejo {i}")
+
+        assert retention.run_retention(keep_per_user=3) == {"interactions": 0, "ai_history": 0}
+        assert len(db.load_ai_history(1, limit=20)) == 10
+
+    def test_failed_archive_write_deletes_nothing(self, tmp_path, monkeypatch):
+        import retention
+
+        monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+        for i in range(10):
+            db.save_ai_message(1, "user", f"viejo {i}")
+
+        def disk_full(*args, **kwargs):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(retention.gzip, "open", disk_full)
+        assert retention.run_retention(keep_per_user=3)["ai_history"] == 0
+        assert len(db.load_ai_history(1, limit=20)) == 10
+
+    def test_postgres_moves_rows_in_one_statement(self, monkeypatch):
+        from contextlib import contextmanager
+
+        executed = []
+
+        class FakeCursor:
+            rowcount = 2
+
+            def execute(self, sql, params=()):
+                executed.append((sql, params))
+
+        class FakeConn:
+            committed = False
+
+            def cursor(self):
+                return FakeCursor()
+
+            def commit(self):
+                self.committed = True
+
+        conn = FakeConn()
+
+        @contextmanager
+        def fake_get_conn():
+            yield conn
+
+        monkeypatch.setattr(db, "_PG", True)
+        monkeypatch.setattr(db, "get_conn", fake_get_conn)
+        assert db.move_rows_to_archive("ai_history", [3, 4]) == 2
+        (sql, params), = executed
+        assert sql.startswith("WITH moved AS (DELETE FROM ai_history WHERE id = ANY(%s) RETURNING ")
+        assert "INSERT INTO ai_history_archive" in sql
+        assert params == ([3, 4],)
+        assert conn.committed
+
+    def test_interleaved_users_across_pages(self, tmp_path, monkeypatch):
+        import retention
+
+        monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+        for i in range(6):
+            db.save_ai_message(1, "user", f"ana {i}")
+            db.save_ai_message(2, "user", f"beto {i}")
+        db.save_ai_message(3, "user", "carla")
+
+        moved = retention.archive_table("ai_history", keep_per_user=2, batch=3, stamp="t")
+
+        assert moved == 8
+        assert [m["content"] for m in db.load_ai_history(1, limit=10)] == ["ana 4", "ana 5"]
+        assert [m["content"] for m in db.load_ai_history(2, limit=10)] == ["beto 4", "beto 5"]
+        assert len(db.load_ai_history(3)) == 1
+
+    def test_delete_by_id_counts_real_deletes(self, monkeypatch):
+        monkeypatch.setattr(db, "_SQLITE_IN_CHUNK", 2)
+        for i in range(5):
+            db.save_ai_message(1, "user", str(i))
+        ids = [r["id"] for r in db.fetch_rows_by_id("ai_history", list(range(1, 100)))]
+        assert len(ids) == 5
+        assert db.delete_rows_by_id("ai_history", ids + [9999]) == 5
+        assert db.load_ai_history(1) == []
+
+
+class TestDbAsync:
+    """Tests para la fachada async (executor dedicado)."""
+
+    def test_roundtrip(self):
+        import asyncio
+
+        async def scenario():
+            await db_async.save_ai_message(7, "user", "hola async")
+            return await db_async.load_ai_history(7)
+
+        history = asyncio.run(scenario())
+        assert history == [{"role": "user", "content": "hola async"}]
+
+
+class TestXpBulk:
+    """Tests para add_xp_bulk y el acumulador write-behind."""
+
+    def test_bulk_upsert_accumulates(self):
+        db.add_xp_bulk([(1, "ana", 10, 1), (2, "beto", 30, 2)])
+        db.add_xp_bulk([(1, "ana", 20, 2)])
+        assert db.get_user_stats(1) == {"user_name": "ana", "xp": 30, "level": 2}
+        assert db.get_user_stats(2)["xp"] == 30
+
+    def test_buffer_detects_level_up_and_flushes(self):
+        import asyncio
+        import xp_buffer
+
+        xp_buffer._totals.clear()
+        xp_buffer._pending.clear()
+
+        async def scenario():
+            first = await xp_buffer.award(99, "carla", 20)
+            second = await xp_buffer.award(99, "carla", 10)
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first == (20, 1, False)
+        assert second == (30, 2, True)
+        assert db.get_user_stats(99) is None  # todavía en memoria
+        assert xp_buffer.flush() == 1
+        assert db.get_user_stats(99) == {"user_name": "carla", "xp": 30, "level": 2}
+
+    def test_failed_leaderboard_load_keeps_db_totals(self, monkeypatch):
+        """Si la carga del leaderboard falla, nadie arranca de 0 XP."""
+        import asyncio
+        import leaderboard
+        import xp_buffer
+
+        db.add_xp_bulk([(7, "dani", 400, 5)])
+        xp_buffer._totals.clear()
+        xp_buffer._pending.clear()
+        monkeypatch.setattr(leaderboard, "_loaded", False)
+
+        def broken_conn():
+            raise sqlite3.OperationalError("database is locked")
+
+        async def scenario():
+            with monkeypatch.context() as m:
+                m.setattr(db, "get_conn", broken_conn)
+                ranked = await xp_buffer.load_leaderboard()
+            return ranked, await xp_buffer.award(7, "dani", 10)
+
+        ranked, award = asyncio.run(scenario())
+        assert ranked is None
+        assert not leaderboard.is_loaded()
+        assert award == (410, 5, False)
+
+        # El próximo intento carga y respeta el XP en memoria
+        assert asyncio.run(xp_buffer.load_leaderboard()) >= 1
+        assert leaderboard.get(7)["xp"] == 410
+
+    def test_flush_releases_idle_users(self):
+        import asyncio
+        import xp_buffer
+
+        xp_buffer._totals.clear()
+        xp_buffer._pending.clear()
+        asyncio.run(xp_buffer.award(50, "eli", 20))
+        assert xp_buffer.stats()["cached_users"] == 1
+        assert xp_buffer.flush() == 1
+        assert xp_buffer.stats()["cached_users"] == 0
+
+        # Al volver a ganar XP se recarga con el total ya volcado
+        assert asyncio.run(xp_buffer.award(50, "eli", 10)) == (30, 2, True)
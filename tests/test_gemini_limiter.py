@@ -0,0 +1,155 @@
+"""
+Tests para gemini_limiter.py — token bucket y cola con prioridad para Gemini.
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+import time
+
+import pytest
+import gemini_limiter
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    """Bucket rápido (1 token, 20/s) y cola vacía en cada test."""
+    monkeypatch.setattr(gemini_limiter, "_rate", 20.0)
+    monkeypatch.setattr(gemini_limiter, "_capacity", 1.0)
+    monkeypatch.setattr(gemini_limiter, "_tokens", 1.0)
+    monkeypatch.setattr(gemini_limiter, "_tokens_at", time.monotonic())
+    monkeypatch.setattr(gemini_limiter, "_pause_until", 0.0)
+    monkeypatch.setattr(gemini_limiter, "_backoff_s", 0.0)
+    monkeypatch.setattr(gemini_limiter, "_queue", [])
+    monkeypatch.setattr(gemini_limiter, "_dispatcher", None)
+    monkeypatch.setattr(gemini_limiter, "_stats", dict.fromkeys(gemini_limiter._stats, 0))
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class TestQueue:
+    """Tests para el orden y el descarte de la cola."""
+
+    def test_interactive_goes_before_background(self):
+        order: list[str] = []
+
+        async def job(name, priority):
+            await gemini_limiter.acquire(priority)
+            order.append(name)
+
+        async def scenario():
+            await gemini_limiter.acquire()  # consume el único token
+            await asyncio.gather(
+                job("fondo", gemini_limiter.BACKGROUND),
+                job("usuario", gemini_limiter.INTERACTIVE),
+            )
+
+        asyncio.run(scenario())
+        assert order == ["usuario", "fondo"]
+
+    def test_refill_is_shed_when_queue_is_busy(self):
+        async def scenario():
+            await gemini_limiter.acquire()
+            waiting = asyncio.create_task(gemini_limiter.acquire(gemini_limiter.INTERACTIVE))
+            await asyncio.sleep(0)
+            with pytest.raises(gemini_limiter.GeminiBusy):
+                await gemini_limiter.acquire(gemini_limiter.REFILL)
+            await waiting
+
+        asyncio.run(scenario())
+        assert gemini_limiter.stats()["shed"] == 1
+
+    def test_queued_caller_gets_position_and_eta(self):
+        notices: list[tuple[int, float]] = []
+
+        async def on_queued(position, eta):
+            notices.append((position, eta))
+
+        async def scenario():
+            await gemini_limiter.acquire()
+            await gemini_limiter.acquire(on_queued=on_queued)
+
+        asyncio.run(scenario())
+        assert notices[0][0] == 1
+        assert 0 < notices[0][1] <= 0.1
+
+    def test_wait_longer_than_max_raises_busy(self, monkeypatch):
+        monkeypatch.setattr(gemini_limiter, "_pause_until", time.monotonic() + 30)
+
+        async def scenario():
+            await gemini_limiter.acquire(max_wait=0.05)
+
+        with pytest.raises(gemini_limiter.GeminiBusy) as exc:
+            asyncio.run(scenario())
+        assert exc.value.eta > 20
+
+
+class TestRateLimit:
+    """Tests para la pausa global ante un 429."""
+
+    def test_retry_hint_is_parsed(self):
+        assert gemini_limiter.retry_after_from(Exception("Please retry in 17.5s.")) == 17.5
+        assert gemini_limiter.retry_after_from(Exception("{'retryDelay': '9s'}")) == 9.0
+        assert gemini_limiter.retry_after_from(Exception("boom")) is None
+
+    def test_rate_limit_is_detected_by_code_or_status(self):
+        from types import SimpleNamespace
+
+        class StatusError(Exception):
+            status = "RESOURCE_EXHAUSTED"
+
+        class HttpError(Exception):
+            response = SimpleNamespace(status_code=429)
+
+        assert gemini_limiter.is_rate_limit(RateLimited("quota"))
+        assert gemini_limiter.is_rate_limit(StatusError("quota"))
+        assert gemini_limiter.is_rate_limit(HttpError("quota"))
+
+    def test_429_in_message_text_is_not_a_rate_limit(self):
+        assert not gemini_limiter.is_rate_limit(ValueError("prompt has 4290 tokens"))
+        assert not gemini_limiter.is_rate_limit(ConnectionError("localhost:4293 refused"))
+
+    def test_call_pauses_queue_and_retries(self, monkeypatch):
+        attempts: list[float] = []
+
+        async def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise RateLimited("429 RESOURCE_EXHAUSTED. Please retry in 0.05s")
+            return "ok"
+
+        monkeypatch.setattr(gemini_limiter, "_MIN_PAUSE", 0.0)
+
+        assert asyncio.run(gemini_limiter.call(flaky)) == "ok"
+        assert attempts[1] - attempts[0] >= 0.04
+        assert gemini_limiter.stats()["rate_limited"] == 1
+
+    def test_rate_limit_drops_pending_refills(self):
+        async def scenario():
+            await gemini_limiter.acquire()
+            refill = asyncio.create_task(gemini_limiter.acquire(gemini_limiter.REFILL))
+            await asyncio.sleep(0)
+            gemini_limiter.report_rate_limit(5)
+            with pytest.raises(gemini_limiter.GeminiBusy):
+                await refill
+
+        asyncio.run(scenario())
+
+    def test_other_errors_are_not_retried(self):
+        calls = []
+
+        async def broken():
+            calls.append(1)
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            asyncio.run(gemini_limiter.call(broken))
+        assert calls == [1]
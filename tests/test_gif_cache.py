@@ -0,0 +1,131 @@
+"""
+Tests para gif_cache.py — GIFs de reacciones precargados y validados.
+"""
+
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+import pytest
+from telegram.error import BadRequest, RetryAfter, TimedOut
+
+import gif_cache
+
+_EMOTION = next(iter(gif_cache.EMOTION_REACTIONS))
+
+
+class FakeMessage:
+    """Mensaje que registra las animaciones enviadas y puede fallar a pedido."""
+
+    def __init__(self, fail_with: set | None = None, error: Exception | None = None):
+        self.sent: list[str] = []
+        self.fail_with = fail_with or set()
+        self.error = error or BadRequest("Wrong file identifier/http url specified")
+
+    async def reply_animation(self, animation, **kwargs):
+        if animation in self.fail_with:
+            raise self.error
+        self.sent.append(animation)
+        return SimpleNamespace(animation=SimpleNamespace(file_id=f"fid:{animation}"))
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """Cache vacío, búsquedas y validación falsas."""
+    calls = {"searches": 0, "validated": []}
+    valid = {"https://x/a.gif", "https://x/b.gif"}
+
+    async def fake_images(query, **kwargs):
+        calls["searches"] += 1
+        return [
+            {"image": "https://x/a.gif"},
+            {"image": "https://x/foto.jpg"},
+            {"image": "https://x/roto.gif"},
+            {"image": "https://x/b.gif"},
+        ]
+
+    async def fake_valid(url):
+        calls["validated"].append(url)
+        return url in valid
+
+    monkeypatch.setattr(gif_cache.web_search, "images", fake_images)
+    monkeypatch.setattr(gif_cache, "_is_valid_gif", fake_valid)
+    monkeypatch.setattr(gif_cache, "_pool", {})
+    monkeypatch.setattr(gif_cache, "_bad_urls", set())
+    monkeypatch.setattr(gif_cache, "_stats", dict.fromkeys(gif_cache._stats, 0))
+    return calls
+
+
+class TestRefresh:
+    """Tests para el relleno en segundo plano."""
+
+    def test_keeps_only_valid_gifs(self, fresh_cache):
+        added = asyncio.run(gif_cache.refresh_emotion(_EMOTION))
+        assert added == 2
+        assert [g.url for g in gif_cache._pool[_EMOTION]] == ["https://x/a.gif", "https://x/b.gif"]
+        assert "https://x/foto.jpg" not in fresh_cache["validated"]
+        assert "https://x/roto.gif" in gif_cache._bad_urls
+
+    def test_full_pool_skips_search(self, fresh_cache, monkeypatch):
+        monkeypatch.setattr(gif_cache, "GIF_CACHE_PER_EMOTION", 2)
+        asyncio.run(gif_cache.refresh_emotion(_EMOTION))
+        asyncio.run(gif_cache.refresh_emotion(_EMOTION))
+        assert fresh_cache["searches"] == 1
+
+    def test_bad_urls_are_not_revalidated(self, fresh_cache):
+        asyncio.run(gif_cache.refresh_emotion(_EMOTION))
+        asyncio.run(gif_cache.refresh_emotion(_EMOTION))
+        assert fresh_cache["validated"].count("https://x/roto.gif") == 1
+
+    def test_refresh_covers_every_emotion(self):
+        asyncio.run(gif_cache.refresh())
+        assert set(gif_cache.stats()["per_emotion"]) == set(gif_cache.EMOTION_REACTIONS)
+
+
+class TestSend:
+    """Tests para el envío con file_id y la poda de URLs rotas."""
+
+    def test_empty_pool_is_a_miss(self, fresh_cache):
+        assert asyncio.run(gif_cache.send(FakeMessage(), _EMOTION)) is False
+        assert gif_cache.stats()["misses"] == 1
+        assert fresh_cache["searches"] == 0
+
+    def test_remembers_file_id_after_first_send(self, fresh_cache, monkeypatch):
+        monkeypatch.setattr(gif_cache, "_pool", {_EMOTION: [gif_cache._Gif("https://x/a.gif")]})
+        msg = FakeMessage()
+        assert asyncio.run(gif_cache.send(msg, _EMOTION)) is True
+        assert asyncio.run(gif_cache.send(msg, _EMOTION)) is True
+        assert msg.sent == ["https://x/a.gif", "fid:https://x/a.gif"]
+        assert gif_cache.stats()["file_id_sends"] == 1
+        assert fresh_cache["searches"] == 0
+
+    def test_broken_url_is_pruned(self, monkeypatch):
+        monkeypatch.setattr(gif_cache, "_pool", {_EMOTION: [gif_cache._Gif("https://x/a.gif")]})
+        msg = FakeMessage(fail_with={"https://x/a.gif"})
+        assert asyncio.run(gif_cache.send(msg, _EMOTION)) is False
+        assert gif_cache._pool[_EMOTION] == []
+        assert "https://x/a.gif" in gif_cache._bad_urls
+
+    def test_stale_file_id_falls_back_to_url(self, monkeypatch):
+        gif = gif_cache._Gif("https://x/a.gif")
+        gif.file_id = "viejo"
+        monkeypatch.setattr(gif_cache, "_pool", {_EMOTION: [gif]})
+        assert asyncio.run(gif_cache.send(FakeMessage(fail_with={"viejo"}), _EMOTION)) is False
+        assert gif.file_id is None
+        assert gif_cache._pool[_EMOTION] == [gif]
+
+    @pytest.mark.parametrize("error", [RetryAfter(5), TimedOut()])
+    def test_transient_errors_keep_the_gif(self, monkeypatch, error):
+        gif = gif_cache._Gif("https://x/a.gif")
+        monkeypatch.setattr(gif_cache, "_pool", {_EMOTION: [gif]})
+        msg = FakeMessage(fail_with={"https://x/a.gif"}, error=error)
+        assert asyncio.run(gif_cache.send(msg, _EMOTION)) is False
+        assert gif_cache._pool[_EMOTION] == [gif]
+        assert "https://x/a.gif" not in gif_cache._bad_urls
+        assert gif_cache.stats()["send_errors"] == 1
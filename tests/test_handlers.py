@@ -0,0 +1,100 @@
+"""
+Tests para handlers.py — pipeline de etapas de on_message.
+"""
+
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+import pytest
+import handlers
+
+
+class FakeMessage:
+    """Mensaje de Telegram mínimo que registra las respuestas."""
+
+    def __init__(self, text: str, reply_to_bot: bool = False):
+        self.text = text
+        self.chat_id = 123
+        self.chat = SimpleNamespace(type="supergroup")
+        self.from_user = SimpleNamespace(id=7, first_name="Ana", username="ana", is_bot=False)
+        self.reply_to_message = (
+            SimpleNamespace(from_user=SimpleNamespace(is_bot=True)) if reply_to_bot else None
+        )
+        self.replies: list[str] = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def _run(text: str, **kwargs) -> FakeMessage:
+    msg = FakeMessage(text, **kwargs)
+    update = SimpleNamespace(effective_message=msg, effective_user=msg.from_user)
+    context = SimpleNamespace(bot_data={handlers._KEY_BOT_INFO: SimpleNamespace(username="BeexyBot")})
+    asyncio.run(handlers.on_message(update, context))
+    return msg
+
+
+@pytest.fixture(autouse=True)
+def quiet_side_effects(monkeypatch):
+    """XP, IA y reacciones falsas; contadores de etapas en cero."""
+    calls = {"xp": 0, "emotion": 0, "ai": []}
+
+    async def fake_award(user_id, user_name, gained):
+        calls["xp"] += 1
+        return 0, 1, False
+
+    async def fake_emotion(msg, text, categories):
+        calls["emotion"] += 1
+
+    async def fake_ask_ai(user_id, question, user_name=None, **kwargs):
+        calls["ai"].append(question)
+        return "respuesta"
+
+    monkeypatch.setattr(handlers.xp_buffer, "award", fake_award)
+    monkeypatch.setattr(handlers, "_maybe_react_emotion", fake_emotion)
+    monkeypatch.setattr(handlers, "ask_ai", fake_ask_ai)
+    for store in (handlers.state_store.xp_cooldowns, handlers.state_store.alert_cooldowns):
+        store.clear()
+    monkeypatch.setattr(handlers, "_stage_stats", {
+        name: dict.fromkeys(st, 0) for name, st in handlers._stage_stats.items()
+    })
+    return calls
+
+
+class TestPipeline:
+    """Tests para el orden y el corte temprano de las etapas."""
+
+    def test_plain_message_runs_every_stage(self, quiet_side_effects):
+        msg = _run("buenas tardes a todos")
+        assert msg.replies == []
+        assert quiet_side_effects["xp"] == 1
+        assert quiet_side_effects["emotion"] == 1
+        assert all(st["calls"] == 1 for st in handlers.pipeline_stats().values())
+
+    def test_mention_stops_before_emotion(self, quiet_side_effects):
+        msg = _run("BeeXy qué es DeFi?")
+        assert quiet_side_effects["ai"] == ["qué es defi?"]
+        assert msg.replies[-1] == "respuesta"
+        assert quiet_side_effects["emotion"] == 0
+        assert handlers.pipeline_stats()["mention"]["stops"] == 1
+
+    def test_at_username_and_reply_to_bot_are_mentions(self, quiet_side_effects):
+        _run("@beexybot cómo compro btc")
+        _run("y eso cómo se hace?", reply_to_bot=True)
+        assert quiet_side_effects["ai"] == ["cómo compro btc", "y eso cómo se hace?"]
+
+    def test_scam_alert_skips_emotion_reaction(self, quiet_side_effects):
+        msg = _run("me hackearon y está todo rojo")
+        assert msg.replies == [handlers.SCAM_ALERT]
+        assert quiet_side_effects["emotion"] == 0
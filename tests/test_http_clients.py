@@ -0,0 +1,72 @@
+"""
+Tests para http_clients.py — registro de clientes HTTP compartidos.
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+import http_clients
+
+
+class TestRegistry:
+    """Tests para creación, reuso y cierre de clientes."""
+
+    def test_same_client_is_reused(self):
+        async def scenario():
+            a = http_clients.get("coingecko")
+            b = http_clients.get("coingecko")
+            await http_clients.close()
+            return a, b
+
+        a, b = asyncio.run(scenario())
+        assert a is b
+        assert a.is_closed
+
+    def test_per_upstream_settings(self):
+        async def scenario():
+            await http_clients.start()
+            clients = {name: http_clients.get(name) for name in ("coingecko", "pollinations")}
+            settings = {
+                name: (c.timeout.read, c.follow_redirects) for name, c in clients.items()
+            }
+            await http_clients.close()
+            return settings
+
+        settings = asyncio.run(scenario())
+        assert settings["coingecko"] == (10, False)
+        assert settings["pollinations"] == (120, True)
+
+    def test_closed_client_is_recreated(self):
+        async def scenario():
+            first = http_clients.get("groq")
+            await http_clients.close()
+            second = http_clients.get("groq")
+            await http_clients.close()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first is not second
+
+    def test_images_client_keeps_no_cookies(self):
+        import httpx
+
+        async def scenario():
+            response = httpx.Response(
+                200, headers={"set-cookie": "sid=abc; Path=/"},
+                request=httpx.Request("GET", "https://img.example.com/a.gif"),
+            )
+            jars = {}
+            for name in ("images", "coingecko"):
+                client = http_clients.get(name)
+                client.cookies.extract_cookies(response)
+                jars[name] = len(client.cookies.jar)
+            await http_clients.close()
+            return jars
+
+        assert asyncio.run(scenario()) == {"images": 0, "coingecko": 1}
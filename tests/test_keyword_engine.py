@@ -0,0 +1,36 @@
+"""
+Tests para keyword_engine.py — autómata Aho-Corasick de keywords.
+"""
+
+import sys
+import os
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+from keyword_engine import KeywordEngine, fold
+
+
+class TestKeywordEngine:
+    """Tests para el matcheo multi-patrón."""
+
+    def test_fold(self):
+        assert fold("Señales ÚNICAS") == "senales unicas"
+
+    def test_overlapping_keywords(self):
+        engine = KeywordEngine({"a": ["he", "hers"], "b": ["she"], "c": ["his"]})
+        assert engine.match("ushers") == {"a", "b"}
+
+    def test_empty_text(self):
+        assert KeywordEngine({"a": ["x"]}).match("") == set()
+
+    def test_same_result_as_substring_search(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            keywords = {
+                cat: ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(3)]
+                for cat in ("x", "y", "z")
+            }
+            text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 20)))
+            expected = {cat for cat, words in keywords.items() if any(w in text for w in words)}
+            assert KeywordEngine(keywords).match(text) == expected
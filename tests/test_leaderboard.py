@@ -0,0 +1,70 @@
+"""
+Tests para leaderboard.py — ranking de XP en memoria.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+import pytest
+import leaderboard
+
+
+@pytest.fixture(autouse=True)
+def fresh_board():
+    leaderboard.rebuild([
+        {"user_id": 1, "user_name": "ana", "xp": 100, "level": 3},
+        {"user_id": 2, "user_name": "beto", "xp": 300, "level": 4},
+        {"user_id": 3, "user_name": "carla", "xp": 50, "level": 2},
+    ])
+    yield
+
+
+class TestLeaderboard:
+    """Tests para top, rank y actualización incremental."""
+
+    def test_top_sorted_by_xp(self):
+        top = leaderboard.top(10)
+        assert [u["user_id"] for u in top] == [2, 1, 3]
+        assert top[0] == {"user_id": 2, "user_name": "beto", "xp": 300, "level": 4}
+
+    def test_top_limit(self):
+        assert len(leaderboard.top(2)) == 2
+
+    def test_rank(self):
+        assert leaderboard.rank(2) == 1
+        assert leaderboard.rank(3) == 3
+        assert leaderboard.rank(999) is None
+
+    def test_update_moves_user(self):
+        leaderboard.update(3, "carla", 400, 5)
+        assert leaderboard.rank(3) == 1
+        assert leaderboard.rank(2) == 2
+        assert leaderboard.size() == 3
+
+    def test_update_new_user(self):
+        leaderboard.update(4, "dani", 60, 2)
+        assert leaderboard.rank(4) == 3
+        assert leaderboard.size() == 4
+        assert leaderboard.get(4)["xp"] == 60
+
+    def test_ties_are_stable(self):
+        leaderboard.update(3, "carla", 100, 3)
+        assert leaderboard.rank(1) == 2
+        assert leaderboard.rank(3) == 3
+
+    def test_losing_xp_moves_down(self):
+        leaderboard.update(2, "beto", 10, 1)
+        assert [u["user_id"] for u in leaderboard.top(10)] == [1, 3, 2]
+
+    def test_incremental_updates_match_full_sort(self):
+        import random
+
+        rng = random.Random(7)
+        xp = {1: 100, 2: 300, 3: 50}
+        for _ in range(2000):
+            uid = rng.randrange(40)
+            xp[uid] = max(0, xp.get(uid, 0) + rng.randint(-20, 60))
+            leaderboard.update(uid, f"u{uid}", xp[uid], 1)
+        assert leaderboard._keys == sorted((-x, uid) for uid, x in xp.items())
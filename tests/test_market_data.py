@@ -0,0 +1,103 @@
+"""
+Tests para market_data.py — cache de CoinGecko con stale-while-revalidate.
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+import pytest
+import market_data
+
+
+@pytest.fixture(autouse=True)
+def fake_upstream(monkeypatch):
+    """Reemplaza la API por un fake que registra cada llamada."""
+    calls: list[tuple[str, dict | None]] = []
+
+    async def fake_get_json(path, params=None):
+        calls.append((path, params))
+        await asyncio.sleep(0.01)
+        if path == "/simple/price":
+            return {cid: {"usd": 1.0, "usd_24h_change": 0.5} for cid in params["ids"].split(",")}
+        if path == "/global":
+            return {"data": {"total_market_cap": {"usd": 1e12}}}
+        return None
+
+    monkeypatch.setattr(market_data, "_get_json", fake_get_json)
+    market_data._prices.clear()
+    market_data._blobs.clear()
+    market_data._last_requested.clear()
+    market_data._inflight.clear()
+    yield calls
+
+
+class TestGetPrices:
+    """Tests para la política de cache de precios."""
+
+    def test_second_read_is_cached(self, fake_upstream):
+        async def scenario():
+            await market_data.get_prices(["bitcoin"])
+            return await market_data.get_prices(["bitcoin"])
+
+        assert asyncio.run(scenario()) == {"bitcoin": {"usd": 1.0, "usd_24h_change": 0.5}}
+        assert len(fake_upstream) == 1
+
+    def test_fetches_only_missing_ids(self, fake_upstream):
+        async def scenario():
+            await market_data.get_prices(["bitcoin"])
+            return await market_data.get_prices(["bitcoin", "ethereum"])
+
+        result = asyncio.run(scenario())
+        assert set(result) == {"bitcoin", "ethereum"}
+        assert fake_upstream[-1][1]["ids"] == "ethereum"
+
+    def test_concurrent_requests_share_one_call(self, fake_upstream):
+        async def scenario():
+            return await asyncio.gather(*(market_data.get_prices(["solana"]) for _ in range(10)))
+
+        results = asyncio.run(scenario())
+        assert all("solana" in r for r in results)
+        assert len(fake_upstream) == 1
+
+    def test_stale_served_and_refreshed_in_background(self, fake_upstream, monkeypatch):
+        monkeypatch.setattr(market_data, "MARKET_FRESH_TTL", 0.0)
+
+        async def scenario():
+            await market_data.get_prices(["bitcoin"])
+            stale = await market_data.get_prices(["bitcoin"])
+            await asyncio.sleep(0.05)  # dejar terminar el refresco
+            return stale
+
+        assert "bitcoin" in asyncio.run(scenario())
+        assert len(fake_upstream) == 2
+        assert market_data.stats()["stale_hits"] >= 1
+
+    def test_unknown_coin_is_omitted(self, monkeypatch):
+        async def empty(path, params=None):
+            return {}
+
+        monkeypatch.setattr(market_data, "_get_json", empty)
+        assert asyncio.run(market_data.get_prices(["nope"])) == {}
+
+
+class TestRefresh:
+    """Tests para el refresco en segundo plano."""
+
+    def test_includes_tracked_and_recent_coins(self, fake_upstream, monkeypatch):
+        monkeypatch.setattr(market_data, "MARKET_TRACKED_COINS", ["bitcoin"])
+
+        async def scenario():
+            await market_data.get_prices(["pepe"])
+            fake_upstream.clear()
+            await market_data.refresh()
+
+        asyncio.run(scenario())
+        price_calls = [p for path, p in fake_upstream if path == "/simple/price"]
+        assert price_calls[0]["ids"] == "bitcoin,pepe"
+        assert market_data._blobs["global"].value == {"total_market_cap": {"usd": 1e12}}
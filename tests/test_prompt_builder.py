@@ -0,0 +1,65 @@
+"""
+Tests para prompt_builder.py — armado del prompt con presupuesto de tokens.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+from prompt_builder import build, estimate_tokens
+
+
+def _turns(n: int, size: int = 40) -> list[dict]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i}" + "x" * (size - 1)}
+        for i in range(n)
+    ]
+
+
+class TestBuild:
+    """Tests para el recorte por prioridad."""
+
+    def test_everything_fits(self):
+        plan = build("qué es btc", {"kb": "KB info", "prices": "BTC $1"}, _turns(2), budget=1000)
+        assert "KB info" in plan.user_msg and "BTC $1" in plan.user_msg
+        assert plan.user_msg.index("KB info") < plan.user_msg.index("BTC $1")  # orden original
+        assert len(plan.history) == 2
+        assert plan.sections["kb"] == "ok"
+
+    def test_no_context_sends_bare_question(self):
+        plan = build("hola che", {}, [], budget=1000)
+        assert plan.user_msg == "hola che"
+
+    def test_prices_win_over_web(self):
+        context = {"prices": "p" * 400, "web": "w\n" * 400}
+        plan = build("pregunta", context, [], budget=estimate_tokens("pregunta") + 160)
+        assert plan.sections["prices"] == "ok"
+        assert plan.sections["web"] in ("recortada", "descartada")
+        assert plan.tokens <= estimate_tokens("pregunta") + 160
+
+    def test_oversized_section_is_truncated_on_a_line(self):
+        kb = "\n".join(f"línea {i} " + "k" * 30 for i in range(100))
+        plan = build("q", {"kb": kb}, [], budget=300)
+        assert plan.sections["kb"] == "recortada"
+        assert plan.user_msg.endswith("[…recortado]")
+        assert plan.tokens <= 300
+
+    def test_history_keeps_most_recent_turns(self):
+        history = _turns(8, size=200)
+        plan = build("q", {}, history, budget=130)
+        assert plan.history == history[-2:]
+        assert plan.sections["historial"] == "2/8 turnos"
+
+    def test_history_starts_with_user_turn(self):
+        history = _turns(4, size=200)
+        plan = build("q", {}, history, budget=80)
+        assert plan.history == []
+
+    def test_context_is_preferred_over_history(self):
+        plan = build("q", {"kb": "k" * 400}, _turns(4, size=400), budget=150)
+        assert plan.sections["kb"] == "ok"
+        assert plan.history == []
@@ -0,0 +1,61 @@
+"""
+Tests para state_store.py — cooldowns en memoria con vencimiento.
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+from state_store import TTLStore
+
+
+class TestTTLStore:
+    """Tests para el vencimiento y el cooldown."""
+
+    def test_try_acquire_is_a_cooldown(self):
+        store = TTLStore("t", ttl=60)
+        assert store.try_acquire(1) is True
+        assert store.try_acquire(1) is False
+        assert store.try_acquire(2) is True
+
+    def test_keys_expire(self):
+        store = TTLStore("t", ttl=0.01)
+        store.set("a", "valor")
+        assert store.get("a") == "valor"
+        time.sleep(0.02)
+        assert store.get("a") is None
+        assert store.try_acquire("a") is True
+
+    def test_expired_keys_are_swept_on_write(self):
+        store = TTLStore("t", ttl=0.01)
+        for uid in range(1000):
+            store.set(uid)
+        time.sleep(0.02)
+        store.set("nuevo")
+        assert len(store) == 1
+        assert store.expired == 1000
+
+    def test_renewed_key_survives_old_heap_entry(self):
+        store = TTLStore("t", ttl=0.01)
+        store.set("a")
+        store.set("a", ttl=60)
+        time.sleep(0.02)
+        store.sweep()
+        assert store.active("a")
+
+    def test_heap_stays_compact_with_renewals(self):
+        store = TTLStore("t", ttl=60)
+        for _ in range(1000):
+            store.set("a")
+        assert len(store._heap) <= 2 * len(store) + 65
+
+    def test_per_key_ttl(self):
+        store = TTLStore("t", ttl=60)
+        store.set("corto", ttl=0.01)
+        time.sleep(0.02)
+        assert not store.active("corto")
@@ -0,0 +1,105 @@
+"""
+Tests para update_processor.py — updates en paralelo entre chats y en orden por chat.
+"""
+
+import sys
+import os
+import asyncio
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+from telegram import Chat, Message, Update
+
+from update_processor import ChatOrderedProcessor
+
+_NOW = datetime.now(timezone.utc)
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP)
+    return Update(update_id=update_id, message=Message(message_id=update_id, date=_NOW, chat=chat))
+
+
+async def _handler(log: list, name: str, delay: float) -> None:
+    log.append(("start", name))
+    await asyncio.sleep(delay)
+    log.append(("end", name))
+
+
+class TestChatOrderedProcessor:
+    """Tests para el orden por chat y el tope global."""
+
+    def test_same_chat_is_sequential(self):
+        log: list = []
+
+        async def scenario():
+            proc = ChatOrderedProcessor(concurrency=4)
+            await asyncio.gather(
+                proc.process_update(_update(1, 10), _handler(log, "a", 0.03)),
+                proc.process_update(_update(2, 10), _handler(log, "b", 0.0)),
+            )
+            return proc
+
+        proc = asyncio.run(scenario())
+        assert log == [("start", "a"), ("end", "a"), ("start", "b"), ("end", "b")]
+        assert proc.stats()["waited_for_chat"] == 1
+        assert proc.stats()["active_chats"] == 0
+
+    def test_other_chats_are_not_blocked(self):
+        log: list = []
+
+        async def scenario():
+            proc = ChatOrderedProcessor(concurrency=4)
+            await asyncio.gather(
+                proc.process_update(_update(1, 10), _handler(log, "lento", 0.05)),
+                proc.process_update(_update(2, 20), _handler(log, "rapido", 0.0)),
+            )
+
+        asyncio.run(scenario())
+        assert log.index(("end", "rapido")) < log.index(("end", "lento"))
+
+    def test_global_cap(self):
+        running = 0
+        peak = 0
+
+        async def work():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        async def scenario():
+            proc = ChatOrderedProcessor(concurrency=2)
+            await asyncio.gather(*(proc.process_update(_update(i, i), work()) for i in range(6)))
+
+        asyncio.run(scenario())
+        assert peak == 2
+
+    def test_backlog_of_one_chat_does_not_take_worker_slots(self):
+        log: list = []
+
+        async def scenario():
+            proc = ChatOrderedProcessor(concurrency=2)
+            tasks = [proc.process_update(_update(i, 10), _handler(log, f"spam{i}", 0.02)) for i in range(5)]
+            tasks.append(proc.process_update(_update(99, 20), _handler(log, "otro", 0.0)))
+            await asyncio.gather(*tasks)
+
+        asyncio.run(scenario())
+        assert log.index(("end", "otro")) < log.index(("start", "spam1"))
+
+    def test_handler_errors_are_contained(self):
+        async def boom():
+            raise ValueError("x")
+
+        async def scenario():
+            proc = ChatOrderedProcessor(concurrency=1)
+            await proc.process_update(_update(1, 10), boom())
+            await proc.process_update(_update(2, 10), _handler([], "ok", 0))
+            return proc
+
+        assert asyncio.run(scenario()).stats()["errors"] == 1
@@ -0,0 +1,86 @@
+"""
+Tests para web_search.py — DDGS async con cache y presupuesto.
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "beexo-telegram-bot"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test:token")
+os.environ.setdefault("TARGET_CHAT_IDS", "123")
+
+import time
+import pytest
+import web_search
+
+
+@pytest.fixture(autouse=True)
+def fake_ddgs(monkeypatch):
+    """Reemplaza la llamada a DDGS por un fake que registra cada búsqueda."""
+    calls: list[tuple[str, str, dict]] = []
+
+    def fake_run(kind, query, kwargs):
+        calls.append((kind, query, kwargs))
+        time.sleep(0.01)
+        return [{"title": f"{kind}:{query}"}]
+
+    monkeypatch.setattr(web_search, "_run", fake_run)
+    monkeypatch.setattr(web_search, "DDGS", object())
+    monkeypatch.setattr(web_search, "_tokens", 100.0)
+    monkeypatch.setattr(web_search, "_backoff_until", 0.0)
+    web_search._cache.clear()
+    web_search._inflight.clear()
+    yield calls
+
+
+class TestNormalize:
+    def test_case_spaces_and_punctuation(self):
+        assert web_search.normalize("  ¿Qué es  Bitcoin? ") == "qué es bitcoin"
+
+
+class TestCachedSearch:
+    """Tests para cache, single-flight y presupuesto."""
+
+    def test_equivalent_queries_hit_cache(self, fake_ddgs):
+        async def scenario():
+            a = await web_search.news("Bitcoin hoy")
+            b = await web_search.news("  bitcoin   HOY?")
+            return a, b
+
+        a, b = asyncio.run(scenario())
+        assert a == b
+        assert len(fake_ddgs) == 1
+
+    def test_kind_and_params_are_part_of_key(self, fake_ddgs):
+        async def scenario():
+            await web_search.news("eth")
+            await web_search.text("eth")
+            await web_search.text("eth", max_results=3)
+
+        asyncio.run(scenario())
+        assert len(fake_ddgs) == 3
+
+    def test_concurrent_identical_queries_share_one_call(self, fake_ddgs):
+        async def scenario():
+            return await asyncio.gather(*(web_search.images("gato gif") for _ in range(5)))
+
+        results = asyncio.run(scenario())
+        assert all(r == results[0] for r in results)
+        assert len(fake_ddgs) == 1
+
+    def test_budget_exhausted_serves_empty(self, fake_ddgs, monkeypatch):
+        monkeypatch.setattr(web_search, "_tokens", 0.0)
+        monkeypatch.setattr(web_search, "_tokens_at", time.monotonic())
+        assert asyncio.run(web_search.text("algo nuevo")) == []
+        assert fake_ddgs == []
+
+    def test_rate_limit_triggers_backoff(self, monkeypatch):
+        def limited(kind, query, kwargs):
+            raise web_search.RatelimitException("202 Ratelimit")
+
+        monkeypatch.setattr(web_search, "_run", limited)
+        monkeypatch.setattr(web_search, "_backoff_s", 0.0)
+        assert asyncio.run(web_search.text("sol")) == []
+        assert web_search.stats()["backoff_s"] > 0